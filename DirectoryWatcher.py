@@ -0,0 +1,70 @@
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+
+import config
+
+# Setup logging
+logging.basicConfig(filename=config.LOG_FILENAME, level=config.LOG_LEVEL)
+
+
+# Polls a directory for new or changed files. A file is reported once it has not changed
+# (modification time and size) for `debounce` seconds, so partially written files are skipped.
+class DirectoryWatcher(object):
+    def __init__(
+        self,
+        directory: str,
+        suffix: str = ".csv",
+        debounce: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.directory = directory
+        self.suffix = suffix
+        self.debounce = debounce
+        self._clock = clock
+        # path -> (mtime, size) of the last reported version
+        self._reported: Dict[str, Tuple[int, int]] = {}
+        # path -> ((mtime, size), time since when the file is unchanged)
+        self._pending: Dict[str, Tuple[Tuple[int, int], float]] = {}
+
+    def poll(self) -> List[str]:
+        """
+        Checks the directory once
+
+        :return: The files that are new or changed and stable for the debounce time
+        """
+        now = self._clock()
+        ready = []
+        for entry in sorted(os.scandir(self.directory), key=lambda e: e.name):
+            if not entry.is_file() or not entry.name.lower().endswith(self.suffix):
+                continue
+            stat = entry.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if self._reported.get(entry.path) == signature:
+                continue
+            pending = self._pending.get(entry.path)
+            if pending is None or pending[0] != signature:
+                self._pending[entry.path] = (signature, now)
+                continue
+            if now - pending[1] >= self.debounce:
+                ready.append(entry.path)
+                self._reported[entry.path] = signature
+                del self._pending[entry.path]
+        return ready
+
+    def run(self, callback: Callable[[str], None], interval: float = 10.0):
+        """
+        Polls the directory until interrupted and calls `callback` for every ready file
+
+        :param callback: Called with the path of each new or changed file
+        :param interval: Seconds between two polls
+        """
+        logging.info(f"Watching {self.directory} for {self.suffix} files")
+        while True:
+            for path in self.poll():
+                try:
+                    callback(path)
+                except Exception:
+                    logging.exception(f"Import of {path} failed")
+            time.sleep(interval)
@@ -0,0 +1,92 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+# Words Netflix puts in front of the number of episodes without a title, per language.
+# "{}" marks the position of the number if it is not after the word (e.g. 第3話).
+EPISODE_MARKERS: Dict[str, Tuple[str, ...]] = {
+    "cs": ("Epizoda", "Díl"),
+    "da": ("Afsnit",),
+    "de": ("Folge", "Episode"),
+    "en": ("Episode", "Ep."),
+    "es": ("Capítulo", "Episodio"),
+    "fi": ("Jakso",),
+    "fr": ("Épisode",),
+    "it": ("Episodio", "Puntata"),
+    "ja": ("第{}話",),
+    "ko": ("제{}화", "{}화"),
+    "nl": ("Aflevering",),
+    "no": ("Episode",),
+    "pl": ("Odcinek",),
+    "pt": ("Episódio", "Capítulo"),
+    "ru": ("Серия", "Эпизод"),
+    "sv": ("Avsnitt",),
+    "tr": ("Bölüm",),
+    "zh": ("第{}集", "第{}话"),
+}
+
+
+def _markerPattern(marker: str) -> str:
+    if "{}" in marker:
+        before, after = marker.split("{}", 1)
+        return rf"{re.escape(before)}\s*(\d+)\s*{re.escape(after)}"
+    return rf"(?<!\w){re.escape(marker)}\s*(\d+)(?!\d)"
+
+
+@lru_cache(maxsize=None)
+def compileEpisodeMarkers(markers: Tuple[str, ...] = ()) -> Pattern:
+    """
+    Compiles the markers of all languages and additional markers into one expression
+
+    :param markers: Additional markers (e.g. from config.ini), "{}" marks the position of the number
+    :type markers: Tuple[str, ...]
+    :return: The expression, the episode number is the first group that matched
+    """
+    # longer markers first, "Episodio 3" is not matched as "Episod"
+    allMarkers = sorted(
+        set(markers).union(*EPISODE_MARKERS.values()), key=lambda m: (-len(m), m)
+    )
+    return re.compile(
+        "|".join(_markerPattern(marker) for marker in allMarkers), re.IGNORECASE
+    )
+
+
+def extractEpisodeNumber(
+    title: str, pattern: Optional[Pattern] = None
+) -> Optional[int]:
+    """
+    Returns the episode number of an episode title like "Folge 12", "Capítulo 103" or "第5話"
+
+    :param title: The Netflix episode title
+    :type title: str
+    :param pattern: The expression of `compileEpisodeMarkers` (default: the built-in markers)
+    :return: The number or None if the title has no marker
+    """
+    match = (pattern or compileEpisodeMarkers()).search(title)
+    if match is None:
+        return None
+    return int(next(group for group in match.groups() if group is not None))
+
+
+def matchEpisodeNumbers(
+    episodes: Iterable, tmdbEpisodes: List, pattern: Optional[Pattern] = None
+) -> int:
+    """
+    Matches the episodes without TMDB id that have an episode number in their title, in one pass over a season
+
+    :param episodes: The Netflix episodes of a season
+    :param tmdbEpisodes: The TMDB episodes of the season (with "id" and "episode_number")
+    :param pattern: The expression of `compileEpisodeMarkers` (default: the built-in markers)
+    :return: The number of matched episodes
+    """
+    byNumber = {tmdbEpisode.episode_number: tmdbEpisode for tmdbEpisode in tmdbEpisodes}
+    recovered = 0
+    for episode in episodes:
+        if episode.tmdbId is not None:
+            continue
+        number = extractEpisodeNumber(episode.name, pattern)
+        if number is not None and number in byNumber:
+            episode.setTmdbId(byNumber[number].id)
+            episode.setEpisodeNumber(number)
+            recovered += 1
+    return recovered
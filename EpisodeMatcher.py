@@ -0,0 +1,139 @@
+import re
+import unicodedata
+from typing import Dict, List
+
+import numpy as np
+
+# Leading articles that are often added or dropped between Netflix and TMDB episode titles
+ARTICLES = {"the", "a", "an", "der", "die", "das", "le", "la", "les", "el", "los"}
+
+
+def normalizeEpisodeTitle(title: str) -> str:
+    """
+    Normalizes an episode title for fuzzy matching (case, accents, punctuation and leading articles)
+
+    :param title: The episode title
+    :type title: str
+    :return: The normalized title
+    """
+    title = unicodedata.normalize("NFKD", title)
+    title = "".join(c for c in title if not unicodedata.combining(c))
+    words = re.sub(r"[\W_]+", " ", title.casefold()).split()
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+    return " ".join(words)
+
+
+def ngramVectors(titles: List[str], n: int = 3) -> np.ndarray:
+    """
+    Builds L2 normalized character n-gram count vectors, one row per title
+
+    :param titles: The titles
+    :type titles: List[str]
+    :param n: Length of the n-grams
+    :type n: int
+    :return: A (len(titles), number of distinct n-grams) matrix
+    """
+    vocabulary: Dict[str, int] = {}
+    rows = []
+    for title in titles:
+        padded = f" {normalizeEpisodeTitle(title)} "
+        rows.append(
+            [
+                vocabulary.setdefault(padded[i : i + n], len(vocabulary))
+                for i in range(max(1, len(padded) - n + 1))
+            ]
+        )
+    vectors = np.zeros((len(titles), max(1, len(vocabulary))))
+    for row, ngrams in enumerate(rows):
+        np.add.at(vectors[row], ngrams, 1.0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def similarityMatrix(netflixTitles: List[str], tmdbTitles: List[str]) -> np.ndarray:
+    """
+    Computes the cosine similarity of all Netflix and TMDB episode titles in one pass
+
+    :return: A (len(netflixTitles), len(tmdbTitles)) matrix with values between 0 and 1
+    """
+    vectors = ngramVectors(netflixTitles + tmdbTitles)
+    return vectors[: len(netflixTitles)] @ vectors[len(netflixTitles) :].T
+
+
+def optimalAssignment(scores: np.ndarray) -> List[tuple]:
+    """
+    Finds the one-to-one assignment of rows to columns with the maximal total score (Hungarian algorithm)
+
+    :param scores: A (rows, columns) score matrix
+    :type scores: np.ndarray
+    :return: A list of (row, column) pairs, one for each row or column (whichever is less)
+    """
+    if scores.size == 0:
+        return []
+    if scores.shape[0] > scores.shape[1]:
+        return [(row, col) for col, row in optimalAssignment(scores.T)]
+
+    # Minimize the cost, rows are assigned one after another along shortest augmenting paths
+    cost = scores.max() - scores
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    assignedRow = np.zeros(m + 1, dtype=int)  # column -> row (1-based, 0 = free)
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        assignedRow[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = assignedRow[j0]
+            free = ~used[1:]
+            current = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (current < minv[1:])
+            minv[1:][better] = current[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[assignedRow[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if assignedRow[j0] == 0:
+                break
+        while j0 != 0:
+            j1 = way[j0]
+            assignedRow[j0] = assignedRow[j1]
+            j0 = j1
+
+    return sorted(
+        (int(assignedRow[j]) - 1, j - 1) for j in range(1, m + 1) if assignedRow[j]
+    )
+
+
+def fuzzyMatchEpisodes(
+    netflixTitles: List[str], tmdbTitles: List[str], threshold: float
+) -> Dict[int, int]:
+    """
+    Matches Netflix to TMDB episode titles by character n-gram similarity
+
+    :param netflixTitles: Titles of the unmatched Netflix episodes
+    :type netflixTitles: List[str]
+    :param tmdbTitles: Titles of the TMDB episodes of the season
+    :type tmdbTitles: List[str]
+    :param threshold: Minimum similarity (0 to 1) of a match
+    :type threshold: float
+    :return: Index of the Netflix title -> index of the matching TMDB title
+    """
+    if not netflixTitles or not tmdbTitles:
+        return {}
+    scores = similarityMatrix(netflixTitles, tmdbTitles)
+    # Pairs below the threshold must not influence the assignment of the others
+    scores = np.where(scores >= threshold, scores, 0.0)
+    return {
+        row: col
+        for row, col in optimalAssignment(scores)
+        if scores[row, col] >= threshold and scores[row, col] > 0
+    }
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import datetime
+import logging
+import os
+import tempfile
+from itertools import chain, islice
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import config
+
+logging.basicConfig(filename=config.LOG_FILENAME, level=config.LOG_LEVEL)
+
+# Date formats found in Netflix exports of different countries. The configured format is tried first.
+DATE_FORMATS = (
+    "%d.%m.%y",
+    "%d.%m.%Y",
+    "%Y-%m-%d",
+    "%d/%m/%Y",
+    "%m/%d/%Y",
+    "%d/%m/%y",
+    "%m/%d/%y",
+    "%Y/%m/%d",
+)
+
+
+def _parses(date: str, dateFormat: str) -> bool:
+    try:
+        datetime.datetime.strptime(date.strip(), dateFormat)
+        return True
+    except ValueError:
+        return False
+
+
+def detectDateFormat(
+    dates: Sequence[str], formats: Optional[Sequence[str]] = None
+) -> Optional[str]:
+    """
+    Detects the date format of a sample of dates. Ambiguous samples (e.g. only days <= 12) keep the first
+    matching format, so the configured format is preferred.
+
+    :param dates: Sample of dates of the file
+    :type dates: Sequence[str]
+    :param formats: Candidate formats (default: the configured format and DATE_FORMATS)
+    :type formats: Optional[Sequence[str]]
+    :return: The format that parses most of the dates or None if none matches
+    """
+    if formats is None:
+        formats = (config.CSV_DATETIME_FORMAT,) + DATE_FORMATS
+    best, bestCount = None, 0
+    for dateFormat in formats:
+        count = sum(1 for date in dates if _parses(date, dateFormat))
+        if count > bestCount:
+            best, bestCount = dateFormat, count
+            if count == len(dates):
+                break
+    return best
+
+
+def convertRows(
+    rows: Iterable[List[str]],
+    outputFormat: str,
+    inputFormat: Optional[str] = None,
+    dateColumn: int = 1,
+    sampleSize: int = 1000,
+) -> Iterator[List[str]]:
+    """
+    Converts the dates of csv rows (without header) while they are read. Only the first `sampleSize`
+    rows are buffered to detect the input format.
+
+    :param rows: The csv rows
+    :type rows: Iterable[List[str]]
+    :param outputFormat: The date format to write
+    :type outputFormat: str
+    :param inputFormat: The date format of the rows, detected from the first rows if None
+    :type inputFormat: Optional[str]
+    :param dateColumn: Index of the date column
+    :type dateColumn: int
+    :param sampleSize: Number of rows used to detect the input format
+    :type sampleSize: int
+    :return: The rows with converted dates. Dates that do not match the input format are kept.
+    """
+    rows = iter(rows)
+    sample = list(islice(rows, sampleSize))
+    if inputFormat is None:
+        inputFormat = detectDateFormat(
+            [row[dateColumn] for row in sample if len(row) > dateColumn]
+        )
+        logging.info(f"Detected date format {inputFormat}")
+    if inputFormat is None or inputFormat == outputFormat:
+        yield from chain(sample, rows)
+        return
+
+    for row in chain(sample, rows):
+        if len(row) > dateColumn:
+            try:
+                date = datetime.datetime.strptime(row[dateColumn].strip(), inputFormat)
+                row[dateColumn] = date.strftime(outputFormat)
+            except ValueError:
+                logging.warning(f"Keeping date of row {row}, it is not {inputFormat}")
+        yield row
+
+
+def convertFile(
+    inputFile: str,
+    outputFile: str,
+    outputFormat: str,
+    inputFormat: Optional[str] = None,
+    delimiter: str = ",",
+) -> int:
+    """
+    Converts the dates of a "Title,Date" viewing history file. The output is written to a temporary
+    file which replaces the output file at the end, so the input file can also be the output file.
+
+    :param inputFile: The viewing history csv file
+    :type inputFile: str
+    :param outputFile: The file to write
+    :type outputFile: str
+    :param outputFormat: The date format to write
+    :type outputFormat: str
+    :param inputFormat: The date format of the input, detected if None
+    :type inputFormat: Optional[str]
+    :param delimiter: Delimiter used in the csv file
+    :type delimiter: str
+    :return: The number of rows written (without header)
+    """
+    directory = os.path.dirname(os.path.abspath(outputFile))
+    fd, tempFile = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    count = 0
+    try:
+        with open(
+            inputFile, mode="r", encoding="utf-8-sig", newline=""
+        ) as csvFile, os.fdopen(fd, "w", encoding="utf-8", newline="") as outFile:
+            reader = csv.reader(csvFile, delimiter=delimiter)
+            writer = csv.writer(outFile, delimiter=delimiter, quoting=csv.QUOTE_ALL)
+            header = next(reader, None)
+            if header is not None:
+                writer.writerow(header)
+            for row in convertRows(reader, outputFormat, inputFormat):
+                writer.writerow(row)
+                count += 1
+        os.replace(tempFile, outputFile)
+    except BaseException:
+        os.unlink(tempFile)
+        raise
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert the dates of a Netflix viewing history to the configured date format"
+    )
+    parser.add_argument(
+        "inputFile",
+        nargs="?",
+        default=config.VIEWING_HISTORY_FILENAME,
+        help="The viewing history csv file (default: viewing_history_filename from config.ini)",
+    )
+    parser.add_argument(
+        "-o", "--output", help="Output file (default: overwrite the input file)"
+    )
+    parser.add_argument(
+        "--input-format",
+        help="Date format of the input, e.g. %%Y-%%m-%%d (default: detect)",
+    )
+    parser.add_argument(
+        "--output-format",
+        default=config.CSV_DATETIME_FORMAT,
+        help="Date format to write (default: viewing_history_datetime_format from config.ini)",
+    )
+    args = parser.parse_args()
+
+    try:
+        count = convertFile(
+            args.inputFile,
+            args.output or args.inputFile,
+            args.output_format,
+            args.input_format,
+            config.CSV_DELIMITER,
+        )
+    except PermissionError as e:
+        print(f"PermissionError: {e}")
+        print(
+            "Ensure the file is not open in another program and you have the necessary permissions."
+        )
+        return
+    print(f"Wrote {count} rows to {args.output or args.inputFile}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+
+import argparse
+import copy
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+from typing import Optional
+
+from trakt import Trakt
+
+import config
+from netflix2trakt import (
+    parseHistory,
+    resolveHistory,
+    setupTitleIndex,
+    setupTMDB,
+    setupTrakt,
+)
+from TitleOverrides import TitleOverrides
+from TraktAuth import TraktAuthManager
+
+logging.basicConfig(filename=config.LOG_FILENAME, level=config.LOG_LEVEL)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+# An import submitted to the service. The progress is updated by the worker running it.
+class ImportJob(object):
+    def __init__(self, csv: str, authorization: dict, dryRun: bool = False):
+        self.id = uuid.uuid4().hex
+        self.csv: Optional[str] = csv
+        self.authorization: Optional[dict] = authorization
+        self.dryRun = dryRun
+        self.state = QUEUED
+        self.stage: Optional[str] = None
+        self.done = 0
+        self.total = 0
+        self.stats: dict = {}
+        self.error: Optional[str] = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = Lock()
+
+    def setProgress(self, stage: str, done: int = 0, total: int = 0):
+        with self._lock:
+            self.stage, self.done, self.total = stage, done, total
+
+    def toDict(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "state": self.state,
+                "progress": {
+                    "stage": self.stage,
+                    "done": self.done,
+                    "total": self.total,
+                },
+                "stats": self.stats,
+                "error": self.error,
+                "submitted": self.submitted,
+                "started": self.started,
+                "finished": self.finished,
+            }
+
+
+# Runs imports of many users in one process. Jobs are queued and run by a bounded worker pool,
+# all jobs share the TMDB client (request cache, coalescing and concurrency limit) and the title
+# index. Every job gets its own copy of the title overrides: the ids resolved in a job (including
+# wrong matches) are added to them and must not affect the jobs of other users.
+class ImportService(object):
+    def __init__(
+        self,
+        workers: int = 2,
+        maxQueuedJobs: int = 100,
+        maxFinishedJobs: int = 1000,
+        tmdb=None,
+    ):
+        self.tmdb = tmdb or setupTMDB(
+            config.TMDB_API_KEY,
+            config.TMDB_LANGUAGE,
+            config.TMDB_DEBUG,
+            config.TMDB_MAX_WORKERS,
+        )
+        self.titleIndex = setupTitleIndex(config.TMDB_TITLE_INDEX)
+        self.overrides = TitleOverrides.load(config.TMDB_OVERRIDES_FILE)
+        self.workers = workers
+        self.maxQueuedJobs = maxQueuedJobs
+        self.maxFinishedJobs = maxFinishedJobs
+        self.jobs: "OrderedDict[str, ImportJob]" = OrderedDict()
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="import")
+
+        Trakt.base_url = "https://api.trakt.tv"
+        Trakt.configuration.defaults.client(
+            id=config.TRAKT_API_CLIENT_ID, secret=config.TRAKT_API_CLIENT_SECRET
+        )
+
+    def countJobs(self) -> dict:
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self.jobs.values():
+                counts[job.state] += 1
+            return counts
+
+    def submit(self, job: ImportJob) -> bool:
+        """
+        Queues a job
+
+        :param job: The job
+        :type job: ImportJob
+        :return: `False` if the queue is full
+        """
+        if self.countJobs()[QUEUED] >= self.maxQueuedJobs:
+            return False
+        with self._lock:
+            self.jobs[job.id] = job
+            finished = [j.id for j in self.jobs.values() if j.state in (DONE, FAILED)]
+            for jobId in finished[: max(0, len(finished) - self.maxFinishedJobs)]:
+                del self.jobs[jobId]
+        self._executor.submit(self.run, job)
+        return True
+
+    def getJob(self, jobId: str) -> Optional[ImportJob]:
+        with self._lock:
+            return self.jobs.get(jobId)
+
+    def getStats(self) -> dict:
+        return {
+            "jobs": self.countJobs(),
+            "workers": self.workers,
+            "tmdb": {
+                "executedRequests": self.tmdb.executedRequests,
+                "coalescedRequests": self.tmdb.coalescedRequests,
+                "cachedSearches": self.tmdb.cachedSearches,
+            },
+        }
+
+    def run(self, job: ImportJob):
+        """Runs a job: parse the uploaded csv, resolve the TMDB ids and sync them with the user's token"""
+        job.state, job.started = RUNNING, time.time()
+        jobDir = tempfile.mkdtemp(prefix="netflix2trakt-")
+        try:
+            csvFile = os.path.join(jobDir, "NetflixViewingHistory.csv")
+            with open(csvFile, "w", encoding="utf-8") as f:
+                f.write(job.csv)
+            job.csv = None
+
+            # The user's token, refreshed tokens are written to the job directory
+            authManager = TraktAuthManager(
+                os.path.join(jobDir, "traktAuth.json"),
+                refreshMargin=config.TRAKT_TOKEN_REFRESH_MARGIN,
+            )
+            authManager.store(job.authorization)
+            traktIO = setupTrakt(
+                config.TRAKT_API_SYNC_PAGE_SIZE,
+                job.dryRun,
+                config.TRAKT_API_SYNC_MIN_PAGE_SIZE,
+                config.TRAKT_API_SYNC_MAX_PAGE_SIZE,
+                config.TRAKT_API_SYNC_TARGET_LATENCY,
+                authManager,
+            )
+            if traktIO.getAuthorization() is None:
+                raise ValueError(
+                    "The Trakt token is expired and could not be refreshed"
+                )
+
+            job.setProgress("parse")
+            netflixHistory = parseHistory(csvFile, None)
+            resolveHistory(
+                netflixHistory,
+                self.tmdb,
+                traktIO,
+                self.titleIndex,
+                copy.deepcopy(self.overrides),
+                progress=job.setProgress,
+                resolvedIdsFile=None,
+            )
+            job.setProgress("sync")
+            pending = traktIO.getData()
+            if pending["movies"] or pending["episodes"]:
+                if traktIO.sync() is None:
+                    raise RuntimeError("Trakt sync failed")
+
+            job.stats = {
+                "shows": len(netflixHistory.shows),
+                "movies": len(netflixHistory.movies),
+                "trakt": traktIO.syncResult,
+                "pages": traktIO.getSyncSummary(),
+            }
+            if traktIO.authorization != job.authorization:
+                # The old refresh token is invalid now, the caller has to store the new one
+                job.stats["authorization"] = traktIO.authorization
+            if traktIO.failedItems:
+                raise RuntimeError(
+                    f"{len(traktIO.failedItems)} items could not be added to the Trakt history"
+                )
+            job.state = DONE
+        except Exception as err:
+            logging.exception(f"Import job {job.id} failed")
+            job.error, job.state = str(err), FAILED
+        finally:
+            job.authorization = None
+            job.finished = time.time()
+            shutil.rmtree(jobDir, ignore_errors=True)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ImportRequestHandler(BaseHTTPRequestHandler):
+    # set by `createServer`
+    service: ImportService
+    maxUploadSize: int
+
+    def _sendJson(self, status: HTTPStatus, data: dict):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            return self._sendJson(HTTPStatus.OK, self.service.getStats())
+        match = re.fullmatch(r"/jobs/(\w+)", self.path)
+        job = self.service.getJob(match.group(1)) if match else None
+        if job is None:
+            return self._sendJson(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+        self._sendJson(HTTPStatus.OK, job.toDict())
+
+    def do_POST(self):
+        """
+        Submits a job, the body is a json object with the csv file content ("csv"), the Trakt token
+        ("trakt": access_token, refresh_token, created_at, expires_in) and optionally "dry_run"
+        """
+        if self.path != "/jobs":
+            return self._sendJson(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > self.maxUploadSize:
+            return self._sendJson(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Upload too large"}
+            )
+        try:
+            data = json.loads(self.rfile.read(length))
+            job = ImportJob(
+                data["csv"], dict(data["trakt"]), bool(data.get("dry_run", False))
+            )
+            if not isinstance(job.csv, str) or "access_token" not in job.authorization:
+                raise ValueError("Invalid job")
+        except (ValueError, KeyError, TypeError) as err:
+            return self._sendJson(HTTPStatus.BAD_REQUEST, {"error": str(err)})
+
+        if not self.service.submit(job):
+            return self._sendJson(
+                HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Too many queued jobs"}
+            )
+        self._sendJson(
+            HTTPStatus.ACCEPTED,
+            {"id": job.id, "state": job.state, "url": f"/jobs/{job.id}"},
+        )
+
+    def log_message(self, format, *args):
+        logging.info("%s - %s" % (self.address_string(), format % args))
+
+
+def createServer(
+    service: ImportService, host: str, port: int, maxUploadSize: int
+) -> ThreadingHTTPServer:
+    """
+    Creates the HTTP server of the service
+
+    :param service: The service running the jobs
+    :param host: Address to listen on
+    :param port: Port to listen on (0 = any free port)
+    :param maxUploadSize: Maximum size of a submitted job in bytes
+    :return: The server, run it with `serve_forever()`
+    """
+    handler = type(
+        "Handler",
+        (ImportRequestHandler,),
+        {"service": service, "maxUploadSize": maxUploadSize},
+    )
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run imports of many users in one process. POST a job to /jobs, "
+        "GET /jobs/<id> for its progress and /stats for the service statistics."
+    )
+    parser.add_argument("--host", default=config.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVICE_PORT)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=config.SERVICE_WORKERS,
+        help="Number of imports running at the same time",
+    )
+    args = parser.parse_args()
+
+    service = ImportService(args.workers, config.SERVICE_MAX_QUEUED_JOBS)
+    server = createServer(service, args.host, args.port, config.SERVICE_MAX_UPLOAD_SIZE)
+    print(f"Import service listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopped")
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import math
+from typing import List, Optional
+
+from EpisodeMatcher import similarityMatrix
+
+# Weight of the popularity in the score of a candidate, the title similarity has weight 1
+POPULARITY_WEIGHT = 0.2
+
+
+def releaseYear(candidate) -> Optional[int]:
+    """
+    Returns the release year of a TMDB movie search result
+
+    :param candidate: A search result with "release_date" (e.g. "2019-06-28")
+    :return: The year or None if the release date is unknown
+    """
+    releaseDate = candidate.get("release_date") or ""
+    return int(releaseDate[:4]) if releaseDate[:4].isdigit() else None
+
+
+def rankMovies(title: str, candidates, maxYear: Optional[int] = None) -> List:
+    """
+    Ranks the results of a TMDB movie search by their title similarity (title or original title,
+    see `similarityMatrix`) and popularity. Movies released after `maxYear` can't have been
+    watched and are dropped, unless no candidate is left.
+
+    :param title: The Netflix title
+    :type title: str
+    :param candidates: The search results (with "title", "original_title", "popularity", "release_date")
+    :param maxYear: The year the movie was first watched
+    :type maxYear: Optional[int]
+    :return: The candidates, the best match first
+    """
+    candidates = list(candidates or [])
+    if maxYear is not None:
+        released = [c for c in candidates if (releaseYear(c) or 0) <= maxYear]
+        candidates = released or candidates
+    if not candidates:
+        return []
+
+    titles = [c.get("title") or "" for c in candidates]
+    originalTitles = [c.get("original_title") or t for c, t in zip(candidates, titles)]
+    similarity = similarityMatrix([title], titles + originalTitles)[0]
+    popularity = [math.log1p(max(0.0, c.get("popularity") or 0.0)) for c in candidates]
+    maxPopularity = max(popularity) or 1.0
+
+    def score(i):
+        titleScore = max(similarity[i], similarity[len(candidates) + i])
+        return titleScore + POPULARITY_WEIGHT * popularity[i] / maxPopularity
+
+    # sorted is stable, equal scores keep the order of TMDB
+    order = sorted(range(len(candidates)), key=score, reverse=True)
+    return [candidates[i] for i in order]
+
+
+def firstWatchYear(movie) -> Optional[int]:
+    """
+    Returns the year a movie was watched first
+
+    :param movie: A `NetflixMovie`
+    :return: The year or None if it has no watch dates
+    """
+    return int(min(movie.watchedAt)[:4]) if movie.watchedAt else None
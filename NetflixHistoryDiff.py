@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import datetime
+import hashlib
+import os
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple, Union
+
+import config
+from NetflixTvShow import formatWatchedDate, parseEntryTitle
+
+# A play in the Trakt history: ("episodes" or "movies", TMDB id, watched_at)
+TraktItem = Tuple[str, int, str]
+
+
+def rowFingerprint(title: str, date: str) -> int:
+    """
+    Returns a 64 bit fingerprint of a viewing history row
+
+    :param title: The title of the entry
+    :type title: str
+    :param date: The watch date of the entry as given in the csv file
+    :type date: str
+    :return: The fingerprint
+    """
+    digest = hashlib.blake2b(
+        f"{title.strip()}\x1f{date.strip()}".encode("utf-8"), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, "little")
+
+
+# Fingerprints of all rows that were already imported. They are stored as a sorted array of
+# 64 bit integers (8 bytes per row), which loads without parsing.
+class FingerprintStore(object):
+    def __init__(self, fingerprints: Optional[Iterable[int]] = None):
+        self._imported = array("Q", sorted(set(fingerprints or ())))
+        self._new: Set[int] = set()
+
+    def __len__(self):
+        return len(self._imported) + len(self._new)
+
+    @classmethod
+    def load(cls, filename: Optional[str]) -> "FingerprintStore":
+        """
+        Loads a fingerprint file. A missing file results in an empty store.
+
+        :param filename: The fingerprint file (or None)
+        :type filename: Optional[str]
+        :return: The loaded store
+        """
+        store = cls()
+        if filename is not None and os.path.isfile(filename):
+            with open(filename, "rb") as f:
+                store._imported.frombytes(f.read())
+        return store
+
+    def save(self, filename: str):
+        """
+        Writes all fingerprints (including the ones added since loading) to a file
+
+        :param filename: The fingerprint file
+        :type filename: str
+        """
+        if self._new:
+            self._imported = array("Q", sorted(set(self._imported) | self._new))
+            self._new = set()
+        tempFile = filename + ".tmp"
+        with open(tempFile, "wb") as f:
+            self._imported.tofile(f)
+        os.replace(tempFile, filename)
+
+    def __contains__(self, fingerprint: int) -> bool:
+        index = bisect_left(self._imported, fingerprint)
+        if index < len(self._imported) and self._imported[index] == fingerprint:
+            return True
+        return fingerprint in self._new
+
+    def add(self, fingerprint: int):
+        self._new.add(fingerprint)
+
+    def isNewRow(self, title: str, date: str) -> bool:
+        """
+        Checks if a row was not imported before and records it as imported
+
+        :param title: The title of the entry
+        :type title: str
+        :param date: The watch date of the entry
+        :type date: str
+        :return: `True` if the row is new
+        """
+        fingerprint = rowFingerprint(title, date)
+        if fingerprint in self:
+            return False
+        self.add(fingerprint)
+        return True
+
+
+# The rows of a run that were not imported before. They are only added to the imported rows
+# (`commit`) once one of their plays was posted to Trakt (or skipped as already watched on Trakt),
+# so rows that could not be resolved or posted (failed syncs, dry runs) are imported again by the next run.
+class PendingRows(object):
+    def __init__(self, imported: Optional[FingerprintStore] = None):
+        """
+        :param imported: The rows imported in previous runs
+        :type imported: Optional[FingerprintStore]
+        """
+        self.imported = imported if imported is not None else FingerprintStore()
+        # fingerprint -> (title, watched_at) of the new rows
+        self.rows: Dict[int, Tuple[str, str]] = {}
+        # fingerprint -> plays of the row, see `resolveItems`
+        self.items: Dict[int, Set[TraktItem]] = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def isNewRow(self, title: str, date: Union[str, datetime.datetime]) -> bool:
+        """
+        Checks if a row was not imported before and collects it
+
+        :param title: The title of the entry
+        :type title: str
+        :param date: The watch date of the entry as given in the csv file or the exact start time
+        :type date: Union[str, datetime.datetime]
+        :return: `True` if the row is new
+        """
+        dateText = date.isoformat() if isinstance(date, datetime.datetime) else date
+        fingerprint = rowFingerprint(title, dateText)
+        if fingerprint in self.imported or fingerprint in self.rows:
+            return False
+        self.rows[fingerprint] = (title, formatWatchedDate(date))
+        return True
+
+    def resolveItems(self, netflixHistory):
+        """
+        Looks up the plays of the new rows in a history with resolved TMDB ids. Rows of episodes and
+        movies without TMDB id or not contained in the history (e.g. another shard) get no plays.
+
+        :param netflixHistory: The `NetflixTvHistory` after show and movie resolution
+        """
+        episodes: Dict[Tuple[str, str, str], int] = {}
+        for show in netflixHistory.shows:
+            for season in show.seasons:
+                for episode in season.episodes:
+                    if episode.tmdbId is not None:
+                        for watchedAt in episode.watchedAt:
+                            episodes[show.name, episode.name, watchedAt] = (
+                                episode.tmdbId
+                            )
+        movies: Dict[Tuple[str, str], int] = {}
+        for movie in netflixHistory.movies:
+            if movie.tmdbId is not None:
+                for watchedAt in movie.watchedAt:
+                    movies[movie.name, watchedAt] = movie.tmdbId
+
+        aliases = netflixHistory.showAliases
+        for fingerprint, (title, watchedAt) in self.rows.items():
+            # a row can stand for an episode and a movie, see `parseEntryTitle`
+            for entry in parseEntryTitle(title):
+                if entry[0] == "show":
+                    showName = aliases.get(entry[1], entry[1])
+                    key = "episodes"
+                    tmdbId = episodes.get((showName, entry[4], watchedAt))
+                else:
+                    key = "movies"
+                    tmdbId = movies.get((entry[1], watchedAt))
+                if tmdbId is not None:
+                    self.items.setdefault(fingerprint, set()).add(
+                        (key, tmdbId, watchedAt)
+                    )
+
+    def merge(self, other: "PendingRows"):
+        """
+        Adds the rows and plays of another collection, e.g. of another shard
+
+        :param other: The rows to add
+        :type other: PendingRows
+        """
+        self.rows.update(other.rows)
+        for fingerprint, items in other.items.items():
+            self.items.setdefault(fingerprint, set()).update(items)
+
+    def commit(
+        self, postedItems: Set[TraktItem], skippedItems: Optional[Set[TraktItem]] = None
+    ) -> int:
+        """
+        Adds the rows with a posted or skipped play to the imported rows, save them with `imported.save`
+
+        :param postedItems: The plays posted to Trakt
+        :type postedItems: Set[TraktItem]
+        :param skippedItems: The plays not posted as they are already watched on Trakt (done as well)
+        :type skippedItems: Optional[Set[TraktItem]]
+        :return: The number of rows added
+        """
+        count = 0
+        for fingerprint, items in self.items.items():
+            if fingerprint in self.imported:
+                continue
+            if not items.isdisjoint(postedItems) or not items.isdisjoint(
+                skippedItems or ()
+            ):
+                self.imported.add(fingerprint)
+                count += 1
+        return count
+
+    def toDict(self) -> dict:
+        """
+        Returns the rows and their plays, e.g. to hand them over to the next stage.
+        Can be read with `fromDict`.
+        """
+        return {
+            "rows": [
+                [fingerprint, title, watchedAt]
+                for fingerprint, (title, watchedAt) in self.rows.items()
+            ],
+            "items": [
+                [fingerprint, sorted(list(item) for item in items)]
+                for fingerprint, items in self.items.items()
+            ],
+        }
+
+    @classmethod
+    def fromDict(
+        cls, data: dict, imported: Optional[FingerprintStore] = None
+    ) -> "PendingRows":
+        """
+        Creates the rows from the output of `toDict`
+
+        :param data: A dictionary as returned by `toDict`
+        :type data: dict
+        :param imported: The rows imported in previous runs
+        :type imported: Optional[FingerprintStore]
+        :return: The rows
+        """
+        pendingRows = cls(imported)
+        for fingerprint, title, watchedAt in data["rows"]:
+            pendingRows.rows[fingerprint] = (title, watchedAt)
+        for fingerprint, items in data["items"]:
+            pendingRows.items[fingerprint] = {tuple(item) for item in items}
+        return pendingRows
+
+
+def readHistoryRows(inputFile: str, delimiter: str) -> Iterator[Tuple[str, str]]:
+    """
+    Reads the (title, date) rows of a "Title,Date" viewing history file, without the header
+
+    :param inputFile: The viewing history csv file
+    :type inputFile: str
+    :param delimiter: Delimiter used in the csv file
+    :type delimiter: str
+    :return: An iterator of (title, date) tuples
+    """
+    with open(inputFile, mode="r", encoding="utf-8-sig", newline="") as csvFile:
+        csvReader = csv.reader(csvFile, delimiter=delimiter)
+        next(csvReader, None)
+        for row in csvReader:
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write the rows of a Netflix viewing history that were not imported before"
+    )
+    parser.add_argument("inputFile", help="The new viewing history csv file")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--previous", help="The previously imported csv file to compare with"
+    )
+    group.add_argument(
+        "--store",
+        default=config.VIEWING_HISTORY_FINGERPRINT_FILE,
+        help="Fingerprints of the imported rows (default: fingerprint_file from config.ini)",
+    )
+    parser.add_argument(
+        "-o", "--output", default="NetflixViewingHistoryDelta.csv", help="Output file"
+    )
+    args = parser.parse_args()
+
+    if args.previous is not None:
+        store = FingerprintStore(
+            rowFingerprint(title, date)
+            for title, date in readHistoryRows(args.previous, config.CSV_DELIMITER)
+        )
+    else:
+        store = FingerprintStore.load(args.store)
+
+    count = 0
+    with open(args.output, mode="w", encoding="utf-8", newline="") as outFile:
+        writer = csv.writer(outFile, delimiter=config.CSV_DELIMITER)
+        writer.writerow(("Title", "Date"))
+        for title, date in readHistoryRows(args.inputFile, config.CSV_DELIMITER):
+            if store.isNewRow(title, date):
+                writer.writerow((title, date))
+                count += 1
+    print(f"Wrote {count} new rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
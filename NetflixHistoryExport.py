@@ -0,0 +1,86 @@
+import json
+from typing import Iterator, List, TextIO, Tuple
+
+# Streaming exporters of a `NetflixTvHistory`. Only one show (or movie) is serialized at a time,
+# so the memory use does not depend on the size of the history. `out` can be any text stream,
+# e.g. a file or `socket.makefile("w")`.
+
+
+def writeJson(netflixHistory, out: TextIO) -> int:
+    """
+    Writes the history as json, the output is the same as `json.dump(netflixHistory.toDict(), out)`.
+    This is not the structure of `getJson` (names mapped to watch dates), which has no place for the
+    TMDB ids of shows and movies: shows, seasons, episodes and movies are objects with their names,
+    numbers, resolved TMDB ids and watch dates, which can be read back with `NetflixTvHistory.fromDict`.
+
+    :param netflixHistory: The history (shows and movies can also be iterated lazily)
+    :param out: The text stream to write to
+    :type out: TextIO
+    :return: The number of shows and movies written
+    """
+    out.write('{"tvshows": [')
+    count = _writeItems(netflixHistory.shows, out)
+    out.write('], "movies": [')
+    count += _writeItems(netflixHistory.movies, out)
+    out.write("]}")
+    return count
+
+
+def _writeItems(items, out: TextIO) -> int:
+    count = 0
+    for item in items:
+        if count:
+            out.write(", ")
+        out.write(json.dumps(item.toDict()))
+        count += 1
+    return count
+
+
+def _iterWatchGroups(netflixHistory) -> Iterator[Tuple[dict, List[str]]]:
+    for show in netflixHistory.shows:
+        for season in show.seasons:
+            for episode in season.episodes:
+                record = {
+                    "type": "episode",
+                    "show": show.name,
+                    "showTmdbId": show.tmdbId,
+                    "seasonNumber": season.number,
+                    "seasonName": season.name,
+                    "episode": episode.name,
+                    "episodeNumber": episode.number,
+                    "tmdbId": episode.tmdbId,
+                }
+                yield record, sorted(episode.watchedAt)
+    for movie in netflixHistory.movies:
+        record = {"type": "movie", "movie": movie.name, "tmdbId": movie.tmdbId}
+        yield record, sorted(movie.watchedAt)
+
+
+def iterWatches(netflixHistory) -> Iterator[dict]:
+    """
+    Yields one record per watch of an episode or movie
+
+    :param netflixHistory: The history
+    :return: Records with type, names, numbers, TMDB ids and watchedAt
+    """
+    for record, watchedAt in _iterWatchGroups(netflixHistory):
+        for date in watchedAt:
+            yield dict(record, watchedAt=date)
+
+
+def writeNdjson(netflixHistory, out: TextIO) -> int:
+    """
+    Writes the history as newline delimited json, one watch per line (same records as `iterWatches`)
+
+    :param netflixHistory: The history
+    :param out: The text stream to write to
+    :type out: TextIO
+    :return: The number of lines written
+    """
+    count = 0
+    for record, watchedAt in _iterWatchGroups(netflixHistory):
+        # All watches of an episode share the fields, they are only encoded once
+        prefix = json.dumps(record)[:-1] + ', "watchedAt": '
+        out.write("".join(f"{prefix}{json.dumps(date)}}}\n" for date in watchedAt))
+        count += len(watchedAt)
+    return count
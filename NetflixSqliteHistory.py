@@ -0,0 +1,240 @@
+import datetime
+import json
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Union
+
+from NetflixTvShow import (
+    NetflixMovie,
+    NetflixTvHistory,
+    NetflixTvShow,
+    formatWatchedDate,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    seq INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    season_number INTEGER,
+    season_name TEXT,
+    episode TEXT,
+    watched_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_name ON entries (kind, name, seq);
+CREATE TABLE IF NOT EXISTS resolved (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (kind, name)
+);
+"""
+
+SHOW = "show"
+MOVIE = "movie"
+
+
+# Lazy, sized view on the shows or movies of a `NetflixSqliteHistory`
+class _LazyItems(object):
+    def __init__(self, history: "NetflixSqliteHistory", kind: str):
+        self._history = history
+        self._kind = kind
+
+    def __len__(self):
+        return self._history._count(self._kind)
+
+    def __iter__(self):
+        return self._history._iterItems(self._kind)
+
+
+# A `NetflixTvHistory` that keeps the viewing history in an SQLite file instead of memory.
+# Entries are inserted in batches. Shows and movies are created when they are iterated or
+# requested, one at a time, so the memory use does not grow with the size of the history.
+class NetflixSqliteHistory(NetflixTvHistory):
+    def __init__(self, filename: str = "", batchSize: int = 10000):
+        """
+        :param filename: The database file (an empty string creates a temporary file)
+        :type filename: str
+        :param batchSize: Number of entries inserted at once
+        :type batchSize: int
+        """
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._batchSize = batchSize
+        self._pending: List[tuple] = []
+        self.showAliases: Dict[str, str] = {}
+
+    @property
+    def shows(self):
+        return _LazyItems(self, SHOW)
+
+    @property
+    def movies(self):
+        return _LazyItems(self, MOVIE)
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    def flush(self):
+        """Inserts all pending entries"""
+        if self._pending:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT INTO entries (kind, name, season_number, season_name, episode, watched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    self._pending,
+                )
+            self._pending = []
+
+    def _add(self, row: tuple):
+        self._pending.append(row)
+        if len(self._pending) >= self._batchSize:
+            self.flush()
+
+    def _count(self, kind: str) -> int:
+        self.flush()
+        return self._connection.execute(
+            "SELECT COUNT(DISTINCT name) FROM entries WHERE kind = ?", (kind,)
+        ).fetchone()[0]
+
+    def _iterItems(self, kind: str) -> Iterator[Union[NetflixTvShow, NetflixMovie]]:
+        self.flush()
+        # Names in order of their first entry, like the in-memory history
+        names = self._connection.execute(
+            "SELECT name FROM entries WHERE kind = ? GROUP BY name ORDER BY MIN(seq)",
+            (kind,),
+        )
+        for (name,) in names:
+            yield self._loadItem(kind, name)
+
+    def _loadItem(self, kind: str, name: str):
+        resolved = self._connection.execute(
+            "SELECT data FROM resolved WHERE kind = ? AND name = ?", (kind, name)
+        ).fetchone()
+        if resolved is not None:
+            data = json.loads(resolved[0])
+            if kind == SHOW:
+                return NetflixTvShow.fromDict(data)
+            return NetflixMovie.fromDict(data)
+
+        rows = self._connection.execute(
+            "SELECT season_number, season_name, episode, watched_at FROM entries "
+            "WHERE kind = ? AND name = ? ORDER BY seq",
+            (kind, name),
+        ).fetchall()
+        if not rows:
+            return None
+        if kind == MOVIE:
+            movie = NetflixMovie(name)
+            movie._watchedAt = {watchedAt for _, _, _, watchedAt in rows}
+            return movie
+
+        # Replay the entries, seasons and episodes are grouped like in the in-memory history
+        show = NetflixTvShow(name)
+        for seasonNumber, seasonName, episodeTitle, watchedAt in rows:
+            season = show.addSeason(seasonNumber=seasonNumber, seasonName=seasonName)
+            season.addEpisode(episodeTitle)._watchedAt.add(watchedAt)
+        return show
+
+    def hasTvShow(self, showName: str) -> bool:
+        self.flush()
+        return (
+            self._connection.execute(
+                "SELECT 1 FROM entries WHERE kind = ? AND name = ? LIMIT 1",
+                (SHOW, showName),
+            ).fetchone()
+            is not None
+        )
+
+    def merge(self, other: NetflixTvHistory):
+        # The entries of other are appended, they are replayed like the entries of the file
+        for show in other.shows:
+            for season in show.seasons:
+                for episode in season.episodes:
+                    for watchedAt in sorted(episode._watchedAt):
+                        self._add(
+                            (
+                                SHOW,
+                                show.name,
+                                season.number,
+                                season.name,
+                                episode.name,
+                                watchedAt,
+                            )
+                        )
+        for movie in other.movies:
+            for watchedAt in sorted(movie._watchedAt):
+                self._add((MOVIE, movie.name, None, None, None, watchedAt))
+
+    def getTvShowNames(self) -> List[str]:
+        self.flush()
+        rows = self._connection.execute(
+            "SELECT name FROM entries WHERE kind = ? GROUP BY name ORDER BY MIN(seq)",
+            (SHOW,),
+        )
+        return [name for (name,) in rows]
+
+    def _mergeTvShows(self, merges: Dict[str, List[str]]):
+        # The entries are renamed, the merged shows are created by replaying them
+        self.flush()
+        with self._connection:
+            for name, aliases in merges.items():
+                for alias in aliases:
+                    self._connection.execute(
+                        "UPDATE entries SET name = ? WHERE kind = ? AND name = ?",
+                        (name, SHOW, alias),
+                    )
+                self._connection.executemany(
+                    "DELETE FROM resolved WHERE kind = ? AND name = ?",
+                    [(SHOW, n) for n in [name] + aliases],
+                )
+
+    def getTvShow(self, showName: str):
+        self.flush()
+        return self._loadItem(SHOW, showName)
+
+    def getMovie(self, movieName: str):
+        self.flush()
+        return self._loadItem(MOVIE, movieName)
+
+    def addTvShowEntry(
+        self,
+        showName: str,
+        seasonNumber: Union[int, None],
+        episodeTitle: str,
+        watchedDate: Union[str, datetime.datetime],
+        seasonName: Optional[str] = None,
+    ) -> None:
+        self._add(
+            (
+                SHOW,
+                showName,
+                seasonNumber,
+                seasonName,
+                episodeTitle,
+                formatWatchedDate(watchedDate),
+            )
+        )
+
+    def addMovieEntry(self, movieTitle, watchedDate):
+        """
+        Adds a watch date of a movie. In contrast to the in-memory history, no movie object is returned.
+        """
+        self._add((MOVIE, movieTitle, None, None, None, formatWatchedDate(watchedDate)))
+
+    def storeTvShow(self, show: NetflixTvShow):
+        """
+        Stores the resolved ids of a show, it is returned with them from now on
+        :param show: A show of this history
+        """
+        self._store(SHOW, show.name, show.toDict())
+
+    def storeMovie(self, movie: NetflixMovie):
+        self._store(MOVIE, movie.name, movie.toDict())
+
+    def _store(self, kind: str, name: str, data: dict):
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO resolved (kind, name, data) VALUES (?, ?, ?)",
+                (kind, name, json.dumps(data)),
+            )
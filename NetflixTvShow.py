@@ -1,7 +1,9 @@
 import datetime
 import logging
 import re
-from typing import Optional, Set, Union
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 import config
 
@@ -9,11 +11,109 @@ import config
 logging.basicConfig(filename=config.LOG_FILENAME, level=config.LOG_LEVEL)
 
 
+# Dashes and quotes of localized titles, unified when show names are compared
+_PUNCTUATION = str.maketrans(
+    {
+        **dict.fromkeys("\u2010\u2011\u2012\u2013\u2014\u2015\u2212", "-"),
+        **dict.fromkeys("\u2018\u2019\u201a\u201b\u00b4`", "'"),
+        **dict.fromkeys("\u201c\u201d\u201e\u00ab\u00bb", '"'),
+    }
+)
+
+
+@lru_cache(maxsize=None)
+def normalizeShowName(showName: str) -> str:
+    """
+    Normalizes the unicode form, dashes, quotes and whitespace of a show name
+
+    :param showName: The show name, e.g. "Peaky Blinders – Gangs of Birmingham"
+    :type showName: str
+    :return: The normalized name, e.g. "Peaky Blinders - Gangs of Birmingham"
+    """
+    showName = unicodedata.normalize("NFKC", showName).translate(_PUNCTUATION)
+    return " ".join(showName.split())
+
+
+@lru_cache(maxsize=None)
+def showNameKey(showName: str) -> str:
+    """
+    Returns the key for comparing show names: normalized, case and accents are ignored
+
+    :param showName: The show name
+    :type showName: str
+    """
+    showName = unicodedata.normalize("NFKD", normalizeShowName(showName).casefold())
+    return "".join(c for c in showName if not unicodedata.combining(c))
+
+
+def splitSubtitle(showName: str) -> Tuple[str, Optional[str]]:
+    """
+    Splits a localized subtitle off a show name ("Peaky Blinders – Gangs of Birmingham")
+
+    :param showName: The show name
+    :type showName: str
+    :return: The name without subtitle and the subtitle (None if there is none)
+    """
+    base, separator, subtitle = normalizeShowName(showName).partition(" - ")
+    if not separator or not base or not subtitle:
+        return normalizeShowName(showName), None
+    return base, subtitle
+
+
+# check for a pattern TvShow : Season 1: EpisodeTitle
+_SEASON_NUMBER = re.compile(r"(.+): .+ (\d{1,2}): (.*)")
+# Check for TvShow : Season 1 - Part A: EpisodeTitle
+# Example: Die außergewoehnlichsten Haeuser der Welt: Staffel 2 – Teil B: Spanien
+_SEASON_PART = re.compile(r"(.+): .+ (\d{1,2}) – .+: (.*)")
+# Check for TvShow : TvShow: Miniseries : EpisodeTitle
+_MINISERIES = re.compile(r"(.+): \w+: (.+)")
+# Check for TvShow: SeasonName : EpisodeTitle
+# Example: American Horror Story: Murder House: Nachgeburt
+_SEASON_NAME = re.compile(r"(.+): (.+): (.+)")
+# Check for TvShow: EpisodeTitle
+# sometimes used in this format for the first season of a show
+# Example: "Wednesday: Leid pro quo","29.11.22"
+_EPISODE_ONLY = re.compile(r"(.+): (.+)")
+
+
+def parseEntryTitle(entryTitle: str) -> List[tuple]:
+    """
+    Splits the title of a viewing history entry into the show episode and/or movie it stands for
+
+    :param entryTitle: The title of the entry
+    :type entryTitle: str
+    :return: ("show", show name, season number, season name, episode title) and/or ("movie", title)
+    """
+    for regex in (_SEASON_NUMBER, _SEASON_PART):
+        res = regex.search(entryTitle)
+        if res is not None:
+            return [("show", res.group(1), int(res.group(2)), None, res.group(3))]
+
+    res = _MINISERIES.search(entryTitle)
+    if res is not None:
+        return [("show", res.group(1), 1, None, res.group(2))]
+
+    res = _SEASON_NAME.search(entryTitle)
+    if res is not None:
+        return [("show", res.group(1), None, res.group(2), res.group(3))]
+
+    # @tricky: Also movies sometimes use this format (e.g "King Arthur: Legend of the Sword","17.01.21"),
+    # the entry is added as episode and as movie
+    res = _EPISODE_ONLY.search(entryTitle)
+    if res is not None:
+        return [("show", res.group(1), 1, None, res.group(2)), ("movie", entryTitle)]
+
+    # Else the entry is a movie
+    return [("movie", entryTitle)]
+
+
 # A class that stores all the shows and movies that you have watched on Netflix.
 class NetflixTvHistory(object):
     def __init__(self):
         self.shows = []
         self.movies = []
+        # Names of the shows merged into other shows (see `mergeShowAliases`), alias -> show name
+        self.showAliases: Dict[str, str] = {}
 
     def hasTvShow(self, showName: str) -> bool:
         """
@@ -47,79 +147,31 @@ class NetflixTvHistory(object):
                 return movie
         return None
 
-    def addEntry(self, entryTitle: str, entryDate: str) -> bool:
+    def addEntry(
+        self, entryTitle: str, entryDate: Union[str, datetime.datetime]
+    ) -> bool:
         """
         It takes a string and tries to find a pattern that matches a TV show. If it finds one, it adds
         the TV show to the history list. If it doesn't find one, it adds the string as a movie
 
         :param entryTitle: The title of the entry
         :type entryTitle: str
-        :param entryDate: The date the entry was watched
-        :type entryDate: str
-        :return: A list of tuples.
+        :param entryDate: The date the entry was watched (csv date string or exact datetime)
+        :type entryDate: Union[str, datetime.datetime]
+        :return: True
         """
-
-        # check for a pattern TvShow : Season 1: EpisodeTitle
-        tvshowregex = re.compile(r"(.+): .+ (\d{1,2}): (.*)")
-        res = tvshowregex.search(entryTitle)
-        if res is not None:
-            # found tv show
-            showName = res.group(1)
-            seasonNumber = int(res.group(2))
-            episodeTitle = res.group(3)
-            self.addTvShowEntry(showName, seasonNumber, episodeTitle, entryDate)
-            return True
-
-        # Check for TvShow : Season 1 - Part A: EpisodeTitle
-        # Example: Die außergewoehnlichsten Haeuser der Welt: Staffel 2 – Teil B: Spanien
-        tvshowregex = re.compile(r"(.+): .+ (\d{1,2}) – .+: (.*)")
-        res = tvshowregex.search(entryTitle)
-        if res is not None:
-            # found tv show
-            showName = res.group(1)
-            seasonNumber = int(res.group(2))
-            episodeTitle = res.group(3)
-            self.addTvShowEntry(showName, seasonNumber, episodeTitle, entryDate)
-            return True
-
-        # Check for TvShow : TvShow: Miniseries : EpisodeTitle
-        tvshowregex = re.compile(r"(.+): \w+: (.+)")
-        res = tvshowregex.search(entryTitle)
-        if res is not None:
-            showName = res.group(1)
-            seasonNumber = 1
-            episodeTitle = res.group(2)
-            self.addTvShowEntry(showName, seasonNumber, episodeTitle, entryDate)
-            return True
-
-        # Check for TvShow: SeasonName : EpisodeTitle
-        # Example: American Horror Story: Murder House: Nachgeburt
-        tvshowregex = re.compile(r"(.+): (.+): (.+)")
-        res = tvshowregex.search(entryTitle)
-        if res is not None:
-            showName = res.group(1)
-            seasonName = res.group(2)
-            episodeTitle = res.group(3)
-            self.addTvShowEntry(
-                showName, None, episodeTitle, entryDate, seasonName=seasonName
-            )
-            return True
-
-        # Check for TvShow: EpisodeTitle
-        # sometimes used in this format for the first season of a show
-        # Example: "Wednesday: Leid pro quo","29.11.22"
-        # @tricky: Also movies sometimes use this format (e.g "King Arthur: Legend of the Sword","17.01.21")
-        tvshowregex = re.compile(r"(.+): (.+)")
-        res = tvshowregex.search(entryTitle)
-        if res is not None:
-            showName = res.group(1)
-            seasonNumber = 1
-            episodeTitle = res.group(2)
-            self.addTvShowEntry(showName, seasonNumber, episodeTitle, entryDate)
-            # no return here in order to add it also as a movie (as it can have the same format)
-
-        # Else the entry is a movie
-        self.addMovieEntry(entryTitle, entryDate)
+        for entry in parseEntryTitle(entryTitle):
+            if entry[0] == "show":
+                _, showName, seasonNumber, seasonName, episodeTitle = entry
+                self.addTvShowEntry(
+                    showName,
+                    seasonNumber,
+                    episodeTitle,
+                    entryDate,
+                    seasonName=seasonName,
+                )
+            else:
+                self.addMovieEntry(entry[1], entryDate)
         return True
 
     def addTvShowEntry(
@@ -127,7 +179,7 @@ class NetflixTvHistory(object):
         showName: str,
         seasonNumber: Union[int, None],
         episodeTitle: str,
-        watchedDate: str,
+        watchedDate: Union[str, datetime.datetime],
         seasonName: Optional[str] = None,
     ) -> None:
         """
@@ -140,7 +192,7 @@ class NetflixTvHistory(object):
         :param episodeTitle: The title of the episode
         :type episodeTitle: str
         :param watchedDate: The date the episode was watched
-        :type watchedDate: str
+        :type watchedDate: Union[str, datetime.datetime]
         :param seasonName: The name of the season, if it has one
         :type seasonName: Optional[str]
         """
@@ -168,7 +220,7 @@ class NetflixTvHistory(object):
         It adds a movie to the list of movies and adds the date it was watched to the movie.
 
         :param movieTitle: The title of the movie you want to add
-        :param watchedDate: a string in the format "YYYY-MM-DD" or similar (as given in the config)
+        :param watchedDate: a string in the format "YYYY-MM-DD" or similar (as given in the config) or a datetime
         :return: The movie object that was just added to the list of movies.
         """
         movie = self.getMovie(movieTitle)
@@ -181,6 +233,164 @@ class NetflixTvHistory(object):
             movie.addWatchedDate(watchedDate)
             return movie
 
+    def toDict(self) -> dict:
+        """
+        Returns all shows and movies including the resolved TMDB ids, e.g. to store them between runs
+        :return: A dictionary with two keys, "tvshows" and "movies". Can be read with `fromDict`.
+        """
+        return {
+            "tvshows": [show.toDict() for show in self.shows],
+            "movies": [movie.toDict() for movie in self.movies],
+        }
+
+    @classmethod
+    def fromDict(cls, data: dict) -> "NetflixTvHistory":
+        """
+        Creates a history from the output of `toDict`
+        :param data: A dictionary as returned by `toDict`
+        :type data: dict
+        :return: The history
+        """
+        history = cls()
+        history.shows = [NetflixTvShow.fromDict(show) for show in data["tvshows"]]
+        history.movies = [NetflixMovie.fromDict(movie) for movie in data["movies"]]
+        return history
+
+    def getTvShowNames(self) -> List[str]:
+        """
+        Returns the names of all shows, in the order they were added
+        :return: The show names
+        """
+        return [show.name for show in self.shows]
+
+    def mergeShowAliases(
+        self, showIds: Optional[Dict[str, int]] = None
+    ) -> Dict[str, str]:
+        """
+        Merges shows that Netflix lists under several names, so every show is resolved once.
+        Names are aliases if they are equal after normalization (see `showNameKey`), if one is the
+        other with a localized subtitle ("Peaky Blinders – Gangs of Birmingham" and "Peaky Blinders",
+        only if there is no other subtitle), or if they were resolved to the same TMDB id before. Names with different known ids are
+        never merged.
+
+        :param showIds: Known TMDB ids by show name (e.g. the title overrides)
+        :type showIds: Optional[Dict[str, int]]
+        :return: The merged names, alias -> name of the show it was merged into
+        """
+        showIds = showIds or {}
+        names = self.getTvShowNames()
+        parent = {name: name for name in names}
+        ids = {name: showIds.get(name) for name in names}
+
+        def find(name):
+            while parent[name] != name:
+                parent[name] = parent[parent[name]]
+                name = parent[name]
+            return name
+
+        def union(name, alias):
+            root, aliasRoot = find(name), find(alias)
+            if root == aliasRoot:
+                return
+            if ids[root] is not None and ids[aliasRoot] is not None:
+                if ids[root] != ids[aliasRoot]:
+                    return
+            parent[aliasRoot] = root
+            ids[root] = ids[root] if ids[root] is not None else ids[aliasRoot]
+
+        byKey: Dict[str, str] = {}
+        byId: Dict[int, str] = {}
+        for name in names:
+            union(byKey.setdefault(showNameKey(name), name), name)
+            if showIds.get(name) is not None:
+                union(byId.setdefault(showIds[name], name), name)
+        # several different subtitles of a name are different shows ("Star Wars - Rebels")
+        subtitles: Dict[str, Dict[str, List[str]]] = {}
+        for name in names:
+            base, subtitle = splitSubtitle(name)
+            if subtitle is not None and showNameKey(base) in byKey:
+                baseSubtitles = subtitles.setdefault(showNameKey(base), {})
+                baseSubtitles.setdefault(showNameKey(subtitle), []).append(name)
+        for baseKey, baseSubtitles in subtitles.items():
+            if len(baseSubtitles) == 1:
+                for name in next(iter(baseSubtitles.values())):
+                    union(byKey[baseKey], name)
+
+        groups: Dict[str, List[str]] = {}
+        for name in names:
+            groups.setdefault(find(name), []).append(name)
+        order = {name: i for i, name in enumerate(names)}
+        aliases: Dict[str, str] = {}
+        merges: Dict[str, List[str]] = {}
+        for members in groups.values():
+            if len(members) == 1:
+                continue
+            # keep a name with a known id, else the name without subtitle, else the first one
+            target = min(
+                members,
+                key=lambda n: (
+                    showIds.get(n) is None,
+                    splitSubtitle(n)[1] is not None,
+                    order[n],
+                ),
+            )
+            merges[target] = [name for name in members if name != target]
+            for alias in merges[target]:
+                aliases[alias] = target
+                logging.info(f"Merging show {alias} into {target}")
+        if merges:
+            self._mergeTvShows(merges)
+        for alias, target in self.showAliases.items():
+            self.showAliases[alias] = aliases.get(target, target)
+        self.showAliases.update(aliases)
+        return aliases
+
+    def _mergeTvShows(self, merges: Dict[str, List[str]]):
+        """
+        Moves the seasons and episodes of the aliases into the target shows and removes the aliases
+        :param merges: target show name -> alias names
+        """
+        shows = {show.name: show for show in self.shows}
+        for name, aliases in merges.items():
+            for alias in aliases:
+                shows[name].merge(shows[alias])
+        removed = {alias for aliases in merges.values() for alias in aliases}
+        self.shows = [show for show in self.shows if show.name not in removed]
+
+    def merge(self, other: "NetflixTvHistory"):
+        """
+        Adds all shows, seasons, episodes, movies and watch dates of another history, e.g. one parsed
+        from a later part of the same file. New shows and movies are appended in the order of `other`,
+        so merging the histories of consecutive parts gives the history of the whole file.
+
+        :param other: The history to add
+        :type other: NetflixTvHistory
+        """
+        shows = {show.name: show for show in self.shows}
+        for show in other.shows:
+            if show.name not in shows:
+                shows[show.name] = NetflixTvShow(show.name)
+                self.shows.append(shows[show.name])
+            shows[show.name].merge(show)
+        movies = {movie.name: movie for movie in self.movies}
+        for movie in other.movies:
+            if movie.name not in movies:
+                movies[movie.name] = NetflixMovie(movie.name)
+                self.movies.append(movies[movie.name])
+            movies[movie.name]._watchedAt |= movie._watchedAt
+
+    def storeTvShow(self, show: "NetflixTvShow"):
+        """
+        Stores changes of a show (e.g. resolved ids). The shows are kept in memory, so nothing needs to be done.
+        :param show: A show of this history
+        """
+
+    def storeMovie(self, movie: "NetflixMovie"):
+        """
+        Stores changes of a movie (e.g. the resolved id). Nothing needs to be done for the in-memory history.
+        :param movie: A movie of this history
+        """
+
     def getJson(self) -> dict:
         """
         It takes the data from the objects and puts it into a dictionary
@@ -188,25 +398,18 @@ class NetflixTvHistory(object):
         """
         jsonOut: dict = {"tvshows": {}, "movies": {}}
         for show in self.shows:
-            jsonOut["tvshows"][show.name] = []
-            for season in show.seasons:
-                jsonOut["tvshows"][show.name].append(
-                    {
-                        "SeasonNumber": season.number,
-                        "SeasonName": season.name,
-                        "episodes": {},
-                    }
-                )
-                for episode in season.episodes:
-                    jsonOut["tvshows"][show.name][-1]["episodes"][episode.name] = []
-                    for watchedAt in episode.watchedAt:
-                        jsonOut["tvshows"][show.name][-1]["episodes"][
-                            episode.name
-                        ].append(watchedAt)
+            jsonOut["tvshows"][show.name] = [
+                {
+                    "SeasonNumber": season.number,
+                    "SeasonName": season.name,
+                    "episodes": {
+                        episode.name: episode.watchedAt for episode in season.episodes
+                    },
+                }
+                for season in show.seasons
+            ]
         for movie in self.movies:
-            jsonOut["movies"][movie.name] = []
-            for watchedAt in movie.watchedAt:
-                jsonOut["movies"][movie.name].append(watchedAt)
+            jsonOut["movies"][movie.name] = movie.watchedAt
         return jsonOut
 
 
@@ -221,17 +424,34 @@ class NetflixWatchableItem(object):
     def watchedAt(self):
         return list(self._watchedAt)
 
-    def addWatchedDate(self, watchedDate: str):
-        try:
-            # Netflix exports only have the date. Add an arbitrary time.
-            time = datetime.datetime.strptime(
-                watchedDate + " 20:15", config.CSV_DATETIME_FORMAT + " %H:%M"
-            )
-        except ValueError:
-            # try the date with a dot (also for backwards compatbility)
-            watchedDate = re.sub("[^0-9]", ".", watchedDate)
-            time = datetime.datetime.strptime(watchedDate + " 20:15", "%m.%d.%y %H:%M")
-        return self._watchedAt.add(time.strftime("%Y-%m-%dT%H:%M:%S.00Z"))
+    def _watchedAtFromDict(self, data: dict):
+        self._watchedAt = set(data["watchedAt"])
+
+    def addWatchedDate(self, watchedDate: Union[str, datetime.datetime]):
+        return self._watchedAt.add(formatWatchedDate(watchedDate))
+
+
+def formatWatchedDate(watchedDate: Union[str, datetime.datetime]) -> str:
+    """
+    Converts a watch date to the timestamp format used by Trakt
+
+    :param watchedDate: The csv date string (as given in the config) or an exact datetime
+    :type watchedDate: Union[str, datetime.datetime]
+    :return: The timestamp, e.g. "2021-02-05T20:15:00.00Z"
+    """
+    if isinstance(watchedDate, datetime.datetime):
+        # Exact timestamp (e.g. from the ViewingActivity.csv export)
+        return watchedDate.strftime("%Y-%m-%dT%H:%M:%S.00Z")
+    try:
+        # Netflix exports only have the date. Add an arbitrary time.
+        time = datetime.datetime.strptime(
+            watchedDate + " 20:15", config.CSV_DATETIME_FORMAT + " %H:%M"
+        )
+    except ValueError:
+        # try the date with a dot (also for backwards compatbility)
+        watchedDate = re.sub("[^0-9]", ".", watchedDate)
+        time = datetime.datetime.strptime(watchedDate + " 20:15", "%m.%d.%y %H:%M")
+    return time.strftime("%Y-%m-%dT%H:%M:%S.00Z")
 
 
 # The `NetflixMovie` class is a subclass of the `NetflixWatchableItem` class
@@ -240,6 +460,20 @@ class NetflixMovie(NetflixWatchableItem):
         super().__init__(movieName)
         self.tmdbId = None
 
+    def toDict(self) -> dict:
+        return {
+            "name": self.name,
+            "tmdbId": self.tmdbId,
+            "watchedAt": sorted(self._watchedAt),
+        }
+
+    @classmethod
+    def fromDict(cls, data: dict) -> "NetflixMovie":
+        movie = cls(data["name"])
+        movie.tmdbId = data["tmdbId"]
+        movie._watchedAtFromDict(data)
+        return movie
+
 
 # `NetflixTvShowEpisode` is a `NetflixWatchableItem` that has a `tmdbId` and a `number`
 class NetflixTvShowEpisode(NetflixWatchableItem):
@@ -248,6 +482,22 @@ class NetflixTvShowEpisode(NetflixWatchableItem):
         self.tmdbId = None
         self.number: Union[int, None] = None
 
+    def toDict(self) -> dict:
+        return {
+            "name": self.name,
+            "tmdbId": self.tmdbId,
+            "number": self.number,
+            "watchedAt": sorted(self._watchedAt),
+        }
+
+    @classmethod
+    def fromDict(cls, data: dict) -> "NetflixTvShowEpisode":
+        episode = cls(data["name"])
+        episode.tmdbId = data["tmdbId"]
+        episode.number = data["number"]
+        episode._watchedAtFromDict(data)
+        return episode
+
     def setEpisodeNumber(self, number: Union[int, None]):
         """
         Sets the episode number
@@ -272,6 +522,21 @@ class NetflixTvShowSeason(object):
         self.name: Optional[str] = seasonName
         self.episodes: list[NetflixTvShowEpisode] = []
 
+    def toDict(self) -> dict:
+        return {
+            "number": self.number,
+            "name": self.name,
+            "episodes": [episode.toDict() for episode in self.episodes],
+        }
+
+    @classmethod
+    def fromDict(cls, data: dict) -> "NetflixTvShowSeason":
+        season = cls(data["number"], data["name"])
+        season.episodes = [
+            NetflixTvShowEpisode.fromDict(episode) for episode in data["episodes"]
+        ]
+        return season
+
     def addEpisode(self, episodeName: str):
         """
         If the episode already exists, return it. Otherwise, add it to the list of episodes and return it
@@ -301,13 +566,47 @@ class NetflixTvShowSeason(object):
         return None
 
 
-# The NetflixTvShow class represents a TV show on Netflix. It has a name, and a list of seasons
+# The NetflixTvShow class represents a TV show on Netflix. It has a name, a list of seasons and the TMDB id once resolved
 class NetflixTvShow(object):
     def __init__(self, showName: str):
         self.name: str = showName
         self.seasons: list[NetflixTvShowSeason] = []
+        self.tmdbId: Optional[int] = None
+
+    def toDict(self) -> dict:
+        return {
+            "name": self.name,
+            "tmdbId": self.tmdbId,
+            "seasons": [season.toDict() for season in self.seasons],
+        }
+
+    @classmethod
+    def fromDict(cls, data: dict) -> "NetflixTvShow":
+        show = cls(data["name"])
+        show.tmdbId = data["tmdbId"]
+        show.seasons = [
+            NetflixTvShowSeason.fromDict(season) for season in data["seasons"]
+        ]
+        return show
+
+    def merge(self, other: "NetflixTvShow"):
+        """
+        Adds the seasons, episodes and watch dates of another show, seasons are matched like in `addSeason`
 
-    def addSeason(self, seasonNumber: int, seasonName: str) -> NetflixTvShowSeason:
+        :param other: The show to add
+        :type other: NetflixTvShow
+        """
+        if self.tmdbId is None:
+            self.tmdbId = other.tmdbId
+        for season in other.seasons:
+            targetSeason = self.addSeason(season.number, season.name)
+            for episode in season.episodes:
+                targetEpisode = targetSeason.addEpisode(episode.name)
+                targetEpisode._watchedAt |= episode._watchedAt
+
+    def addSeason(
+        self, seasonNumber: int, seasonName: Optional[str]
+    ) -> NetflixTvShowSeason:
         """
         If the season doesn't exist, add it to the list of seasons
 
@@ -340,7 +639,9 @@ class NetflixTvShow(object):
                 return season
         return None
 
-    def getSeasonByName(self, seasonName: str) -> Union[NetflixTvShowSeason, None]:
+    def getSeasonByName(
+        self, seasonName: Optional[str]
+    ) -> Union[NetflixTvShowSeason, None]:
         """
         Returns a season object from the seasons list if the name of the season matches the
         name passed to the function, otherwise none
@@ -0,0 +1,77 @@
+import csv
+import datetime
+from typing import Iterator, Optional, TextIO, Tuple
+
+# Columns of the ViewingActivity.csv file from the Netflix "download your personal information" archive
+PROFILE_COLUMN = "Profile Name"
+START_TIME_COLUMN = "Start Time"
+DURATION_COLUMN = "Duration"
+TITLE_COLUMN = "Title"
+SUPPLEMENTAL_COLUMN = "Supplemental Video Type"
+
+# Start times are given in UTC
+START_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def isViewingActivityHeader(headerLine: str) -> bool:
+    """
+    Checks if the first line of a csv file is the header of a ViewingActivity.csv file
+
+    :param headerLine: The first line of the csv file
+    :type headerLine: str
+    :return: `True` for the full viewing activity export, `False` otherwise (e.g. "Title,Date")
+    """
+    return PROFILE_COLUMN in headerLine and START_TIME_COLUMN in headerLine
+
+
+def parseDuration(duration: str) -> int:
+    """
+    Converts a duration like "00:45:12" to seconds
+
+    :param duration: The duration in the format hours:minutes:seconds
+    :type duration: str
+    :return: The duration in seconds (0 if it cannot be parsed)
+    """
+    try:
+        hours, minutes, seconds = duration.split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+    except ValueError:
+        return 0
+
+
+def readViewingActivity(
+    csvFile: TextIO,
+    profileName: Optional[str] = None,
+    minDuration: int = 0,
+    delimiter: str = ",",
+) -> Iterator[Tuple[str, datetime.datetime]]:
+    """
+    Streams the viewing sessions of a ViewingActivity.csv file row by row
+
+    Trailers, teasers and other supplemental videos are dropped as well as sessions
+    shorter than `minDuration` and sessions of other profiles.
+
+    :param csvFile: The opened csv file (including the header line)
+    :type csvFile: TextIO
+    :param profileName: Only return sessions of this profile (all profiles if None)
+    :type profileName: Optional[str]
+    :param minDuration: Minimum duration of a session in seconds
+    :type minDuration: int
+    :param delimiter: Delimiter of the csv file
+    :type delimiter: str
+    :return: An iterator of (title, start time) tuples
+    """
+    for row in csv.DictReader(csvFile, delimiter=delimiter):
+        if profileName is not None and row[PROFILE_COLUMN] != profileName:
+            continue
+        if row.get(SUPPLEMENTAL_COLUMN):
+            continue
+        if parseDuration(row[DURATION_COLUMN]) < minDuration:
+            continue
+        try:
+            startTime = datetime.datetime.strptime(
+                row[START_TIME_COLUMN], START_TIME_FORMAT
+            )
+        except ValueError:
+            continue
+        yield row[TITLE_COLUMN], startTime
@@ -0,0 +1,134 @@
+import csv
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+from typing import Iterator, List, Optional, Tuple
+
+import config
+from HistoryDatesFixer import convertRows, detectDateFormat
+from NetflixTvShow import NetflixTvHistory
+
+logging.basicConfig(filename=config.LOG_FILENAME, level=config.LOG_LEVEL)
+
+# Files are only split into parts of at least this size, smaller files are parsed serially
+MIN_CHUNK_SIZE = 1 << 20
+# Parts per worker, more parts spread the work more evenly
+CHUNKS_PER_WORKER = 4
+
+
+def splitChunks(inputFile: str, chunks: int) -> List[Tuple[int, int]]:
+    """
+    Splits a csv file (without its header line) into byte ranges that start and end at line boundaries.
+    Rows must not contain line breaks, which is the case for Netflix viewing history files.
+
+    :param inputFile: The csv file
+    :type inputFile: str
+    :param chunks: The (maximum) number of byte ranges
+    :type chunks: int
+    :return: (start, end) byte offsets, in file order
+    """
+    size = os.path.getsize(inputFile)
+    with open(inputFile, "rb") as f:
+        f.readline()  # header
+        start = f.tell()
+        bounds = [start]
+        for i in range(1, chunks):
+            offset = start + (size - start) * i // chunks
+            if offset <= bounds[-1]:
+                continue
+            f.seek(offset - 1)
+            f.readline()  # to the start of the next line
+            if bounds[-1] < f.tell() < size:
+                bounds.append(f.tell())
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def parseChunk(
+    inputFile: str,
+    start: int,
+    end: int,
+    delimiter: str,
+    inputFormat: Optional[str] = None,
+) -> NetflixTvHistory:
+    """
+    Parses a byte range of a "Title,Date" viewing history file (see `splitChunks`) into a history
+
+    :param inputFile: The viewing history file
+    :param start: First byte of the range (at the start of a line)
+    :param end: End of the range (at the start of a line or the end of the file)
+    :param delimiter: Delimiter used in the csv file
+    :param inputFormat: Date format of the file, dates are converted to the configured format (None = keep)
+    :return: The history of the rows in the range
+    """
+    with open(inputFile, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # same newline handling as the serial parser (text mode)
+    rows: Iterator[List[str]] = csv.reader(
+        io.TextIOWrapper(io.BytesIO(data), encoding="utf-8"), delimiter=delimiter
+    )
+    if inputFormat is not None:
+        rows = convertRows(rows, config.CSV_DATETIME_FORMAT, inputFormat)
+    netflixHistory = NetflixTvHistory()
+    for row in rows:
+        if len(row) < 2:
+            continue
+        netflixHistory.addEntry(row[0], row[1])
+    return netflixHistory
+
+
+def parseParallel(
+    inputFile: str,
+    delimiter: str,
+    workers: int,
+    netflixHistory: Optional[NetflixTvHistory] = None,
+    detectFormat: bool = False,
+) -> Optional[NetflixTvHistory]:
+    """
+    Parses a "Title,Date" viewing history file with a process pool. The file is split into byte ranges,
+    every range is parsed into a partial history and the partial histories are merged in file order,
+    so the result is the same as parsing the file serially.
+
+    :param inputFile: The viewing history file
+    :param delimiter: Delimiter used in the csv file
+    :param workers: Number of processes
+    :param netflixHistory: The (empty) history to fill, a new in-memory `NetflixTvHistory` if None
+    :param detectFormat: Detect the date format from the first rows and convert the dates
+    :return: The history or None if the file is too small to be split
+    """
+    chunks = min(
+        workers * CHUNKS_PER_WORKER, os.path.getsize(inputFile) // MIN_CHUNK_SIZE
+    )
+    ranges = splitChunks(inputFile, max(1, chunks))
+    if len(ranges) < 2:
+        return None
+
+    inputFormat = None
+    if detectFormat:
+        # the same sample as `convertRows` in the serial parser
+        with open(inputFile, mode="r", encoding="utf-8-sig") as csvFile:
+            sample = list(islice(csv.reader(csvFile, delimiter=delimiter), 1, 1001))
+        inputFormat = detectDateFormat([row[1] for row in sample if len(row) > 1])
+        logging.info(f"Detected date format {inputFormat}")
+        if inputFormat == config.CSV_DATETIME_FORMAT:
+            inputFormat = None
+
+    if netflixHistory is None:
+        netflixHistory = NetflixTvHistory()
+    with ProcessPoolExecutor(workers) as executor:
+        # map returns the partial histories in file order
+        partials = executor.map(
+            parseChunk,
+            repeat(inputFile),
+            [start for start, _ in ranges],
+            [end for _, end in ranges],
+            repeat(delimiter),
+            repeat(inputFormat),
+        )
+        for partial in partials:
+            netflixHistory.merge(partial)
+    logging.info(f"Parsed {len(ranges)} parts of {inputFile} with {workers} processes")
+    return netflixHistory
@@ -0,0 +1,116 @@
+import heapq
+import itertools
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Number of seasons assumed for shows whose seasons are matched by name: all seasons of the
+# show are requested, but their number is only known after the show details were requested
+ASSUMED_SEASONS = 3
+
+_END = object()
+
+
+def estimateShowCost(
+    show, languageSearch=False, overrides=None, titleIndex=None
+) -> int:
+    """
+    Estimates the number of TMDB requests needed to resolve a show (see `getShowInformation`)
+
+    :param show: A show that was identified when parsing Netflix viewing history
+    :param languageSearch: Episode translations are requested for every episode
+    :param overrides: Optional title overrides, known show ids and season numbers need no requests
+    :param titleIndex: Optional offline title index, shows found in it are not searched
+    :return: The estimated number of requests
+    """
+    cost = 1  # show details
+    known = overrides is not None and overrides.getShowId(show.name) is not None
+    if not known and titleIndex is not None:
+        known = len(titleIndex.lookup("tv", show.name)) > 0
+    if not known:
+        cost += 1  # search
+
+    numbers = set()
+    namedSeasons = 0
+    episodes = 0
+    for season in show.seasons:
+        if season.number is None and season.name is None:
+            continue
+        number = season.number
+        if number is None and overrides is not None:
+            number = overrides.getSeasonNumber(show.name, season.name)
+        if number is None:
+            namedSeasons += 1
+        else:
+            numbers.add(int(number))
+        episodes += len(season.episodes)
+
+    if namedSeasons:
+        # all seasons of the show are requested to find the season names
+        cost += max(
+            len(numbers) + namedSeasons, max(numbers, default=0), ASSUMED_SEASONS
+        )
+    else:
+        cost += len(numbers)
+    if languageSearch:
+        cost += episodes
+    return cost
+
+
+def runLongestFirst(
+    items: Iterable[T],
+    cost: Callable[[T], float],
+    work: Callable[[T], object],
+    workers: int = 1,
+    window: int = 1000,
+) -> Iterator[Tuple[T, float, float]]:
+    """
+    Runs `work` for all items, the most expensive ones first: every free worker takes the most
+    expensive waiting item (longest processing time first), so long items do not end up
+    running alone at the end. Items are read lazily, only `window` items wait at a time.
+
+    :param items: The items, e.g. the shows of a history
+    :param cost: Returns the estimated cost of an item
+    :param work: Called for every item, in worker threads if `workers` > 1
+    :param workers: Number of items processed at the same time
+    :param window: Maximum number of items read ahead and ordered by their cost
+    :return: (item, cost, duration in seconds) of every item, in order of completion
+        (in the calling thread)
+    """
+    remaining = iter(items)
+    waiting: list = []  # heap of (-cost, read order, item)
+    order = itertools.count()
+
+    def fill():
+        while len(waiting) < window:
+            item = next(remaining, _END)
+            if item is _END:
+                return
+            heapq.heappush(waiting, (-cost(item), next(order), item))
+
+    def timed(item):
+        started = time.perf_counter()
+        work(item)
+        return time.perf_counter() - started
+
+    fill()
+    if workers <= 1:
+        while waiting:
+            negativeCost, _, item = heapq.heappop(waiting)
+            fill()
+            yield item, -negativeCost, timed(item)
+        return
+
+    with ThreadPoolExecutor(workers, thread_name_prefix="schedule") as executor:
+        running: dict = {}
+        while waiting or running:
+            while waiting and len(running) < workers:
+                negativeCost, _, item = heapq.heappop(waiting)
+                running[executor.submit(timed, item)] = (item, -negativeCost)
+                fill()
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                item, itemCost = running.pop(future)
+                yield item, itemCost, future.result()
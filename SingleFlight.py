@@ -0,0 +1,56 @@
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+# Coalesces concurrent calls with the same key: only the first caller executes the
+# function, all callers arriving while it is in flight wait for and share its result
+class SingleFlight(object):
+    def __init__(self):
+        self._lock = Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, function: Callable, *args, **kwargs):
+        """
+        Calls `function(*args, **kwargs)` unless a call with the same key is already in flight
+
+        :param key: Identifies identical calls, e.g. (endpoint, parameters)
+        :type key: Hashable
+        :param function: The function to call
+        :type function: Callable
+        :return: The result of the (shared) call. Errors are raised to all waiting callers.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
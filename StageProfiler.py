@@ -0,0 +1,137 @@
+import cProfile
+import heapq
+import logging
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+import config
+
+logging.basicConfig(filename=config.LOG_FILENAME, level=config.LOG_LEVEL)
+
+
+# Profiles the stages of a run with cProfile and tracemalloc. For every stage a <stage>.pstats
+# file (open it with `python -m pstats` or snakeviz) and a <stage>.allocations.txt report with the
+# largest allocations are written to the output directory. Threads started during a stage (e.g. the
+# TMDB request workers) are profiled as well, their profiles are added to the one of the stage.
+class StageProfiler(object):
+    def __init__(
+        self,
+        outputDir: Optional[str],
+        slowestCalls: int = 0,
+        topAllocations: int = 25,
+    ):
+        """
+        :param outputDir: Directory for the reports, None disables profiling
+        :type outputDir: Optional[str]
+        :param slowestCalls: Number of the slowest recorded calls to report
+        :type slowestCalls: int
+        :param topAllocations: Number of allocation sites in the allocation reports
+        :type topAllocations: int
+        """
+        self.outputDir = outputDir
+        self.slowestCalls = slowestCalls
+        self.topAllocations = topAllocations
+        # min-heap of the (duration, label) of the slowest calls
+        self._calls: List[Tuple[float, str]] = []
+        if outputDir is not None:
+            os.makedirs(outputDir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.outputDir is not None
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.outputDir, filename)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Profiles the code run in the context. Stages must not be nested.
+
+        :param name: Name of the stage, used for the report files
+        :type name: str
+        """
+        if not self.enabled:
+            yield
+            return
+
+        threadProfiles: List[cProfile.Profile] = []
+        lock = threading.Lock()
+
+        def profileThread(frame, event, arg):
+            # called for the first event of every new thread, replaced by a profiler of the thread
+            sys.setprofile(None)
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python >= 3.12: the profiler of the stage already sees all threads
+                return
+            with lock:
+                threadProfiles.append(profile)
+
+        tracemalloc.start()
+        profile = cProfile.Profile()
+        profile.enable()
+        threading.setprofile(profileThread)
+        try:
+            yield
+        finally:
+            threading.setprofile(None)
+            profile.disable()
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            stats = pstats.Stats(profile)
+            with lock:
+                for threadProfile in threadProfiles:
+                    stats.add(threadProfile)
+            stats.dump_stats(self._path(f"{name}.pstats"))
+            self._writeAllocations(name, snapshot, current, peak)
+            logging.info(f"Profile of stage {name} written to {self.outputDir}")
+
+    def _writeAllocations(self, name, snapshot, current, peak):
+        snapshot = snapshot.filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),)
+        )
+        with open(self._path(f"{name}.allocations.txt"), "w", encoding="utf-8") as f:
+            f.write(
+                f"Stage {name}: {current / 2**20:.1f} MiB allocated at the end, "
+                f"peak {peak / 2**20:.1f} MiB\n\n"
+            )
+            for statistic in snapshot.statistics("lineno")[: self.topAllocations]:
+                f.write(f"{statistic}\n")
+
+    def recordCall(self, label: str, duration: float):
+        """
+        Records the duration of a call, the slowest ones are written by `writeSlowestCalls`
+
+        :param label: Description of the call (e.g. the show name)
+        :type label: str
+        :param duration: Duration in seconds
+        :type duration: float
+        """
+        if not self.enabled or self.slowestCalls <= 0:
+            return
+        if len(self._calls) < self.slowestCalls:
+            heapq.heappush(self._calls, (duration, label))
+        elif duration > self._calls[0][0]:
+            heapq.heapreplace(self._calls, (duration, label))
+
+    def writeSlowestCalls(self, filename: str):
+        """
+        Writes the slowest recorded calls, slowest first
+
+        :param filename: Name of the report file in the output directory
+        :type filename: str
+        """
+        if not self.enabled or not self._calls:
+            return
+        with open(self._path(filename), "w", encoding="utf-8") as f:
+            for duration, label in sorted(self._calls, reverse=True):
+                f.write(f"{duration:8.2f}s  {label}\n")
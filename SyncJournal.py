@@ -0,0 +1,93 @@
+import datetime
+import glob
+import json
+import os
+from threading import Lock
+from typing import List, Optional, Tuple
+
+JOURNAL_SUFFIX = ".ndjson"
+ROLLED_BACK_SUFFIX = ".rolledback"
+
+
+# Records the history items posted to Trakt in a run, one json object per line
+# ({"type": "episodes" or "movies", "item": {"ids": ..., "watched_at": ...}}), so that the
+# run can be rolled back. The file is created when the first page is recorded.
+class SyncJournal(object):
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.recorded = 0
+        self._file = None
+        self._lock = Lock()
+
+    def record(self, pageItems: List[Tuple[str, dict]]):
+        """
+        Appends the items of a page that was posted successfully
+
+        :param pageItems: (type, item) pairs
+        :type pageItems: List[Tuple[str, dict]]
+        """
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+                self._file = open(self.filename, "a", encoding="utf-8")
+            for key, item in pageItems:
+                entry = {
+                    "type": key,
+                    "item": {"ids": item["ids"], "watched_at": item["watched_at"]},
+                }
+                self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            self.recorded += len(pageItems)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def newJournalFilename(directory: str) -> str:
+    """
+    Returns the journal filename of a new run, named by the current time
+
+    :param directory: The journal directory
+    :type directory: str
+    """
+    name = datetime.datetime.now().strftime("sync-%Y%m%d-%H%M%S-%f")
+    return os.path.join(directory, name + JOURNAL_SUFFIX)
+
+
+def latestJournal(directory: str) -> Optional[str]:
+    """
+    Returns the journal of the last run that was not rolled back
+
+    :param directory: The journal directory
+    :type directory: str
+    :return: The journal filename or None
+    """
+    journals = sorted(glob.glob(os.path.join(directory, "sync-*" + JOURNAL_SUFFIX)))
+    return journals[-1] if journals else None
+
+
+def readJournal(filename: str) -> List[Tuple[str, dict]]:
+    """
+    Reads the items recorded in a journal
+
+    :param filename: The journal file
+    :type filename: str
+    :return: (type, item) pairs
+    """
+    items = []
+    with open(filename, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                items.append((entry["type"], entry["item"]))
+    return items
+
+
+def markRolledBack(filename: str) -> str:
+    """Renames a journal after its rollback, so it is not rolled back again"""
+    rolledBack = filename + ROLLED_BACK_SUFFIX
+    os.replace(filename, rolledBack)
+    return rolledBack
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import logging
+import os.path
+from typing import Dict, Optional, Tuple
+
+import config
+
+# Setup logging
+logging.basicConfig(filename=config.LOG_FILENAME, level=config.LOG_LEVEL)
+
+# Columns of an override file, e.g.
+#   show,Haus des Geldes,71446,,
+#   season,American Horror Story,,Murder House,1
+#   movie,King Arthur: Legend of the Sword,274857,,
+FIELDNAMES = ("type", "name", "tmdb_id", "season_name", "season_number")
+
+
+# User-supplied Netflix title -> TMDB id / season number mapping, consulted before any API call
+class TitleOverrides(object):
+    def __init__(self):
+        self.shows: Dict[str, int] = {}
+        self.movies: Dict[str, int] = {}
+        self.seasons: Dict[Tuple[str, str], int] = {}
+
+    def __len__(self):
+        return len(self.shows) + len(self.movies) + len(self.seasons)
+
+    @classmethod
+    def load(cls, filename: Optional[str]) -> "TitleOverrides":
+        """
+        Loads an override file. A missing file results in an empty override table.
+
+        :param filename: The csv file with the overrides (or None)
+        :type filename: Optional[str]
+        :return: The loaded overrides
+        """
+        overrides = cls()
+        if filename is None or not os.path.isfile(filename):
+            return overrides
+        with open(filename, mode="r", encoding="utf-8", newline="") as csvFile:
+            for row in csv.DictReader(csvFile, fieldnames=FIELDNAMES):
+                try:
+                    if row["type"] == "show":
+                        overrides.shows[row["name"]] = int(row["tmdb_id"])
+                    elif row["type"] == "movie":
+                        overrides.movies[row["name"]] = int(row["tmdb_id"])
+                    elif row["type"] == "season":
+                        overrides.seasons[(row["name"], row["season_name"])] = int(
+                            row["season_number"]
+                        )
+                except (TypeError, ValueError):
+                    # header line or invalid entry
+                    logging.debug(f"Ignoring override entry {row}")
+        logging.info(f"Loaded {len(overrides)} title overrides from {filename}")
+        return overrides
+
+    def save(self, filename: str):
+        """
+        Writes the overrides to a csv file
+
+        :param filename: The csv file to write
+        :type filename: str
+        """
+        with open(filename, mode="w", encoding="utf-8", newline="") as csvFile:
+            writer = csv.writer(csvFile)
+            writer.writerow(FIELDNAMES)
+            for name, tmdbId in self.shows.items():
+                writer.writerow(("show", name, tmdbId, "", ""))
+            for (name, seasonName), seasonNumber in self.seasons.items():
+                writer.writerow(("season", name, "", seasonName, seasonNumber))
+            for name, tmdbId in self.movies.items():
+                writer.writerow(("movie", name, tmdbId, "", ""))
+
+    def getShowId(self, showName: str) -> Optional[int]:
+        return self.shows.get(showName)
+
+    def getMovieId(self, movieName: str) -> Optional[int]:
+        return self.movies.get(movieName)
+
+    def getSeasonNumber(self, showName: str, seasonName: str) -> Optional[int]:
+        return self.seasons.get((showName, seasonName))
+
+    def addResolved(self, netflixHistory):
+        """
+        Adds all TMDB ids and season numbers that were resolved in a run
+
+        :param netflixHistory: A `NetflixTvHistory` after show and movie resolution
+        """
+        for show in netflixHistory.shows:
+            if show.tmdbId is None:
+                continue
+            self.shows[show.name] = show.tmdbId
+            for season in show.seasons:
+                if season.name is not None and season.number is not None:
+                    self.seasons[(show.name, season.name)] = season.number
+        for movie in netflixHistory.movies:
+            if movie.tmdbId is not None:
+                self.movies[movie.name] = movie.tmdbId
+
+    def update(self, other: "TitleOverrides", replace: bool = False):
+        """
+        Merges another override table into this one
+
+        :param other: The overrides to merge
+        :type other: TitleOverrides
+        :param replace: If `False`, existing entries are kept (e.g. manual overrides)
+        :type replace: bool
+        """
+        _mergeInto(self.shows, other.shows, replace)
+        _mergeInto(self.movies, other.movies, replace)
+        _mergeInto(self.seasons, other.seasons, replace)
+
+
+def _mergeInto(own: dict, new: dict, replace: bool):
+    for key, value in new.items():
+        if replace or key not in own:
+            own[key] = value
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate title overrides from the resolved ids of a previous run"
+    )
+    parser.add_argument(
+        "resolvedIds",
+        nargs="?",
+        default=config.TMDB_RESOLVED_IDS_FILE,
+        help="Resolved ids written by the last run (default: resolved_ids_file from config.ini)",
+    )
+    parser.add_argument(
+        "overrides",
+        nargs="?",
+        default=config.TMDB_OVERRIDES_FILE or "titleOverrides.csv",
+        help="Override file to update (default: overrides_file from config.ini)",
+    )
+    args = parser.parse_args()
+
+    overrides = TitleOverrides.load(args.overrides)
+    before = len(overrides)
+    # Existing (manual) overrides win over resolved ids
+    overrides.update(TitleOverrides.load(args.resolvedIds))
+    overrides.save(args.overrides)
+    print(f"Added {len(overrides) - before} overrides to {args.overrides}")
+
+
+if __name__ == "__main__":
+    main()
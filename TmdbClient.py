@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from threading import BoundedSemaphore, Lock
+from typing import Optional
+
+from tmdbv3api import TV, Episode, Movie, Season, TMDb
+
+from SingleFlight import SingleFlight
+
+
+# Front of the TMDB API used by the importer. Identical requests (endpoint and parameters)
+# that are in flight at the same time are sent only once and share the response.
+# If the client is shared (e.g. by the jobs of the import service), `maxConcurrentRequests`
+# limits the requests sent at the same time by all users. The results of the last
+# `maxCachedSearches` searches are kept, titles that are searched again need no request.
+class TmdbClient(object):
+    def __init__(
+        self,
+        tmdb: TMDb,
+        maxConcurrentRequests: Optional[int] = None,
+        maxCachedSearches: int = 10000,
+    ):
+        self.tmdb = tmdb
+        self._requests = SingleFlight()
+        self._slots = (
+            BoundedSemaphore(maxConcurrentRequests) if maxConcurrentRequests else None
+        )
+        self.maxCachedSearches = maxCachedSearches
+        self.cachedSearches = 0
+        self._searches: OrderedDict = OrderedDict()
+        self._searchesLock = Lock()
+
+    @property
+    def language(self):
+        return self.tmdb.language
+
+    @property
+    def executedRequests(self) -> int:
+        return self._requests.executed
+
+    @property
+    def coalescedRequests(self) -> int:
+        return self._requests.coalesced
+
+    def _request(self, endpoint, function, **params):
+        key = (endpoint, self.tmdb.language, tuple(sorted(params.items())))
+        return self._requests.do(key, self._send, function, **params)
+
+    def _search(self, endpoint, function, term):
+        key = (endpoint, self.tmdb.language, term)
+        with self._searchesLock:
+            if key in self._searches:
+                self._searches.move_to_end(key)
+                self.cachedSearches += 1
+                return self._searches[key]
+        result = self._request(endpoint, function, term=term)
+        with self._searchesLock:
+            self._searches[key] = result
+            while len(self._searches) > self.maxCachedSearches:
+                self._searches.popitem(last=False)
+        return result
+
+    def _send(self, function, **params):
+        if self._slots is None:
+            return function(**params)
+        with self._slots:
+            return function(**params)
+
+    def searchTv(self, name):
+        return self._search("search/tv", TV().search, name)
+
+    def tvDetails(self, showId):
+        return self._request("tv", TV().details, show_id=showId, append_to_response="")
+
+    def seasonDetails(self, showId, seasonNumber):
+        return self._request(
+            "tv/season",
+            Season().details,
+            tv_id=showId,
+            season_num=seasonNumber,
+            append_to_response="translations",
+        )
+
+    def episodeDetails(self, showId, seasonNumber, episodeNumber):
+        return self._request(
+            "tv/season/episode",
+            Episode().details,
+            tv_id=showId,
+            season_num=seasonNumber,
+            episode_num=episodeNumber,
+            append_to_response="translations",
+        )
+
+    def searchMovie(self, name):
+        return self._search("search/movie", Movie().search, name)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import argparse
+import gzip
+import json
+import logging
+import re
+import sqlite3
+import unicodedata
+from threading import Lock
+from typing import List
+
+import config
+
+# Setup logging
+logging.basicConfig(filename=config.LOG_FILENAME, level=config.LOG_LEVEL)
+
+# TMDB daily exports use "original_name" for tv series and "original_title" for movies
+TITLE_KEYS = ("original_name", "original_title")
+
+
+def normalizeTitle(title: str) -> str:
+    """
+    Normalizes a title for index lookups: accents, case, punctuation and whitespace are ignored
+
+    :param title: The title to normalize
+    :type title: str
+    :return: The normalized title
+    """
+    title = unicodedata.normalize("NFKD", title)
+    title = "".join(c for c in title if not unicodedata.combining(c))
+    title = re.sub(r"[\W_]+", " ", title.casefold())
+    return " ".join(title.split())
+
+
+# A local title -> TMDB id index built from the TMDB daily id export files
+class TmdbTitleIndex(object):
+    def __init__(self, filename: str):
+        self.filename = filename
+        # lookups may come from several resolver threads
+        self._lock = Lock()
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS titles "
+            "(kind TEXT NOT NULL, title TEXT NOT NULL, id INTEGER NOT NULL, popularity REAL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS titles_lookup ON titles (kind, title, popularity DESC)"
+        )
+
+    def lookup(self, kind: str, title: str) -> List[int]:
+        """
+        Returns the TMDB ids for a title, the most popular one first
+
+        :param kind: "tv" or "movie"
+        :type kind: str
+        :param title: The title to look up
+        :type title: str
+        :return: A list of TMDB ids (empty if the title is not in the index)
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id FROM titles WHERE kind = ? AND title = ? ORDER BY popularity DESC",
+                (kind, normalizeTitle(title)),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def build(self, kind: str, exportFile: str, batchSize: int = 10000) -> int:
+        """
+        Streams a gzipped NDJSON TMDB id export into the index, replacing all entries of the given kind
+
+        :param kind: "tv" or "movie"
+        :type kind: str
+        :param exportFile: Path to the export file (e.g. tv_series_ids_05_15_2024.json.gz)
+        :type exportFile: str
+        :param batchSize: Number of rows inserted per transaction
+        :type batchSize: int
+        :return: The number of indexed titles
+        """
+        count = 0
+        batch = []
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM titles WHERE kind = ?", (kind,))
+            with gzip.open(exportFile, mode="rt", encoding="utf-8") as export:
+                for line in export:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    title = next(
+                        (entry[key] for key in TITLE_KEYS if entry.get(key)), None
+                    )
+                    if title is None:
+                        continue
+                    batch.append(
+                        (
+                            kind,
+                            normalizeTitle(title),
+                            entry["id"],
+                            entry.get("popularity", 0.0),
+                        )
+                    )
+                    if len(batch) >= batchSize:
+                        self._connection.executemany(
+                            "INSERT INTO titles VALUES (?, ?, ?, ?)", batch
+                        )
+                        count += len(batch)
+                        batch = []
+                self._connection.executemany(
+                    "INSERT INTO titles VALUES (?, ?, ?, ?)", batch
+                )
+                count += len(batch)
+        logging.info(f"Indexed {count} {kind} titles from {exportFile}")
+        return count
+
+    def close(self):
+        self._connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the offline TMDB title index from a TMDB daily id export"
+    )
+    parser.add_argument("kind", choices=("tv", "movie"), help="Type of the export file")
+    parser.add_argument(
+        "exportFile",
+        help="Gzipped TMDB id export, e.g. tv_series_ids_05_15_2024.json.gz",
+    )
+    parser.add_argument(
+        "--index",
+        default=config.TMDB_TITLE_INDEX or "tmdbTitleIndex.sqlite",
+        help="Index file to write (default: title_index from config.ini)",
+    )
+    args = parser.parse_args()
+
+    index = TmdbTitleIndex(args.index)
+    count = index.build(args.kind, args.exportFile)
+    index.close()
+    print(f"Indexed {count} {args.kind} titles into {args.index}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import datetime
+import json
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from threading import RLock
+from typing import Optional
+
+from trakt import Trakt
+
+import config
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # Windows
+    fcntl = None  # type: ignore[assignment]
+    import msvcrt
+
+logging.basicConfig(level=config.LOG_LEVEL)
+
+
+@contextmanager
+def fileLock(filename: str):
+    """
+    Exclusive lock on a lock file, shared by all processes using the same file
+
+    :param filename: The lock file (created if missing)
+    :type filename: str
+    """
+    with open(filename, "a+") as lockFile:
+        if fcntl is not None:
+            fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX)
+        else:  # pragma: no cover
+            lockFile.seek(0)
+            msvcrt.locking(lockFile.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lockFile.fileno(), fcntl.LOCK_UN)
+            else:  # pragma: no cover
+                lockFile.seek(0)
+                msvcrt.locking(lockFile.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def isTokenValid(authorization: Optional[dict], margin: int = 0) -> bool:
+    """
+    Checks if a token is valid for at least `margin` more seconds
+
+    :param authorization: Authentication token details (with created_at and expires_in)
+    :type authorization: Optional[dict]
+    :param margin: Seconds the token must still be valid
+    :type margin: int
+    :return: `True` if the token is valid
+    """
+    if not authorization:
+        return False
+    created = authorization.get("created_at", 0)
+    expires = authorization.get("expires_in", 0)
+    return int(datetime.datetime.now().timestamp()) + margin < created + expires
+
+
+# Keeps the Trakt token in traktAuth.json up to date. The token is refreshed before it expires
+# and written atomically. One manager can be shared by threads, parallel processes coordinate
+# through a lock file, so only one of them refreshes the token.
+class TraktAuthManager(object):
+    def __init__(
+        self,
+        filename: str = "traktAuth.json",
+        refreshMargin: int = 3600,
+        redirectUri: str = "urn:ietf:wg:oauth:2.0:oob",
+    ):
+        self.filename = filename
+        self.refreshMargin = refreshMargin
+        self.redirectUri = redirectUri
+        self.authorization: Optional[dict] = None
+        self._lock = RLock()
+
+    @property
+    def lockFilename(self) -> str:
+        return self.filename + ".lock"
+
+    def _load(self) -> Optional[dict]:
+        if not os.path.isfile(self.filename):
+            return None
+        with open(self.filename) as infile:
+            return json.load(infile)
+
+    def _save(self, authorization: dict):
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, tempFile = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(authorization, f)
+            os.replace(tempFile, self.filename)
+        except BaseException:
+            os.unlink(tempFile)
+            raise
+
+    def store(self, authorization: dict):
+        """
+        Stores a new token (e.g. after device authentication or a refresh by the Trakt client)
+
+        :param authorization: Authentication token details
+        :type authorization: dict
+        """
+        with self._lock, fileLock(self.lockFilename):
+            self._save(authorization)
+            self.authorization = authorization
+
+    def getAuthorization(self) -> Optional[dict]:
+        """
+        Returns a token that is valid for at least `refreshMargin` seconds. It is refreshed if needed.
+
+        :return: Authentication token details or None if there is no (refreshable) token
+        """
+        with self._lock:
+            if isTokenValid(self.authorization, self.refreshMargin):
+                return self.authorization
+
+            with fileLock(self.lockFilename):
+                # Another process may have refreshed the token already
+                stored = self._load()
+                if stored is not None:
+                    self.authorization = stored
+                if self.authorization is None or isTokenValid(
+                    self.authorization, self.refreshMargin
+                ):
+                    return self.authorization
+
+                logging.info("Trakt token expires soon, refreshing it")
+                refreshed = Trakt["oauth"].token_refresh(
+                    self.authorization.get("refresh_token"), self.redirectUri
+                )
+                if not refreshed:
+                    logging.error("Refreshing the Trakt token failed")
+                    return (
+                        self.authorization if isTokenValid(self.authorization) else None
+                    )
+                self._save(refreshed)
+                self.authorization = refreshed
+                return self.authorization
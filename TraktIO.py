@@ -1,70 +1,142 @@
 from __future__ import absolute_import, division, print_function
 
 import datetime
-import json
 import logging
 import os.path
-from threading import Condition
+import time
+from collections import Counter
+from threading import Condition, RLock
 
+from tenacity import retry, stop_after_attempt, wait_random
 from trakt import Trakt
+from trakt.core.exceptions import RequestError
 
 import config
+from TraktAuth import TraktAuthManager, isTokenValid
+from TraktWatchedCache import TraktWatchedCache
 
 logging.basicConfig(level=config.LOG_LEVEL)
 
+# The trakt.py event emitter is global to the process, its token refresh handler is bound once (see `TraktIO.init`)
+_tokenRefreshBound = False
+
 
 class TraktIO(object):
-    def __init__(self, page_size=1000, dry_run=False):
+    def __init__(
+        self,
+        page_size=1000,
+        dry_run=False,
+        min_page_size=None,
+        max_page_size=None,
+        target_latency=10.0,
+        auth_manager=None,
+        retry_wait=2.0,
+    ):
         self.authorization = None
+        # Shared by all workers, persists refreshed tokens to traktAuth.json
+        self.authManager = auth_manager or TraktAuthManager(
+            refreshMargin=config.TRAKT_TOKEN_REFRESH_MARGIN
+        )
         self.dry_run = dry_run
         self.is_authenticating = Condition()
         self.page_size = page_size
+        # Adaptive paging: the page size moves between these bounds depending on
+        # the latency and errors of the previous requests
+        self.min_page_size = min_page_size or page_size
+        self.max_page_size = max_page_size or page_size
+        self.target_latency = target_latency
+        # Seconds to wait before a failed page is submitted again, doubled for every further attempt
+        self.retry_wait = retry_wait
+        # (page size, latency in seconds, success) of every submitted page
+        self.pageStats: list = []
+        # (type, item) pairs that could not be submitted, even in pages of the minimum size
+        self.failedItems: list = []
+        # (type, TMDB id, watched_at) of the plays added to the Trakt history
+        self.postedItems: set = set()
+        # (type, TMDB id, watched_at) of the plays not added as the episode is already watched on Trakt
+        self.skippedItems: set = set()
+        # Summed up results of all syncs
+        self.syncResult = None
+        # Optional `SyncJournal` recording the posted items, for rollbacks
+        self.journal = None
+        # Episodes already watched on Trakt (see `loadWatchedCache`), None = add all episodes
+        self.watched = None
+        # Shows are resolved concurrently, items are added (and full pages synced) under this lock
+        self._lock = RLock()
 
         self.resetData()
 
-        # Bind trakt events
-        Trakt.on("oauth.token_refreshed", self.on_token_refreshed)
-
     def init(self):
+        global _tokenRefreshBound
         Trakt.base_url = "https://api.trakt.tv"
+        if not _tokenRefreshBound:
+            # Bind trakt events, only for the session of the command line. Instances without `init`
+            # (e.g. the import service jobs) refresh their tokens with their `TraktAuthManager`.
+            Trakt.on("oauth.token_refreshed", self.on_token_refreshed)
+            _tokenRefreshBound = True
 
         Trakt.configuration.defaults.client(
             id=config.TRAKT_API_CLIENT_ID, secret=config.TRAKT_API_CLIENT_SECRET
         )
 
-        if not (os.path.isfile("traktAuth.json")) and not self.authorization:
-            self.authenticate()
-        elif os.path.isfile("traktAuth.json"):
-            with open("traktAuth.json") as infile:
-                self.authorization = json.load(infile)
-            if not (self.checkAuthenticationValid()):
-                print("Authorization is expired, a refresh is tried:")
-                if self.getWatchedShows() is None:
-                    print(
-                        "No watched shows found, authorization might have not worked or no shows have been watched. For the first case try to remove the 'traktAuth.json' file!"
-                    )
-                else:
-                    print("Wathced shows could be retrieved, authorization is working.")
+        # Loads traktAuth.json and refreshes the token if it expires soon
+        self.authorization = self.authManager.getAuthorization()
+        if self.authorization is None:
+            if os.path.isfile(self.authManager.filename):
+                print(
+                    "The Trakt authorization could not be refreshed, try to remove the 'traktAuth.json' file!"
+                )
+            else:
+                self.authenticate()
 
     def getWatchedShows(self):
-        with Trakt.configuration.oauth.from_response(self.authorization, refresh=True):
-            watched = Trakt["sync/watched"].shows()
-            return watched
+        """Returns the sync/watched shows listing as list of dicts (without mapping it to objects)"""
+        with Trakt.configuration.oauth.from_response(self.getAuthorization()):
+            response = Trakt["sync/watched"].shows(parse=False)
+            if response is None or not response.ok:
+                raise RuntimeError("Fetching the watched shows from Trakt failed")
+            return response.json()
+
+    def getLastEpisodeActivity(self):
+        """Returns the time of the last change of watched episodes (from sync/last_activities)"""
+        with Trakt.configuration.oauth.from_response(self.getAuthorization()):
+            activities = Trakt["sync"].last_activities()
+        if not activities:
+            return None
+        return activities.get("episodes", {}).get("watched_at")
+
+    def loadWatchedCache(self, filename):
+        """
+        Loads the watched episodes from a cache file and refreshes them if they changed on Trakt.
+        Episodes that are already watched are not added to the history afterwards.
+
+        :param filename: The cache file
+        :type filename: str
+        """
+        self.watched = TraktWatchedCache.load(filename)
+        if self.watched.refresh(self.getLastEpisodeActivity, self.getWatchedShows):
+            self.watched.save(filename)
+        return self.watched
+
+    def getAuthorization(self):
+        """Returns the current token, it is refreshed proactively shortly before it expires"""
+        self.authorization = self.authManager.getAuthorization()
+        return self.authorization
 
     def checkAuthenticationValid(self) -> bool:
-        created = self.authorization.get("created_at")
-        expired = self.authorization.get("expires_in")
-        return int(datetime.datetime.now().timestamp()) < created + expired
+        return isTokenValid(self.authorization)
 
     def addEpisodeToHistory(self, data):
-        self._episodes.append(data)
-        if len(self._episodes) >= self.page_size:
-            self.sync()
+        with self._lock:
+            self._episodes.append(data)
+            if len(self._episodes) >= self.page_size:
+                self.sync()
 
     def addMovie(self, data):
-        self._movies.append(data)
-        if len(self._movies) >= self.page_size:
-            self.sync()
+        with self._lock:
+            self._movies.append(data)
+            if len(self._movies) >= self.page_size:
+                self.sync()
 
     def getData(self):
         data = {"movies": self._movies, "episodes": self._episodes}
@@ -74,43 +146,316 @@ class TraktIO(object):
         self._episodes = []
         self._movies = []
 
+    def resetSync(self):
+        """
+        Drops the items not synced yet and the results of the previous syncs, e.g. before the next import
+        of a session used for several imports (watch mode). The adapted page size is kept.
+        """
+        with self._lock:
+            self.resetData()
+            self.pageStats = []
+            self.failedItems = []
+            self.postedItems = set()
+            self.skippedItems = set()
+            self.syncResult = None
+
     def sync(self):
-        """Submit watch history to Trakt"""
-        watchHistory = self.getData()
-        res = None
-        if self.dry_run:
-            print("** Skipping Trakt sync **")
-            logging.debug(watchHistory)
-            res = {
-                "added": {
-                    "movies": len(watchHistory["movies"]),
-                    "episodes": len(watchHistory["episodes"]),
+        """
+        Submit watch history to Trakt. Items that could not be submitted are kept in `failedItems`
+        and counted as "failed" in the result.
+
+        :return: The summed up sync/history results or None if no item was added
+        """
+        with self._lock:
+            watchHistory = self.getData()
+            res = None
+            if self.dry_run:
+                print("** Skipping Trakt sync **")
+                logging.debug(watchHistory)
+                res = {
+                    "added": {
+                        "movies": len(watchHistory["movies"]),
+                        "episodes": len(watchHistory["episodes"]),
+                    }
                 }
-            }
-            print(res)
-
-        else:
-            # no refresh here, because we refresh already at init
-            with Trakt.configuration.oauth.from_response(self.authorization):
-                res = Trakt["sync/history"].add(watchHistory)
-                output = "* %d episodes and %d movies added to Trakt history" % (
-                    res["added"]["episodes"],
-                    res["added"]["movies"],
+                print(res)
+
+            else:
+                items = [("movies", movie) for movie in watchHistory["movies"]]
+                items += [("episodes", episode) for episode in watchHistory["episodes"]]
+                failedBefore = len(self.failedItems)
+                res = self._submitItems(items)
+                failed = self.failedItems[failedBefore:]
+                if failed:
+                    logging.error(
+                        f"{len(failed)} of {len(items)} items could not be added to the Trakt history"
+                    )
+                    if res is not None:
+                        # a partial failure, the callers must not treat the sync as complete
+                        res = _mergeResults(
+                            res,
+                            {
+                                "failed": {
+                                    key: sum(1 for k, _ in failed if k == key)
+                                    for key in ("movies", "episodes")
+                                }
+                            },
+                        )
+                if res is not None:
+                    output = "* %d episodes and %d movies added to Trakt history" % (
+                        res["added"]["episodes"],
+                        res["added"]["movies"],
+                    )
+                    logging.info(output)
+
+            if res is None:
+                logging.error(
+                    "Something went wrong, Trakt sync failed! May delete the traktAuth.json file to reconnect to your Trakt account."
                 )
-                logging.info(output)
+                self.resetData()
+                return res
 
-        if res is None:
-            logging.error(
-                "Something went wrong, Trakt sync failed! May delete the traktAuth.json file to reconnect to your Trakt account."
-            )
+            logging.info(res)
+            self.syncResult = _mergeResults(self.syncResult, res)
             self.resetData()
-            return res
 
-        logging.info(res)
-        self.resetData()
+            return res
 
+    def _submitItems(self, items, remove=False):
+        """Submit items in pages of the current (adaptive) page size and sum up the results"""
+        res = None
+        start = 0
+        while start < len(items):
+            pageItems = items[start : start + self.page_size]
+            start += len(pageItems)
+            res = _mergeResults(res, self._submitPage(pageItems, remove))
         return res
 
+    def _submitPage(self, pageItems, remove=False, attempt=0):
+        """
+        Submit a single page to sync/history (or sync/history/remove). A page rejected by Trakt (4xx/5xx
+        response) is split in halves which are resubmitted, until the pages reach the minimum page size.
+        A page without response (e.g. a read timeout) may have been added nevertheless. Adding is not
+        idempotent, so only its items not found in the history afterwards are resubmitted.
+        Resubmissions wait `retry_wait` seconds, doubled for every further attempt. The items of
+        pages that fail at the minimum page size are added to `failedItems`.
+        """
+        page: dict = {}
+        for key, item in pageItems:
+            page.setdefault(key, []).append(item)
+
+        started = time.monotonic()
+        rejected = False
+        try:
+            # the auth manager refreshes the token before it expires
+            with Trakt.configuration.oauth.from_response(self.getAuthorization()):
+                if remove:
+                    res = Trakt["sync/history"].remove(page, exceptions=True)
+                else:
+                    res = Trakt["sync/history"].add(page, exceptions=True)
+        except RequestError as err:
+            logging.warning(f"Trakt sync of {len(pageItems)} items failed: {err}")
+            res, rejected = None, True
+        except Exception as err:
+            logging.warning(
+                f"Trakt sync of {len(pageItems)} items got no response: {err}"
+            )
+            res = None
+        self._adaptPageSize(len(pageItems), time.monotonic() - started, res is not None)
+
+        if res is not None:
+            self._recordPosted(pageItems, remove)
+            return res
+
+        if not rejected and not remove:
+            # The page may have been added (removing is idempotent). Trakt gets some time to
+            # process it, then only the items missing in the history are resubmitted.
+            self._waitBeforeRetry(attempt)
+            try:
+                added, pageItems = self._findAddedItems(pageItems)
+            except Exception as err:
+                logging.warning(
+                    f"Checking the Trakt history failed, giving up on {len(pageItems)} items: {err}"
+                )
+                self.failedItems += pageItems
+                return None
+            if added:
+                logging.info(
+                    f"{len(added)} items of the page without response are in the Trakt history"
+                )
+                self._recordPosted(added, remove)
+                res = {
+                    "added": {
+                        key: sum(1 for k, _ in added if k == key)
+                        for key in ("movies", "episodes")
+                    }
+                }
+            if not pageItems:
+                return res
+        elif len(pageItems) > max(1, self.min_page_size):
+            self._waitBeforeRetry(attempt)
+        if len(pageItems) <= max(1, self.min_page_size):
+            logging.warning(f"Giving up on {len(pageItems)} items")
+            self.failedItems += pageItems
+            return res
+
+        logging.info(f"Splitting failed page of {len(pageItems)} items")
+        half = len(pageItems) // 2
+        return _mergeResults(
+            res,
+            _mergeResults(
+                self._submitPage(pageItems[:half], remove, attempt + 1),
+                self._submitPage(pageItems[half:], remove, attempt + 1),
+            ),
+        )
+
+    def _recordPosted(self, pageItems, remove):
+        """Records the items of a page that were added to the history (in `postedItems` and the journal)"""
+        if remove:
+            return
+        self.postedItems.update(
+            (key, item["ids"].get("tmdb"), item["watched_at"])
+            for key, item in pageItems
+        )
+        if self.journal is not None:
+            self.journal.record(pageItems)
+
+    def _waitBeforeRetry(self, attempt):
+        """Waits before the items of a failed page are submitted again (exponential backoff)"""
+        if self.retry_wait > 0:
+            time.sleep(min(self.retry_wait * 2**attempt, 60.0))
+
+    def _findAddedItems(self, pageItems):
+        """
+        Looks up the items of a page in the history, e.g. after the request got no response
+
+        :param pageItems: (type, item) pairs of the page
+        :return: (added, missing) lists of the items found and not found in the history
+        """
+        wanted, found = self._findPlays(pageItems)
+        counts = {play: len(ids) for play, ids in found.items()}
+        added, missing = [], []
+        for key, item in pageItems:
+            play = _playKey(key, item)
+            if counts.get(play, 0) > 0:
+                counts[play] -= 1
+                added.append((key, item))
+            else:
+                missing.append((key, item))
+        return added, missing
+
+    def findHistoryIds(self, items):
+        """
+        Finds the ids of the history entries (plays) of posted items. Plays are identified by their type,
+        TMDB id and watch time; for every such key at most as many plays are returned as were posted,
+        the newest history entries first. Other plays of the same episodes and movies are kept.
+        Trakt can't tell which of several plays with the same key was posted by the run: if the same
+        play was also added by an earlier import (e.g. without journal), the newest one is removed.
+
+        :param items: (type, item) pairs as recorded by a `SyncJournal`
+        :return: The history ids, in ascending order
+        """
+        wanted, found = self._findPlays(items)
+        historyIds = []
+        for play, ids in found.items():
+            # history ids grow with every added play, the run's plays are the newest ones
+            historyIds += sorted(ids, reverse=True)[: wanted[play]]
+        return sorted(historyIds)
+
+    def _findPlays(self, items):
+        """
+        Finds the history entries with the same type, TMDB id and watch time as the given items
+
+        :param items: (type, item) pairs as posted to sync/history
+        :return: (wanted, found): a `Counter` of the plays of the items and their history ids per play
+        """
+        wanted = Counter(_playKey(key, item) for key, item in items)
+        found: dict = {}
+        if not wanted:
+            return wanted, found
+        watchedAt = sorted(watched for _, _, watched in wanted)
+        startAt = datetime.datetime.fromisoformat(watchedAt[0]) - datetime.timedelta(
+            seconds=1
+        )
+        endAt = datetime.datetime.fromisoformat(watchedAt[-1]) + datetime.timedelta(
+            seconds=1
+        )
+
+        for key, singular in (("episodes", "episode"), ("movies", "movie")):
+            if not any(k == key for k, _, _ in wanted):
+                continue
+            for entry in self._getHistory(key, startAt, endAt):
+                tmdbId = entry.get(singular, {}).get("ids", {}).get("tmdb")
+                play = (key, tmdbId, entry["watched_at"][:19])
+                if play in wanted:
+                    found.setdefault(play, []).append(entry["id"])
+        return wanted, found
+
+    def _getHistory(self, media, startAt, endAt, perPage=1000):
+        """Yields all history entries of a media type in a time range (all pages)"""
+        page, pageCount = 1, 1
+        while page <= pageCount:
+            response = self._getHistoryPage(media, startAt, endAt, page, perPage)
+            pageCount = int(response.headers.get("X-Pagination-Page-Count", page))
+            yield from response.json()
+            page += 1
+
+    @retry(stop=stop_after_attempt(5), wait=wait_random(min=2, max=10))
+    def _getHistoryPage(self, media, startAt, endAt, page, perPage):
+        with Trakt.configuration.oauth.from_response(self.getAuthorization()):
+            response = Trakt["sync/history"].get(
+                media,
+                start_at=startAt,
+                end_at=endAt,
+                page=page,
+                per_page=perPage,
+                parse=False,
+            )
+        if response is None or not response.ok:
+            raise RuntimeError(f"Fetching the Trakt history page {page} failed")
+        return response
+
+    def removeHistory(self, historyIds):
+        """
+        Removes history entries in pages, with the same adaptive page size and splitting of failed pages as `sync`
+
+        :param historyIds: Ids of the history entries (see `findHistoryIds`)
+        :return: The summed up sync/history/remove results
+        """
+        if self.dry_run:
+            print(f"** Skipping removal of {len(historyIds)} Trakt history entries **")
+            return {"deleted": {"history": len(historyIds)}}
+        return self._submitItems([("ids", historyId) for historyId in historyIds], True)
+
+    def _adaptPageSize(self, size, latency, success):
+        """Grow the page size for fast requests, shrink it for slow or failed ones"""
+        self.pageStats.append((size, latency, success))
+        if not success or latency > self.target_latency:
+            self.page_size = max(self.min_page_size, self.page_size // 2)
+        elif latency < self.target_latency / 2 and size >= self.page_size:
+            self.page_size = min(self.max_page_size, int(self.page_size * 1.5))
+        logging.debug(
+            f"Trakt page of {size} items took {latency:.2f}s (success: {success}), "
+            f"next page size {self.page_size}"
+        )
+
+    def getSyncSummary(self) -> str:
+        """Returns a summary of the submitted pages (sizes, errors and throughput)"""
+        if not self.pageStats:
+            return "No pages submitted to Trakt"
+        sizes = [size for size, _, _ in self.pageStats]
+        submitted = sum(size for size, _, success in self.pageStats if success)
+        failed = sum(1 for _, _, success in self.pageStats if not success)
+        duration = sum(latency for _, latency, _ in self.pageStats)
+        summary = (
+            f"{len(self.pageStats)} Trakt pages ({failed} failed), page sizes {min(sizes)}-{max(sizes)} "
+            f"(last {sizes[-1]}), {submitted} items in {duration:.1f}s "
+            f"({submitted / max(duration, 1e-6):.1f} items/s)"
+        )
+        if self.failedItems:
+            summary += f", {len(self.failedItems)} items could not be submitted"
+        return summary
+
     def authenticate(self):
         if not self.is_authenticating.acquire(blocking=False):
             print("Authentication has already been started")
@@ -167,8 +512,7 @@ class TraktIO(object):
 
         print("Authentication successful - authorization: %r" % self.authorization)
 
-        with open("traktAuth.json", "w") as f:
-            json.dump(self.authorization, f)
+        self.authManager.store(self.authorization)
 
         # Authentication complete
         self.is_authenticating.notify_all()
@@ -194,11 +538,35 @@ class TraktIO(object):
         callback(True)
 
     def on_token_refreshed(self, authorization):
-        # OAuth token refreshed, store authorization for future calls
+        # OAuth token refreshed, store authorization for future calls and runs
         self.authorization = authorization
+        self.authManager.store(authorization)
 
         print("Token refreshed - authorization: %r" % self.authorization)
 
 
+def _playKey(key, item):
+    """Returns the (type, TMDB id, watched_at) key of a play, the same for a posted item and its history entry"""
+    return key, item["ids"].get("tmdb"), item["watched_at"][:19]
+
+
+def _mergeResults(res, pageRes):
+    """Sums up the counts of two sync/history responses"""
+    if res is None:
+        return pageRes
+    if pageRes is None:
+        return res
+    merged = dict(res)
+    for key, counts in pageRes.items():
+        if isinstance(counts, dict) and key not in merged:
+            merged[key] = dict(counts)
+        elif isinstance(counts, dict) and isinstance(merged.get(key), dict):
+            merged[key] = dict(merged[key])
+            for countKey, count in counts.items():
+                if isinstance(count, int):
+                    merged[key][countKey] = merged[key].get(countKey, 0) + count
+    return merged
+
+
 # t = TraktIO()
 # t.init()
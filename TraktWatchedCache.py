@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+import config
+
+logging.basicConfig(filename=config.LOG_FILENAME, level=config.LOG_LEVEL)
+
+
+# Local copy of the episodes marked as watched on Trakt, indexed by the TMDB id of the show.
+# The (large) sync/watched listing is only fetched again when the episode watch activity
+# reported by sync/last_activities changed since the cached copy.
+class TraktWatchedCache(object):
+    def __init__(self):
+        self.activity: Optional[str] = None
+        self.shows: Dict[int, Set[Tuple[int, int]]] = {}
+
+    def __len__(self):
+        return sum(len(episodes) for episodes in self.shows.values())
+
+    @classmethod
+    def load(cls, filename: Optional[str]) -> "TraktWatchedCache":
+        """
+        Loads a cache file. A missing file results in an empty cache that is refreshed on first use.
+
+        :param filename: The cache file (or None)
+        :type filename: Optional[str]
+        :return: The loaded cache
+        """
+        cache = cls()
+        if filename is None or not os.path.isfile(filename):
+            return cache
+        with open(filename, encoding="utf-8") as f:
+            data = json.load(f)
+        cache.activity = data["activity"]
+        cache.shows = {
+            int(showId): {(season, episode) for season, episode in episodes}
+            for showId, episodes in data["shows"].items()
+        }
+        return cache
+
+    def save(self, filename: str):
+        """
+        Writes the cache to a file
+
+        :param filename: The cache file
+        :type filename: str
+        """
+        data = {
+            "activity": self.activity,
+            "shows": {
+                str(showId): sorted(episodes) for showId, episodes in self.shows.items()
+            },
+        }
+        tempFile = filename + ".tmp"
+        with open(tempFile, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tempFile, filename)
+
+    def refresh(
+        self,
+        getActivity: Callable[[], Optional[str]],
+        getWatchedShows: Callable[[], Iterable[dict]],
+    ) -> bool:
+        """
+        Fetches the watched shows if Trakt reports episode watch activity since the last refresh
+
+        :param getActivity: Returns the time of the last episode watch activity (sync/last_activities)
+        :param getWatchedShows: Returns the sync/watched shows listing (as in the API response)
+        :return: `True` if the watched shows were fetched
+        """
+        activity = getActivity()
+        if activity is not None and activity == self.activity:
+            logging.info(f"Trakt watched state is up to date ({activity})")
+            return False
+        self.setWatchedShows(getWatchedShows())
+        self.activity = activity
+        logging.info(f"Fetched {len(self)} watched episodes from Trakt")
+        return True
+
+    def setWatchedShows(self, watchedShows: Iterable[dict]):
+        """
+        Replaces the watched episodes with the ones of a sync/watched shows listing
+
+        :param watchedShows: Items with "show" (including "ids") and "seasons" as returned by Trakt
+        """
+        self.shows = {}
+        for item in watchedShows:
+            showId = item.get("show", {}).get("ids", {}).get("tmdb")
+            if showId is None:
+                continue
+            episodes = self.shows.setdefault(int(showId), set())
+            for season in item.get("seasons", []):
+                for episode in season.get("episodes", []):
+                    episodes.add((season["number"], episode["number"]))
+
+    def isWatched(
+        self,
+        showId: Optional[int],
+        seasonNumber: Optional[int],
+        episodeNumber: Optional[int],
+    ) -> bool:
+        """
+        Returns `True` if the episode is marked as watched on Trakt
+
+        :param showId: TMDB id of the show
+        :param seasonNumber: Season number
+        :param episodeNumber: Episode number
+        """
+        if showId is None or seasonNumber is None or episodeNumber is None:
+            return False
+        return (seasonNumber, episodeNumber) in self.shows.get(showId, ())
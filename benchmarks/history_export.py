@@ -0,0 +1,121 @@
+"""
+Benchmark for the streaming history exporters.
+
+Builds a history with 1M watches (by default) and measures the time and the memory allocated
+while exporting it, for `getJson`/`toDict` + `json.dump` and the streaming json and ndjson writers.
+Run from the repository root:
+
+    python -m benchmarks.history_export --watches 1000000
+"""
+
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from NetflixHistoryExport import writeJson, writeNdjson
+from NetflixTvShow import (
+    NetflixMovie,
+    NetflixTvHistory,
+    NetflixTvShow,
+    NetflixTvShowEpisode,
+    NetflixTvShowSeason,
+)
+
+
+def buildHistory(watches, watchesPerEpisode=10, episodesPerSeason=20, seasons=5):
+    start = datetime.datetime(2015, 1, 1)
+    netflixHistory = NetflixTvHistory()
+    count = 0
+    while count < watches:
+        show = NetflixTvShow("Show %d" % len(netflixHistory.shows))
+        show.tmdbId = len(netflixHistory.shows)
+        for seasonNumber in range(1, seasons + 1):
+            season = NetflixTvShowSeason(seasonNumber)
+            for episodeNumber in range(1, episodesPerSeason + 1):
+                episode = NetflixTvShowEpisode("Episode %d" % episodeNumber)
+                episode.number = episodeNumber
+                episode.tmdbId = count
+                for _ in range(watchesPerEpisode):
+                    episode.addWatchedDate(start + datetime.timedelta(minutes=count))
+                    count += 1
+                season.episodes.append(episode)
+            show.seasons.append(season)
+        netflixHistory.shows.append(show)
+    for i in range(1000):
+        movie = NetflixMovie("Movie %d" % i)
+        movie.tmdbId = i
+        movie.addWatchedDate(start + datetime.timedelta(days=i))
+        netflixHistory.movies.append(movie)
+    return netflixHistory, count + 1000
+
+
+def measure(name, export, filename, watches):
+    t0 = time.perf_counter()
+    with open(filename, "w", encoding="utf-8") as f:
+        export(f)
+    elapsed = time.perf_counter() - t0
+
+    # second run for the memory, tracemalloc slows down the export
+    tracemalloc.start()
+    with open(filename, "w", encoding="utf-8") as f:
+        export(f)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        "%-28s %6.2fs %9.0f watches/s  peak %7.1f MB  output %5.0f MB"
+        % (
+            name,
+            elapsed,
+            watches / elapsed,
+            peak / 2**20,
+            os.path.getsize(filename) / 2**20,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--watches", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    netflixHistory, watches = buildHistory(args.watches)
+    print(
+        "Built history of %d shows with %d watches in %.1fs"
+        % (len(netflixHistory.shows), watches, time.perf_counter() - t0)
+    )
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        filename = os.path.join(tmpDir, "export")
+        measure(
+            "json.dump(getJson())",
+            lambda f: json.dump(netflixHistory.getJson(), f),
+            filename,
+            watches,
+        )
+        measure(
+            "json.dump(toDict())",
+            lambda f: json.dump(netflixHistory.toDict(), f),
+            filename,
+            watches,
+        )
+        measure(
+            "writeJson (streaming)",
+            lambda f: writeJson(netflixHistory, f),
+            filename,
+            watches,
+        )
+        measure(
+            "writeNdjson (streaming)",
+            lambda f: writeNdjson(netflixHistory, f),
+            filename,
+            watches,
+        )
+
+
+if __name__ == "__main__":
+    main()
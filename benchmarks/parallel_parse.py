@@ -0,0 +1,78 @@
+"""
+Benchmark for the parallel parser of "Title,Date" viewing history files.
+
+Generates a viewing history (1M rows by default) and measures the serial parser and the
+parallel parser with 2, 4, ... processes (up to --workers). Run from the repository root:
+
+    python -m benchmarks.parallel_parse --rows 1000000 --workers 8
+"""
+
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+from netflix2trakt import getNetflixHistory
+
+
+def generateFile(filename, rows, shows=2000):
+    rng = random.Random(42)
+    start = datetime.date(2015, 1, 1)
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("Title,Date\n")
+        for i in range(rows):
+            date = start + datetime.timedelta(days=i * 3000 // rows)
+            if rng.random() < 0.1:
+                title = "Movie %d" % rng.randrange(shows * 5)
+            else:
+                title = "Show %d: Season %d: Episode %d" % (
+                    rng.randrange(shows),
+                    rng.randrange(1, 8),
+                    rng.randrange(1, 25),
+                )
+            f.write('"%s","%s"\n' % (title, date.strftime("%d.%m.%y")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        filename = os.path.join(tmpDir, "NetflixViewingHistory.csv")
+        generateFile(filename, args.rows)
+        print(
+            "Generated %d rows (%.0f MB), %d CPUs"
+            % (args.rows, os.path.getsize(filename) / 2**20, os.cpu_count())
+        )
+
+        t0 = time.perf_counter()
+        serial = getNetflixHistory(filename, ",").toDict()
+        baseline = time.perf_counter() - t0
+        print(
+            "serial              %6.1fs %9.0f rows/s" % (baseline, args.rows / baseline)
+        )
+
+        workers = 2
+        while workers <= max(2, args.workers):
+            t0 = time.perf_counter()
+            parallel = getNetflixHistory(filename, ",", workers=workers).toDict()
+            elapsed = time.perf_counter() - t0
+            print(
+                "%2d processes        %6.1fs %9.0f rows/s  %.2fx  identical: %s"
+                % (
+                    workers,
+                    elapsed,
+                    args.rows / elapsed,
+                    baseline / elapsed,
+                    parallel == serial,
+                )
+            )
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark for the streaming ViewingActivity.csv parser.
+
+Generates a ViewingActivity.csv file (5M rows by default) and measures the time and
+peak memory of streaming it and of building the history from it.
+Run from the repository root:
+
+    python -m benchmarks.viewing_activity --rows 5000000
+"""
+
+import argparse
+import datetime
+import os
+import random
+import resource
+import tempfile
+import time
+
+from NetflixTvShow import NetflixTvHistory
+from NetflixViewingActivity import readViewingActivity
+
+HEADER = (
+    "Profile Name,Start Time,Duration,Attributes,Title,Supplemental Video Type,"
+    "Device Type,Bookmark,Latest Bookmark,Country\n"
+)
+
+
+def generateFile(filename, rows, shows=500, profiles=("Jens", "Kids", "Guest")):
+    rng = random.Random(42)
+    start = datetime.datetime(2015, 1, 1)
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(HEADER)
+        for i in range(rows):
+            startTime = start + datetime.timedelta(seconds=i * 97)
+            if rng.random() < 0.05:
+                title = "Show %d: Season 1 (Trailer)" % rng.randrange(shows)
+                supplemental = "TRAILER"
+            else:
+                title = "Show %d: Season %d: Episode %d" % (
+                    rng.randrange(shows),
+                    rng.randrange(1, 6),
+                    rng.randrange(1, 13),
+                )
+                supplemental = ""
+            duration = rng.randrange(30, 3600)
+            f.write(
+                '%s,%s,%02d:%02d:%02d,,"%s",%s,Smart TV,00:10:00,00:10:00,DE (Germany)\n'
+                % (
+                    rng.choice(profiles),
+                    startTime.strftime("%Y-%m-%d %H:%M:%S"),
+                    duration // 3600,
+                    duration // 60 % 60,
+                    duration % 60,
+                    title,
+                    supplemental,
+                )
+            )
+
+
+def maxRssMb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--profile", default="Jens")
+    parser.add_argument("--min-duration", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        filename = os.path.join(tmpDir, "ViewingActivity.csv")
+        t0 = time.perf_counter()
+        generateFile(filename, args.rows)
+        print(
+            "Generated %d rows (%.0f MB) in %.1fs"
+            % (args.rows, os.path.getsize(filename) / 2**20, time.perf_counter() - t0)
+        )
+
+        rssBefore = maxRssMb()
+        t0 = time.perf_counter()
+        with open(filename, encoding="utf-8-sig") as csvFile:
+            sessions = sum(
+                1 for _ in readViewingActivity(csvFile, args.profile, args.min_duration)
+            )
+        elapsed = time.perf_counter() - t0
+        print(
+            "Streamed %d sessions in %.1fs (%.0f rows/s), max RSS %.0f MB (before: %.0f MB)"
+            % (sessions, elapsed, args.rows / elapsed, maxRssMb(), rssBefore)
+        )
+
+        t0 = time.perf_counter()
+        netflixHistory = NetflixTvHistory()
+        with open(filename, encoding="utf-8-sig") as csvFile:
+            for entry, watchedAt in readViewingActivity(
+                csvFile, args.profile, args.min_duration
+            ):
+                netflixHistory.addEntry(entry, watchedAt)
+        elapsed = time.perf_counter() - t0
+        print(
+            "Built history of %d shows in %.1fs (%.0f rows/s), max RSS %.0f MB"
+            % (len(netflixHistory.shows), elapsed, args.rows / elapsed, maxRssMb())
+        )
+
+
+if __name__ == "__main__":
+    main()
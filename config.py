@@ -8,6 +8,7 @@ class Section(object):
     NETFLIX = "Netflix"
     TMDB = "TMDB"
     TRAKT = "Trakt"
+    SERVICE = "Service"
 
 
 _config = configparser.ConfigParser()
@@ -24,6 +25,23 @@ LOG_LEVEL = logging.getLevelName(_config.get(Section.LOGGING, "level"))
 VIEWING_HISTORY_FILENAME = _config.get(Section.NETFLIX, "viewing_history_filename")
 CSV_DATETIME_FORMAT = _config.get(Section.NETFLIX, "viewing_history_datetime_format")
 CSV_DELIMITER = _config.get(Section.NETFLIX, "viewing_history_delimiter")
+VIEWING_HISTORY_DETECT_DATE_FORMAT = _config.getboolean(
+    Section.NETFLIX, "detect_date_format"
+)
+VIEWING_ACTIVITY_PROFILE = (
+    _config.get(Section.NETFLIX, "viewing_activity_profile") or None
+)
+VIEWING_ACTIVITY_MIN_DURATION = _config.getint(
+    Section.NETFLIX, "viewing_activity_min_duration"
+)
+VIEWING_HISTORY_FINGERPRINT_FILE = (
+    _config.get(Section.NETFLIX, "fingerprint_file") or None
+)
+VIEWING_HISTORY_BACKEND = _config.get(Section.NETFLIX, "history_backend")
+VIEWING_HISTORY_PARSE_WORKERS = _config.getint(Section.NETFLIX, "parse_workers")
+VIEWING_HISTORY_MERGE_SHOW_ALIASES = _config.getboolean(
+    Section.NETFLIX, "merge_show_aliases"
+)
 
 TMDB_API_KEY = _config.get(Section.TMDB, "api_key")
 TMDB_LANGUAGE = _config.get(Section.TMDB, "language")
@@ -32,8 +50,36 @@ TMDB_SYNC_STRICT = _config.getboolean(Section.TMDB, "strict")
 TMDB_EPISODE_LANGUAGE_SEARCH = _config.getboolean(
     Section.TMDB, "episode_language_search"
 )
+TMDB_FUZZY_MATCH_THRESHOLD = (
+    _config.getfloat(Section.TMDB, "fuzzy_match_threshold")
+    if _config.getboolean(Section.TMDB, "fuzzy_match")
+    else None
+)
+TMDB_EPISODE_MARKERS = tuple(
+    marker.strip()
+    for marker in _config.get(Section.TMDB, "episode_markers").split(",")
+    if marker.strip()
+)
+TMDB_MAX_WORKERS = _config.getint(Section.TMDB, "max_workers")
+TMDB_SHOW_WORKERS = _config.getint(Section.TMDB, "show_workers")
+TMDB_TITLE_INDEX = _config.get(Section.TMDB, "title_index") or None
+TMDB_OVERRIDES_FILE = _config.get(Section.TMDB, "overrides_file") or None
+TMDB_RESOLVED_IDS_FILE = _config.get(Section.TMDB, "resolved_ids_file") or None
 
 TRAKT_API_CLIENT_ID = _config.get(Section.TRAKT, "id")
 TRAKT_API_CLIENT_SECRET = _config.get(Section.TRAKT, "secret")
 TRAKT_API_DRY_RUN = _config.getboolean(Section.TRAKT, "dry_run")
 TRAKT_API_SYNC_PAGE_SIZE = _config.getint(Section.TRAKT, "page_size")
+TRAKT_API_SYNC_MIN_PAGE_SIZE = _config.getint(Section.TRAKT, "min_page_size")
+TRAKT_API_SYNC_MAX_PAGE_SIZE = _config.getint(Section.TRAKT, "max_page_size")
+TRAKT_API_SYNC_TARGET_LATENCY = _config.getfloat(Section.TRAKT, "target_latency")
+TRAKT_TOKEN_REFRESH_MARGIN = _config.getint(Section.TRAKT, "token_refresh_margin")
+TRAKT_SKIP_WATCHED = _config.getboolean(Section.TRAKT, "skip_watched")
+TRAKT_WATCHED_CACHE_FILE = _config.get(Section.TRAKT, "watched_cache_file")
+TRAKT_JOURNAL_DIR = _config.get(Section.TRAKT, "journal_dir") or None
+
+SERVICE_HOST = _config.get(Section.SERVICE, "host")
+SERVICE_PORT = _config.getint(Section.SERVICE, "port")
+SERVICE_WORKERS = _config.getint(Section.SERVICE, "workers")
+SERVICE_MAX_QUEUED_JOBS = _config.getint(Section.SERVICE, "max_queued_jobs")
+SERVICE_MAX_UPLOAD_SIZE = _config.getint(Section.SERVICE, "max_upload_size")
@@ -1,75 +1,203 @@
 #!/usr/bin/env python3
 
+import argparse
+import copy
 import csv
+import json
 import logging
-import re
-from time import sleep
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
 
 from tenacity import retry, stop_after_attempt, wait_random
-from tmdbv3api import TV, Episode, Movie, Season, TMDb
+from tmdbv3api import TMDb
 from tmdbv3api.exceptions import TMDbException
 from tqdm import tqdm
 
 import config
+from DirectoryWatcher import DirectoryWatcher
+from EpisodeMarkers import compileEpisodeMarkers, matchEpisodeNumbers
+from EpisodeMatcher import fuzzyMatchEpisodes
+from HistoryDatesFixer import convertRows
+from MovieMatcher import firstWatchYear, rankMovies, releaseYear
+from NetflixHistoryDiff import FingerprintStore, PendingRows
+from NetflixHistoryExport import writeJson, writeNdjson
+from NetflixSqliteHistory import NetflixSqliteHistory
 from NetflixTvShow import NetflixTvHistory
+from NetflixViewingActivity import isViewingActivityHeader, readViewingActivity
+from ParallelHistoryParser import parseParallel
+from ShowScheduler import estimateShowCost, runLongestFirst
+from StageProfiler import StageProfiler
+from SyncJournal import (
+    SyncJournal,
+    latestJournal,
+    markRolledBack,
+    newJournalFilename,
+    readJournal,
+)
+from TitleOverrides import TitleOverrides
+from TmdbClient import TmdbClient
+from TmdbTitleIndex import TmdbTitleIndex
 from TraktIO import TraktIO
 
+# Version of the intermediate artifacts written by the stages
+ARTIFACT_VERSION = 1
+PARSED_ARTIFACT = "netflixHistory.parsed.json"
+RESOLVED_ARTIFACT = "netflixHistory.resolved.json"
+PAGES_ARTIFACT = "traktPages.json"
 
-def setupTMDB(tmdbKey, tmdbLanguage, tmdbDebug):
+
+def setupTMDB(tmdbKey, tmdbLanguage, tmdbDebug, maxConcurrentRequests=None):
     """
     Sets up information to access TMDB.
 
     :param tmdbKey: API key for TMDB
     :param tmdbLanguage: Preferred language for TMDB
     :param tmdbDebug: Boolean value for debug mode
-    :return: Returns `tmdb` object that contains TMDB information
+    :param maxConcurrentRequests: Limit of concurrent TMDB requests (None = no limit)
+    :return: Returns `TmdbClient` object that contains TMDB information and coalesces duplicate requests
     """
     tmdb = TMDb()
     tmdb.api_key = tmdbKey
     tmdb.language = tmdbLanguage
     tmdb.debug = tmdbDebug
-    return tmdb
+    return TmdbClient(tmdb, maxConcurrentRequests)
 
 
-def setupTrakt(traktPageSize, traktDryRun):
+def setupTrakt(
+    traktPageSize,
+    traktDryRun,
+    traktMinPageSize=None,
+    traktMaxPageSize=None,
+    traktTargetLatency=10.0,
+    traktAuthManager=None,
+):
     """
     Sets up Trakt information.
 
-    :param traktPageSize: Number of items to be sync'd to Trakt at a time
+    :param traktPageSize: Number of items to be sync'd to Trakt at a time (initial page size)
     :param traktDryRun: Boolean value to determine if identified movies/TV shows are uploaded to Trakt
+    :param traktMinPageSize: Lower bound of the adaptive page size
+    :param traktMaxPageSize: Upper bound of the adaptive page size
+    :param traktTargetLatency: Pages taking longer than this (in seconds) shrink the page size
+    :param traktAuthManager: `TraktAuthManager` of the token to use (default: traktAuth.json)
     :return: Returns `traktIO` object that contains Trakt information
     """
-    traktIO = TraktIO(page_size=traktPageSize, dry_run=traktDryRun)
+    traktIO = TraktIO(
+        page_size=traktPageSize,
+        dry_run=traktDryRun,
+        min_page_size=traktMinPageSize,
+        max_page_size=traktMaxPageSize,
+        target_latency=traktTargetLatency,
+        auth_manager=traktAuthManager,
+    )
     return traktIO
 
 
-def getNetflixHistory(inputFile, inputFileDelimiter):
+def setupTitleIndex(titleIndexFile):
+    """
+    Opens the offline TMDB title index, if one is configured.
+
+    :param titleIndexFile: Path of the index file built with TmdbTitleIndex.py (or None)
+    :return: Returns a `TmdbTitleIndex` object or None if no index is configured
+    """
+    if titleIndexFile is None:
+        return None
+    return TmdbTitleIndex(titleIndexFile)
+
+
+def setupNetflixHistory(backend):
+    """
+    Creates an empty history with the given storage backend.
+
+    :param backend: "memory" or "sqlite" (kept in a temporary SQLite file)
+    :return: The `NetflixTvHistory`
+    """
+    if backend == "sqlite":
+        return NetflixSqliteHistory()
+    if backend != "memory":
+        raise ValueError(f"Unknown history backend {backend!r}")
+    return NetflixTvHistory()
+
+
+def getNetflixHistory(
+    inputFile,
+    inputFileDelimiter,
+    activityProfile=None,
+    activityMinDuration=0,
+    newRows=None,
+    netflixHistory=None,
+    detectDateFormat=False,
+    workers=1,
+):
     """
     Parses Netflix viewing history in CSV format.
 
+    Both the "Title,Date" viewing history and the full ViewingActivity.csv export are supported.
+
     :param inputFile: File containing Netflix viewing history
     :param inputFileDelimiter: Delimiter used in Netflix viewing history (ex. CSV = `,`)
+    :param activityProfile: Profile name to import from a ViewingActivity.csv file (None = all profiles)
+    :param activityMinDuration: Minimum session duration in seconds for a ViewingActivity.csv file
+    :param newRows: Optional `PendingRows`, only rows that were not imported before are parsed (and collected in it)
+    :param netflixHistory: The (empty) history to fill, a new in-memory `NetflixTvHistory` if None
+    :param detectDateFormat: Detect the date format of a "Title,Date" file and convert the dates to the configured format
+    :param workers: Parse a large "Title,Date" file with this many processes (see `parseParallel`).
+        Files with `newRows` are always parsed serially.
     :return: Returns `netflixHistory` that contains information parsed from viewing history CSV
     """
     # Load Netlix Viewing History and loop through every entry
-    netflixHistory = NetflixTvHistory()
-    with open(inputFile, mode="r", encoding="utf-8") as csvFile:
-        # Make sure the file has a header "Title, Date" (first line)
-        csvReader = csv.DictReader(
-            csvFile, fieldnames=("Title", "Date"), delimiter=inputFileDelimiter
-        )
-        line_count = 0
-        for row in csvReader:
-            if line_count == 0:
-                # Skip Header
+    if netflixHistory is None:
+        netflixHistory = NetflixTvHistory()
+    with open(inputFile, mode="r", encoding="utf-8-sig") as csvFile:
+        if isViewingActivityHeader(csvFile.readline()):
+            csvFile.seek(0)
+            line_count = 0
+            for entry, watchedAt in readViewingActivity(
+                csvFile, activityProfile, activityMinDuration, inputFileDelimiter
+            ):
+                if newRows is not None and not newRows.isNewRow(entry, watchedAt):
+                    continue
+                netflixHistory.addEntry(entry, watchedAt)
                 line_count += 1
-                continue
+            logging.info(f"Processed {line_count} new viewing activity sessions.")
+            return netflixHistory
+        csvFile.seek(0)
 
-            entry = row["Title"]
-            watchedAt = row["Date"]
+        if workers > 1 and newRows is None:
+            parsed = parseParallel(
+                inputFile,
+                inputFileDelimiter,
+                workers,
+                netflixHistory,
+                detectDateFormat,
+            )
+            if parsed is not None:
+                return parsed
+
+        # Make sure the file has a header "Title, Date" (first line)
+        csvReader = csv.reader(csvFile, delimiter=inputFileDelimiter)
+        next(csvReader, None)
+        line_count = 1
+        rows = csvReader
+        if detectDateFormat:
+            # Convert other date formats to the configured one while reading
+            rows = convertRows(csvReader, config.CSV_DATETIME_FORMAT)
+        for row in rows:
+            if len(row) < 2:
+                continue
+            entry, watchedAt = row[0], row[1]
 
             logging.debug("Parsed CSV file entry: {} : {}".format(watchedAt, entry))
 
+            if newRows is not None and not newRows.isNewRow(entry, watchedAt):
+                # Already imported in a previous run
+                line_count += 1
+                continue
+
             # Add entry to the netflix History class to collect all shows, seasons, episodes and watch dates
             netflixHistory.addEntry(entry, watchedAt)
 
@@ -82,146 +210,304 @@ def getNetflixHistory(inputFile, inputFileDelimiter):
     return netflixHistory
 
 
+def requestSeason(tmdb, showId, seasonNumber):
+    """
+    Requests the details of a season from TMDB.
+
+    :param tmdb: TMDB client
+    :param showId: TMDB id of the show
+    :param seasonNumber: Number of the season
+    :return: The TMDB season details including the episodes
+    """
+    logging.debug("Requesting show %s season %d" % (showId, int(seasonNumber)))
+    return tmdb.seasonDetails(showId, seasonNumber)
+
+
+def requestEpisodeTranslation(tmdb, showId, seasonNumber, episodeNumber):
+    """
+    Requests the translated name of an episode from TMDB.
+
+    :param tmdb: TMDB client, the translation is searched for its language
+    :param showId: TMDB id of the show
+    :param seasonNumber: Number of the season
+    :param episodeNumber: Number of the episode
+    :return: The translated episode name or None if there is no translation
+    """
+    epInfo = tmdb.episodeDetails(showId, seasonNumber, episodeNumber)
+    name = None
+    for epTranslation in epInfo.translations.translations:
+        if epTranslation.iso_639_1 == tmdb.language:
+            name = epTranslation.data.name
+    return name
+
+
+def matchEpisodeNames(season, tmdbResult):
+    """
+    Matches the episodes of a season by their exact TMDB title, then by the episode number in
+    their title ("Folge 12", "Capítulo 103", "第5話", see `EpisodeMarkers`).
+    Needs no further requests, episodes matched here need no translation.
+
+    :param season: A season that was identified when parsing Netflix viewing history
+    :param tmdbResult: TMDB season details of the season
+    :return: The number of episodes matched by their episode number
+    """
+    byName = {}
+    for tmdbEpisode in tmdbResult.episodes:
+        byName.setdefault(tmdbEpisode.name, tmdbEpisode)
+    for episode in season.episodes:
+        # Compare TMDB episode names with Netflix Viewing History Episode name
+        tmdbEpisode = byName.get(episode.name)
+        if episode.tmdbId is None and tmdbEpisode is not None:
+            episode.setTmdbId(tmdbEpisode.id)
+            episode.setEpisodeNumber(tmdbEpisode.episode_number)
+    return matchEpisodeNumbers(
+        season.episodes,
+        tmdbResult.episodes,
+        compileEpisodeMarkers(config.TMDB_EPISODE_MARKERS),
+    )
+
+
+def matchSeasonEpisodes(show, season, tmdbResult, fuzzyThreshold=None):
+    """
+    Finds the TMDB ids of the watched episodes of a season.
+
+    :param show: The show the season belongs to
+    :param season: A season that was identified when parsing Netflix viewing history
+    :param tmdbResult: TMDB season details of the season
+    :param fuzzyThreshold: Minimum title similarity for fuzzy matching (None = exact titles only)
+    :return: The number of episodes matched by their episode number
+    """
+    markerMatches = matchEpisodeNames(season, tmdbResult)
+
+    # Match the remaining episodes by title similarity (all pairs of the season at once)
+    if fuzzyThreshold is not None:
+        unmatched = [episode for episode in season.episodes if episode.tmdbId is None]
+        matchedIds = {episode.tmdbId for episode in season.episodes}
+        candidates = [
+            tmdbEpisode
+            for tmdbEpisode in tmdbResult.episodes
+            if tmdbEpisode.id not in matchedIds and tmdbEpisode.name
+        ]
+        matches = fuzzyMatchEpisodes(
+            [episode.name for episode in unmatched],
+            [tmdbEpisode.name for tmdbEpisode in candidates],
+            fuzzyThreshold,
+        )
+        for row, col in matches.items():
+            logging.debug(f"Fuzzy match {unmatched[row].name} : {candidates[col].name}")
+            unmatched[row].setTmdbId(candidates[col].id)
+            unmatched[row].setEpisodeNumber(candidates[col].episode_number)
+
+    # Try to estimate episode number from not found TMDB Names by number of episodes watched = number of episodes in season
+    if len(tmdbResult.episodes) == len(season.episodes):
+        # WHole season was watched, no title names found
+        lastEpisodeNumber = len(season.episodes)
+        for episode in season.episodes:
+            if episode.tmdbId is not None:
+                lastEpisodeNumber -= 1
+                continue
+            for tmdbEpisode in tmdbResult.episodes:
+                if tmdbEpisode.episode_number == lastEpisodeNumber:
+                    episode.setTmdbId(tmdbEpisode.id)
+                    episode.setEpisodeNumber(tmdbEpisode.episode_number)
+                    lastEpisodeNumber -= 1
+                    break
+
+    for episode in season.episodes:
+        if episode.tmdbId is None:
+            logging.info(
+                "No Tmdb ID found for %s : Season %d: %s"
+                % (show.name, int(season.number), episode.name)
+            )
+            break
+    return markerMatches
+
+
 @retry(stop=stop_after_attempt(5), wait=wait_random(min=2, max=10))
-def getShowInformation(show, tmdb, languageSearch, traktIO):
+def getShowInformation(
+    show,
+    tmdb,
+    languageSearch,
+    traktIO,
+    titleIndex=None,
+    overrides=None,
+    maxWorkers=8,
+    fuzzyThreshold=None,
+    markerMatches=None,
+):
     """
     Parse TV show information,attempt to find a match on TMDB, and add it to the Trakt class object if found.
 
+    Once the show details are known, all needed seasons (and episode translations) are requested
+    concurrently and the episodes of each season are matched as soon as its results arrive.
+
     :param show: A show that was identified when parsing Netflix viewing history
-    :param tmdb: TMDB class object that contains information related to specified account
+    :param tmdb: TMDB client that contains information related to specified account
     :param languageSearch: Boolean value to look for translations of matching names
     :param traktIO: Trakt class object that holds Trakt information (API, list of shows/movies, etc.)
+    :param titleIndex: Optional offline title index that is consulted before searching TMDB
+    :param overrides: Optional user-supplied title overrides that are consulted before any API call
+    :param maxWorkers: Maximum number of concurrent TMDB requests for this show
+    :param fuzzyThreshold: Minimum title similarity for fuzzy episode matching (None = exact titles only)
+    :param markerMatches: Optional `Counter`, the episodes matched by their episode number are counted
+        for the show. Created by the caller, so it is kept over retries (matched episodes are not counted again).
     """
+    if markerMatches is None:
+        markerMatches = Counter()
     # Find TMDB IDs
-    tmdbTv = TV()
-    tmdbSeason = Season()
-    tmdbEp = Episode()
     tmdbShow = None
+    showId = None
     try:
-        if len(show.name.strip()) != 0:
-            tmdbShow = tmdbTv.search(show.name)
-        if tmdbShow is None or len(tmdbShow) == 0:
-            logging.warning("Show %s not found on TMDB!" % show.name)
-            return
-
-        showId = tmdbShow[0]["id"]
-        details = tmdbTv.details(show_id=showId, append_to_response="")
+        if overrides is not None:
+            showId = overrides.getShowId(show.name)
+        if showId is None and titleIndex is not None:
+            indexIds = titleIndex.lookup("tv", show.name)
+            if indexIds:
+                showId = indexIds[0]
+        if showId is None:
+            if len(show.name.strip()) != 0:
+                tmdbShow = tmdb.searchTv(show.name)
+            if tmdbShow is None or len(tmdbShow) == 0:
+                logging.warning("Show %s not found on TMDB!" % show.name)
+                return
+            showId = tmdbShow[0]["id"]
+        show.tmdbId = showId
+
+        details = tmdb.tvDetails(showId)
         numSeasons = details.number_of_seasons
 
+        # Netflix seasons per TMDB season number, seasons without a number are matched by name
+        seasonsByNumber = {}
+        namedSeasons = []
         for season in show.seasons:
             if season.number is None and season.name is None:
                 # No season, then don't do anything
                 continue
 
-            if season.number is None and season.name is not None:
-                # Try to get season number from season name
-                for i in range(1, numSeasons + 1):
-                    logging.debug(
-                        "Requesting show %s (id %s) season %d / %d\n"
-                        % (show.name, showId, int(i), int(numSeasons))
-                    )
-                    tmp = tmdbSeason.details(
-                        tv_id=showId, season_num=i, append_to_response="translations"
-                    )
-                    sleep(0.1)
-                    if tmp.name == season.name:
-                        season.number = tmp.season_number
-                        break
-                if season.number is None:
-                    logging.info(
-                        "No season number found for %s : %s" % (show.name, season.name)
-                    )
-                    continue
+            if season.number is None and overrides is not None:
+                season.number = overrides.getSeasonNumber(show.name, season.name)
 
-            if season.number is not None:
-                # Main loop
-                logging.debug(showId)
-                if int(season.number) > numSeasons:
-                    season.number = numSeasons  # Netflix sometimes splits seasons that are actually one (example: Lupin)
-
-                try:
-                    tmdbResult = tmdbSeason.details(
-                        tv_id=showId,
-                        season_num=season.number,
-                        append_to_response="translations",
-                    )
-                except TMDbException as err:
-                    logging.error(
-                        f"\nUnexpected error when searching for the season number of the show {show.name} "
-                        f'by the season name "{season.name}", error at search for season {season.number}: {err}. \n'
-                        "The entry will be skipped\n"
-                    )
-                    continue
+            if season.number is None:
+                # Season number is taken from the season name
+                namedSeasons.append(season)
+                continue
 
-                if languageSearch:
-                    logging.info(
-                        "Searching each episode individually for season %d of %s"
-                        % (int(season.number), show.name)
-                    )
-                    for tmdbEpisode in tmdbResult.episodes:
+            if int(season.number) > numSeasons:
+                season.number = numSeasons  # Netflix sometimes splits seasons that are actually one (example: Lupin)
+            seasonsByNumber.setdefault(int(season.number), []).append(season)
+
+        # Season names can only be resolved by requesting all seasons of the show
+        if namedSeasons:
+            seasonNumbers = list(range(1, numSeasons + 1))
+        else:
+            seasonNumbers = sorted(seasonsByNumber)
+
+        with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+            # future -> (season number, TMDB episode for translation requests)
+            pending = {
+                executor.submit(requestSeason, tmdb, showId, number): (number, None)
+                for number in seasonNumbers
+            }
+            seasonResults = {}
+            openTranslations = {}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    number, tmdbEpisode = pending.pop(future)
+
+                    if tmdbEpisode is not None:
+                        # Episode translation
                         try:
-                            epInfo = tmdbEp.details(
-                                tv_id=showId,
-                                season_num=season.number,
-                                episode_num=tmdbEpisode.episode_number,
-                                append_to_response="translations",
-                            )
+                            name = future.result()
+                            if name is not None:
+                                tmdbEpisode.name = name
                         except TMDbException as err:
                             logging.error(f"Error: {err}")
-                            continue
-                        for epTranslation in epInfo.translations.translations:
-                            if epTranslation.iso_639_1 == tmdb.language:
-                                tmdbEpisode.name = epTranslation.data.name
-                        sleep(0.1)
-                count = 0
-                for episode in season.episodes:
-                    found = False
-                    for tmdbEpisode in tmdbResult.episodes:
-                        # Compare TMDB episode names with Netflix Viewing History Episode name
-                        logging.debug(tmdbEpisode.name)
-                        if tmdbEpisode.name == episode.name:
-                            episode.setTmdbId(tmdbEpisode.id)
-                            episode.setEpisodeNumber(tmdbEpisode.episode_number)
-                            found = True
-                            count += 1
-                            break
-                    if not (found):
-                        # Try finding episode number in the name
-                        tvshowregex = re.compile(r"(?:Folge|Episode) (\d{1,2})")
-                        res = tvshowregex.search(episode.name)
-                        if res is not None:
-                            number = int(res.group(1))
-                            if number <= len(tmdbResult.episodes):
-                                episode.setEpisodeNumber(number)
-                                for tmdbEpisode in tmdbResult.episodes:
-                                    if tmdbEpisode.episode_number == number:
-                                        episode.setTmdbId(tmdbEpisode.id)
-                                        count += 1
-                                        found = True
-                                        break
-
-                # Try to estimate episode number from not found TMDB Names by number of episodes watched = number of episodes in season
-                if len(tmdbResult.episodes) == len(season.episodes):
-                    # WHole season was watched, no title names found
-                    lastEpisodeNumber = len(season.episodes)
-                    for episode in season.episodes:
-                        if episode.tmdbId is not None:
-                            lastEpisodeNumber -= 1
-                            continue
-                        for tmdbEpisode in tmdbResult.episodes:
-                            if tmdbEpisode.episode_number == lastEpisodeNumber:
-                                episode.setTmdbId(tmdbEpisode.id)
-                                episode.setEpisodeNumber(tmdbEpisode.episode_number)
-                                lastEpisodeNumber -= 1
-                                break
-
-                for episode in season.episodes:
-                    if episode.tmdbId is None:
+                        openTranslations[number] -= 1
+                        if openTranslations[number] == 0:
+                            for season in seasonsByNumber[number]:
+                                markerMatches[show.name] += matchSeasonEpisodes(
+                                    show, season, seasonResults[number], fuzzyThreshold
+                                )
+                        continue
+
+                    try:
+                        tmdbResult = future.result()
+                    except TMDbException as err:
+                        logging.error(
+                            f"\nUnexpected error when requesting season {number} of the show {show.name}: {err}. \n"
+                            "The entry will be skipped\n"
+                        )
+                        continue
+
+                    for season in namedSeasons:
+                        if season.number is None and tmdbResult.name == season.name:
+                            season.number = tmdbResult.season_number
+                            seasonsByNumber.setdefault(number, []).append(season)
+
+                    if number not in seasonsByNumber:
+                        continue
+
+                    # Only episodes that are not found by their title or number need a translation
+                    translate = []
+                    if languageSearch:
+                        for season in seasonsByNumber[number]:
+                            markerMatches[show.name] += matchEpisodeNames(
+                                season, tmdbResult
+                            )
+                        matchedIds = {
+                            episode.tmdbId
+                            for season in seasonsByNumber[number]
+                            for episode in season.episodes
+                        }
+                        if None in matchedIds:
+                            translate = [
+                                tmdbEpisode
+                                for tmdbEpisode in tmdbResult.episodes
+                                if tmdbEpisode.id not in matchedIds
+                            ]
+
+                    if translate:
                         logging.info(
-                            "No Tmdb ID found for %s : Season %d: %s"
-                            % (show.name, int(season.number), episode.name)
+                            "Searching %d of %d episodes individually for season %d of %s"
+                            % (
+                                len(translate),
+                                len(tmdbResult.episodes),
+                                number,
+                                show.name,
+                            )
                         )
-                        break
+                        # The season result may be shared with coalesced requests, translate a copy
+                        tmdbResult = copy.deepcopy(tmdbResult)
+                        seasonResults[number] = tmdbResult
+                        translateIds = {tmdbEpisode.id for tmdbEpisode in translate}
+                        translate = [
+                            tmdbEpisode
+                            for tmdbEpisode in tmdbResult.episodes
+                            if tmdbEpisode.id in translateIds
+                        ]
+                        openTranslations[number] = len(translate)
+                        for tmdbEpisode in translate:
+                            translationFuture = executor.submit(
+                                requestEpisodeTranslation,
+                                tmdb,
+                                showId,
+                                number,
+                                tmdbEpisode.episode_number,
+                            )
+                            pending[translationFuture] = (number, tmdbEpisode)
+                        continue
+
+                    for season in seasonsByNumber[number]:
+                        markerMatches[show.name] += matchSeasonEpisodes(
+                            show, season, tmdbResult, fuzzyThreshold
+                        )
+
+        for season in namedSeasons:
+            if season.number is None:
+                logging.info(
+                    "No season number found for %s : %s" % (show.name, season.name)
+                )
 
         addShowToTrakt(show, traktIO)
 
@@ -231,21 +517,53 @@ def getShowInformation(show, tmdb, languageSearch, traktIO):
         logging.error(f"TMDB does not contain show {show.name}: {err}")
 
 
-def getMovieInformation(movie, strictSync, traktIO):
+def getMovieInformation(
+    movie, strictSync, traktIO, titleIndex=None, overrides=None, tmdb=None
+):
     """
     Parse movie information, attempt to find a match on TMDB, and add it to the Trakt class object if found.
+    Search results are ranked by title similarity and popularity (see `rankMovies`).
 
     :param movie: A movie that was identified when parsing Netflix viewing history
     :param strictSync: Boolean value to determine if movie name searches should be exact matches
     :param traktIO: Trakt class object that holds Trakt information (API, list of shows/movies, etc.)
+    :param titleIndex: Optional offline title index that is consulted before searching TMDB
+    :param overrides: Optional user-supplied title overrides that are consulted before any API call
+    :param tmdb: TMDB client used for the search (a new client is used if None)
     """
-    tmdbMovie = Movie()
+    if overrides is not None and overrides.getMovieId(movie.name) is not None:
+        movie.tmdbId = overrides.getMovieId(movie.name)
+        logging.info("Found movie %s in overrides (%d)" % (movie.name, movie.tmdbId))
+        return addMovieToTrakt(movie, traktIO)
+
+    if titleIndex is not None:
+        indexIds = titleIndex.lookup("movie", movie.name)
+        # The index has no release dates: a title of several movies (e.g. a remake) is searched
+        # and ranked, so that movies released after the first watch are no candidates
+        if len(indexIds) == 1:
+            movie.tmdbId = indexIds[0]
+            logging.info(
+                "Found movie %s in title index (%d)" % (movie.name, movie.tmdbId)
+            )
+            return addMovieToTrakt(movie, traktIO)
+        if indexIds:
+            logging.info(
+                "%d movies named %s in title index, searching TMDB"
+                % (len(indexIds), movie.name)
+            )
+
+    if tmdb is None:
+        tmdb = TmdbClient(TMDb())
     try:
-        res = tmdbMovie.search(movie.name)
+        # Movies released after the first watch are no candidates (e.g. remakes of an old movie)
+        res = rankMovies(
+            movie.name, tmdb.searchMovie(movie.name), firstWatchYear(movie)
+        )
         if res:
             movie.tmdbId = res[0]["id"]
             logging.info(
-                "Found movie %s : %s (%d)" % (movie.name, res[0]["title"], movie.tmdbId)
+                "Found movie %s : %s (%s, %d)"
+                % (movie.name, res[0]["title"], releaseYear(res[0]), movie.tmdbId)
             )
             return addMovieToTrakt(movie, traktIO)
 
@@ -260,26 +578,78 @@ def getMovieInformation(movie, strictSync, traktIO):
             )
 
 
+def getShowHistoryItems(show, watched=None, skipped=None):
+    """
+    Returns the Trakt history items of all resolved episodes of a show.
+
+    :param show: A show that was identified when parsing Netflix viewing history
+    :param watched: Optional `TraktWatchedCache`, episodes already watched on Trakt are skipped
+    :param skipped: Optional set, the plays of the skipped episodes are added to it as
+        (type, TMDB id, watched_at), like `TraktIO.postedItems`
+    :return: A list of episode items for the sync/history endpoint
+    """
+    items = []
+    for season in show.seasons:
+        for episode in season.episodes:
+            if watched is not None and watched.isWatched(
+                show.tmdbId, season.number, episode.number
+            ):
+                logging.debug(
+                    f"Skipping {show.name} S{season.number}E{episode.number}, already watched on Trakt"
+                )
+                if skipped is not None and episode.tmdbId is not None:
+                    skipped.update(
+                        ("episodes", episode.tmdbId, watchedTime)
+                        for watchedTime in episode.watchedAt
+                    )
+                continue
+            if episode.tmdbId is not None:
+                for watchedTime in episode.watchedAt:
+                    items.append(
+                        {
+                            "watched_at": watchedTime,
+                            "ids": {"tmdb": episode.tmdbId},
+                        }
+                    )
+    return items
+
+
+def getMovieHistoryItems(movie):
+    """
+    Returns the Trakt history items of a resolved movie.
+
+    :param movie: A movie that was identified when parsing Netflix viewing history
+    :return: A list of movie items for the sync/history endpoint
+    """
+    if movie.tmdbId is None:
+        return []
+    return [
+        {
+            "title": movie.name,
+            "watched_at": watchedTime,
+            "ids": {"tmdb": movie.tmdbId},
+        }
+        for watchedTime in movie.watchedAt
+    ]
+
+
 @retry(stop=stop_after_attempt(5), wait=wait_random(min=2, max=10))
 def addShowToTrakt(show, traktIO):
     """
     Add a show to the Trakt class object.
 
     :param show: A show that was identified when parsing Netflix viewing history
-    :param traktIO: Trakt class object that holds Trakt information (API, list of shows/movies, etc.)
+    :param traktIO: Trakt class object that holds Trakt information (API, list of shows/movies, etc.).
+        If None, the show is only resolved (staged runs).
     """
+    if traktIO is None:
+        return
     for season in show.seasons:
         logging.info(
             f"Adding episodes to trakt: {len(season.episodes)} episodes from {show.name} season {season.number}"
         )
-        for episode in season.episodes:
-            if episode.tmdbId is not None:
-                for watchedTime in episode.watchedAt:
-                    episodeData = {
-                        "watched_at": watchedTime,
-                        "ids": {"tmdb": episode.tmdbId},
-                    }
-                    traktIO.addEpisodeToHistory(episodeData)
+    for episodeData in getShowHistoryItems(show, traktIO.watched, traktIO.skippedItems):
+        traktIO.addEpisodeToHistory(episodeData)
 
 
 @retry(stop=stop_after_attempt(5), wait=wait_random(min=2, max=10))
@@ -288,18 +658,15 @@ def addMovieToTrakt(movie, traktIO):
     Add a movie to the Trakt class object.
 
     :param movie: A movie that was identified when parsing Netflix viewing history
-    :param traktIO: Trakt class object that holds Trakt information (API, list of shows/movies, etc.)
+    :param traktIO: Trakt class object that holds Trakt information (API, list of shows/movies, etc.).
+        If None, the movie is only resolved (staged runs).
     """
-    if movie.tmdbId is not None:
-        for watchedTime in movie.watchedAt:
-            logging.info("Adding movie to trakt: %s" % movie.name)
-            movieData = {
-                "title": movie.name,
-                "watched_at": watchedTime,
-                "ids": {"tmdb": movie.tmdbId},
-            }
-            traktIO.addMovie(movieData)
-            return traktIO
+    if traktIO is None:
+        return traktIO
+    for movieData in getMovieHistoryItems(movie):
+        logging.info("Adding movie to trakt: %s" % movie.name)
+        traktIO.addMovie(movieData)
+    return traktIO
 
 
 @retry(stop=stop_after_attempt(5), wait=wait_random(min=2, max=10))
@@ -315,37 +682,712 @@ def syncToTrakt(traktIO):
         pass
 
 
-def main():
+@contextmanager
+def timedStage(name, profiler=None):
     """
-    Main function that pulls information from config.ini to parse Netflix viewing history and adds identified matches on TMDB to Trakt.
+    Logs the duration of a pipeline stage.
+
+    :param name: Name of the stage
+    :param profiler: Optional `StageProfiler`, the stage is profiled if profiling is enabled
     """
-    # Setup logging
-    logging.basicConfig(filename=config.LOG_FILENAME, level=config.LOG_LEVEL)
+    started = time.perf_counter()
+    with profiler.stage(name) if profiler is not None else nullcontext():
+        yield
+    output = f"Stage {name} finished in {time.perf_counter() - started:.1f}s"
+    logging.info(output)
+    print(output)
+
+
+def writeArtifact(filename, stage, data, newRows=None):
+    """
+    Writes the result of a pipeline stage to a versioned json file.
+
+    :param filename: The artifact file
+    :param stage: Name of the stage that created the data
+    :param data: The json serializable result
+    :param newRows: Optional `PendingRows` of the run, handed over to the next stage
+    """
+    artifact = {"version": ARTIFACT_VERSION, "stage": stage, "data": data}
+    if newRows is not None:
+        artifact["rows"] = newRows.toDict()
+    tempFile = filename + ".tmp"
+    with open(tempFile, mode="w", encoding="utf-8") as f:
+        json.dump(artifact, f, ensure_ascii=False)
+    os.replace(tempFile, filename)
+    logging.info(f"Wrote {stage} artifact {filename}")
+
+
+def readArtifact(filename, stage, withRows=False):
+    """
+    Reads the result of a pipeline stage.
+
+    :param filename: The artifact file
+    :param stage: Name of the stage that must have created the file
+    :param withRows: Also return the `PendingRows` of the artifact (None if it has none)
+    :return: The stored data, or (data, rows) with `withRows`
+    :raises ValueError: If the file was created by another stage or version
+    """
+    with open(filename, mode="r", encoding="utf-8") as f:
+        artifact = json.load(f)
+    if artifact.get("version") != ARTIFACT_VERSION or artifact.get("stage") != stage:
+        raise ValueError(
+            f"{filename} is not a version {ARTIFACT_VERSION} {stage} artifact "
+            f"(found version {artifact.get('version')} {artifact.get('stage')})"
+        )
+    if withRows:
+        rows = artifact.get("rows")
+        return artifact["data"], PendingRows.fromDict(rows) if rows else None
+    return artifact["data"]
+
+
+def selectShard(items, shard):
+    """
+    Returns the items of a shard, e.g. to spread a stage over several machines.
+
+    :param items: All items
+    :param shard: (index, count) tuple or None for all items
+    :return: Every count-th item, starting at index
+    """
+    if shard is None:
+        return list(items)
+    index, count = shard
+    return list(items)[index::count]
+
+
+def parseShard(value):
+    """Parses a shard argument like "0/4" (first of four shards)"""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard {value}, use e.g. 0/4")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Invalid shard {value}, use e.g. 0/4")
+    return index, count
+
+
+def getTraktPages(netflixHistory, pageSize):
+    """
+    Splits the history items of all resolved shows and movies into pages.
+
+    :param netflixHistory: A `NetflixTvHistory` after show and movie resolution
+    :param pageSize: Number of items per page
+    :return: A list of pages for the sync/history endpoint
+    """
+    items = []
+    for show in netflixHistory.shows:
+        items += [("episodes", item) for item in getShowHistoryItems(show)]
+    for movie in netflixHistory.movies:
+        items += [("movies", item) for item in getMovieHistoryItems(movie)]
 
+    pages = []
+    for start in range(0, len(items), pageSize):
+        page = {"movies": [], "episodes": []}
+        for key, item in items[start : start + pageSize]:
+            page[key].append(item)
+        pages.append(page)
+    return pages
+
+
+def loadFingerprints():
+    """
+    Loads the fingerprints of the rows imported in previous runs.
+
+    :return: The `FingerprintStore` or None if no fingerprint file is configured
+    """
+    if config.VIEWING_HISTORY_FINGERPRINT_FILE is None:
+        return None
+    return FingerprintStore.load(config.VIEWING_HISTORY_FINGERPRINT_FILE)
+
+
+def loadNewRows():
+    """
+    Creates the collection of the rows not imported in previous runs.
+
+    :return: The empty `PendingRows` or None if no fingerprint file is configured
+    """
+    fingerprints = loadFingerprints()
+    if fingerprints is None:
+        return None
+    return PendingRows(fingerprints)
+
+
+def commitImportedRows(newRows, traktIO, reportMissing=True):
+    """
+    Remembers the rows whose plays were posted to Trakt or skipped as already watched on Trakt,
+    the next run only imports the other rows.
+
+    :param newRows: `PendingRows` of the run (with `resolveItems` done) or None
+    :param traktIO: Trakt class object that synced the plays
+    :param reportMissing: Print the number of rows that were not posted (not for a single shard)
+    """
+    if newRows is None:
+        return
+    count = newRows.commit(traktIO.postedItems, traktIO.skippedItems)
+    if config.VIEWING_HISTORY_FINGERPRINT_FILE is not None:
+        newRows.imported.save(config.VIEWING_HISTORY_FINGERPRINT_FILE)
+    logging.info(f"Remembered {count} of {len(newRows)} new rows as imported")
+    if reportMissing and count < len(newRows):
+        print(
+            f"{len(newRows) - count} new rows were not added to Trakt, "
+            "the next run tries to import them again"
+        )
+
+
+def parseHistory(inputFile, newRows):
+    """
+    Parse stage: reads a Netflix viewing history file with the settings from config.ini.
+
+    :param inputFile: File containing Netflix viewing history
+    :param newRows: `PendingRows` collecting the rows not imported before or None to parse all rows
+    :return: The parsed `NetflixTvHistory`
+    """
+    return getNetflixHistory(
+        inputFile,
+        config.CSV_DELIMITER,
+        config.VIEWING_ACTIVITY_PROFILE,
+        config.VIEWING_ACTIVITY_MIN_DURATION,
+        newRows,
+        setupNetflixHistory(config.VIEWING_HISTORY_BACKEND),
+        config.VIEWING_HISTORY_DETECT_DATE_FORMAT,
+        config.VIEWING_HISTORY_PARSE_WORKERS,
+    )
+
+
+def mergeShowAliases(netflixHistory, overrides):
+    """
+    Merges the shows listed under several names (if enabled in config.ini)
+
+    :param netflixHistory: The parsed `NetflixTvHistory`
+    :param overrides: Title overrides (or None), names with the same TMDB id are merged
+    """
+    if not config.VIEWING_HISTORY_MERGE_SHOW_ALIASES:
+        return
+    aliases = netflixHistory.mergeShowAliases(
+        overrides.shows if overrides is not None else None
+    )
+    if aliases:
+        logging.info(f"Merged {len(aliases)} show names into other shows")
+
+
+def resolveHistory(
+    netflixHistory,
+    tmdb,
+    traktIO,
+    titleIndex,
+    overrides,
+    profiler=None,
+    progress=None,
+    resolvedIdsFile=config.TMDB_RESOLVED_IDS_FILE,
+):
+    """
+    Resolve stage: finds the TMDB ids of all shows and movies and adds them to Trakt class object.
+    Shows and movies are resolved in two separately timed (and profiled) stages.
+
+    :param netflixHistory: The parsed `NetflixTvHistory`
+    :param tmdb: TMDB client
+    :param traktIO: Trakt class object or None to only resolve the ids
+    :param titleIndex: Offline title index or None
+    :param overrides: Title overrides, the resolved ids are added to them for later imports
+    :param profiler: Optional `StageProfiler`, also records the duration of every show
+    :param progress: Optional function called with (stage, done, total) after every show and movie,
+        replaces the progress bars
+    :param resolvedIdsFile: File to store the resolved ids in (None = don't store them)
+    """
+
+    mergeShowAliases(netflixHistory, overrides)
+    # episodes matched by the episode number in their title, per show of this run (kept over retries
+    # of a show, its matched episodes are not counted again)
+    markerMatches = Counter()
+
+    # Get show information, the most expensive shows first (see `runLongestFirst`)
+    def estimate(show):
+        return estimateShowCost(
+            show, config.TMDB_EPISODE_LANGUAGE_SEARCH, overrides, titleIndex
+        )
+
+    def resolve(show):
+        getShowInformation(
+            show,
+            tmdb,
+            config.TMDB_EPISODE_LANGUAGE_SEARCH,
+            traktIO,
+            titleIndex,
+            overrides,
+            config.TMDB_MAX_WORKERS,
+            config.TMDB_FUZZY_MATCH_THRESHOLD,
+            markerMatches,
+        )
+
+    with timedStage("resolve-shows", profiler):
+        costs = {show.name: estimate(show) for show in netflixHistory.shows}
+        total = len(costs)
+        if progress is not None:
+            progress("resolve-shows", 0, total)
+        # The bar counts the estimated requests, so the ETA accounts for the size of the shows
+        with tqdm(
+            total=sum(costs.values()),
+            desc="Finding and adding shows to Trakt..",
+            unit="req",
+            disable=progress is not None,
+        ) as progressBar:
+            scheduled = runLongestFirst(
+                netflixHistory.shows,
+                lambda show: costs[show.name],
+                resolve,
+                config.TMDB_SHOW_WORKERS,
+            )
+            for done, (show, cost, duration) in enumerate(scheduled, 1):
+                progressBar.update(cost)
+                progressBar.set_postfix(shows=f"{done}/{total}")
+                if progress is not None:
+                    progress("resolve-shows", done, total)
+                if profiler is not None:
+                    profiler.recordCall(show.name, duration)
+                netflixHistory.storeTvShow(show)
+    if profiler is not None:
+        profiler.writeSlowestCalls("slowest-shows.txt")
+
+    # Get movie information, the searches run concurrently
+    def resolveMovie(movie):
+        getMovieInformation(
+            movie, config.TMDB_SYNC_STRICT, traktIO, titleIndex, overrides, tmdb
+        )
+
+    with timedStage("resolve-movies", profiler):
+        total = len(netflixHistory.movies)
+        if progress is not None:
+            progress("resolve-movies", 0, total)
+        scheduled = runLongestFirst(
+            netflixHistory.movies,
+            lambda movie: 1,
+            resolveMovie,
+            config.TMDB_MAX_WORKERS,
+        )
+        for done, (movie, _, _) in enumerate(
+            tqdm(
+                scheduled,
+                desc="Finding and adding movies to Trakt..",
+                total=total,
+                disable=progress is not None,
+            ),
+            1,
+        ):
+            if progress is not None:
+                progress("resolve-movies", done, total)
+            netflixHistory.storeMovie(movie)
+
+    logging.info(
+        f"{sum(markerMatches.values())} episodes matched by the episode number in their title"
+    )
+    logging.info(
+        f"{tmdb.executedRequests} TMDB requests sent, {tmdb.coalescedRequests} duplicate requests coalesced, "
+        f"{tmdb.cachedSearches} searches cached"
+    )
+
+    # Remember the resolved ids for later imports of the same process (watch mode)
+    resolvedIds = TitleOverrides()
+    resolvedIds.addResolved(netflixHistory)
+    overrides.update(resolvedIds)
+
+    # Store resolved ids, they can be added to the overrides file with TitleOverrides.py
+    if resolvedIdsFile is not None:
+        resolvedIds.save(resolvedIdsFile)
+
+
+def connectTrakt():
+    """Sets up and authenticates Trakt with the page settings from config.ini (no journal, no watched cache)"""
+    traktIO = setupTrakt(
+        config.TRAKT_API_SYNC_PAGE_SIZE,
+        config.TRAKT_API_DRY_RUN,
+        config.TRAKT_API_SYNC_MIN_PAGE_SIZE,
+        config.TRAKT_API_SYNC_MAX_PAGE_SIZE,
+        config.TRAKT_API_SYNC_TARGET_LATENCY,
+    )
+    traktIO.init()
+    return traktIO
+
+
+def setupConfiguredTrakt():
+    """
+    Sets up and authenticates Trakt with the settings from config.ini, including the journal and the
+    watched cache if they are enabled. Close the journal with `closeJournal`.
+    """
+    traktIO = connectTrakt()
+    if config.TRAKT_JOURNAL_DIR is not None:
+        traktIO.journal = SyncJournal(newJournalFilename(config.TRAKT_JOURNAL_DIR))
+    if config.TRAKT_SKIP_WATCHED:
+        traktIO.loadWatchedCache(config.TRAKT_WATCHED_CACHE_FILE)
+    return traktIO
+
+
+def closeJournal(traktIO):
+    """Closes the journal of a Trakt class object, if it has one"""
+    if traktIO.journal is not None:
+        traktIO.journal.close()
+
+
+def syncHistory(traktIO):
+    """
+    Sync stage: submits all items of the Trakt class object and prints a summary.
+
+    :param traktIO: Trakt class object that holds the items to submit
+    """
+    syncToTrakt(traktIO)
+    summary = traktIO.getSyncSummary()
+    logging.info(summary)
+    print(summary)
+    if traktIO.failedItems:
+        print(
+            f"{len(traktIO.failedItems)} items could not be added to the Trakt history, "
+            "see the log for the errors"
+        )
+    if traktIO.journal is not None and traktIO.journal.recorded > 0:
+        print(
+            f"Recorded {traktIO.journal.recorded} items in {traktIO.journal.filename}, "
+            "undo the import with `python netflix2trakt.py rollback`"
+        )
+
+
+def runImport(args):
+    """Runs all stages without storing intermediate artifacts"""
     # Connect to TMDB
-    tmdb = setupTMDB(config.TMDB_API_KEY, config.TMDB_LANGUAGE, config.TMDB_DEBUG)
+    tmdb = setupTMDB(
+        config.TMDB_API_KEY,
+        config.TMDB_LANGUAGE,
+        config.TMDB_DEBUG,
+        config.TMDB_MAX_WORKERS,
+    )
 
     # Setup trakt and sync to trakt
-    traktIO = setupTrakt(config.TRAKT_API_SYNC_PAGE_SIZE, config.TRAKT_API_DRY_RUN)
-    traktIO.init()
+    traktIO = setupConfiguredTrakt()
+    try:
+        # Parse Netflix History file
+        with timedStage("parse", args.profiler):
+            newRows = loadNewRows()
+            netflixHistory = parseHistory(config.VIEWING_HISTORY_FILENAME, newRows)
+
+        # Not profiled as a whole, stages can't be nested: resolveHistory profiles its parts
+        # resolve-shows and resolve-movies
+        with timedStage("resolve"):
+            resolveHistory(
+                netflixHistory,
+                tmdb,
+                traktIO,
+                setupTitleIndex(config.TMDB_TITLE_INDEX),
+                TitleOverrides.load(config.TMDB_OVERRIDES_FILE),
+                args.profiler,
+            )
+            if newRows is not None:
+                newRows.resolveItems(netflixHistory)
+
+        # Sync to Trakt
+        with timedStage("sync", args.profiler):
+            syncHistory(traktIO)
+    finally:
+        closeJournal(traktIO)
+
+    # Remember the imported rows, the next run only imports the rows added to the export since
+    # and the rows that were not posted
+    commitImportedRows(newRows, traktIO)
+
+
+def runParseStage(args):
+    """Parses the viewing history and stores it as artifact"""
+    with timedStage("parse", args.profiler):
+        newRows = loadNewRows()
+        netflixHistory = parseHistory(config.VIEWING_HISTORY_FILENAME, newRows)
+        # The new rows are handed over to the sync stage, which remembers the posted ones
+        writeArtifact(args.output, "parsed", netflixHistory.toDict(), newRows)
+
 
-    # Parse Netflix History file
-    netflixHistory = getNetflixHistory(
-        config.VIEWING_HISTORY_FILENAME, config.CSV_DELIMITER
+def runResolveStage(args):
+    """Resolves the TMDB ids of a parsed history artifact (or one shard of it)"""
+    tmdb = setupTMDB(
+        config.TMDB_API_KEY,
+        config.TMDB_LANGUAGE,
+        config.TMDB_DEBUG,
+        config.TMDB_MAX_WORKERS,
     )
+    # resolveHistory profiles the parts resolve-shows and resolve-movies
+    with timedStage("resolve"):
+        data, newRows = readArtifact(args.input, "parsed", withRows=True)
+        netflixHistory = NetflixTvHistory.fromDict(data)
+        overrides = TitleOverrides.load(config.TMDB_OVERRIDES_FILE)
+        # before sharding, aliases can end up in different shards
+        mergeShowAliases(netflixHistory, overrides)
+        netflixHistory.shows = selectShard(netflixHistory.shows, args.shard)
+        netflixHistory.movies = selectShard(netflixHistory.movies, args.shard)
+        resolveHistory(
+            netflixHistory,
+            tmdb,
+            None,
+            setupTitleIndex(config.TMDB_TITLE_INDEX),
+            overrides,
+            args.profiler,
+        )
+        if newRows is not None:
+            # only the plays of this shard, `pages` combines the shards
+            newRows.resolveItems(netflixHistory)
+        writeArtifact(args.output, "resolved", netflixHistory.toDict(), newRows)
 
-    # Get show information
-    for show in tqdm(netflixHistory.shows, desc="Finding and adding shows to Trakt.."):
-        getShowInformation(show, tmdb, config.TMDB_EPISODE_LANGUAGE_SEARCH, traktIO)
 
-    # Get movie information
-    for movie in tqdm(
-        netflixHistory.movies, desc="Finding and adding movies to Trakt.."
-    ):
-        getMovieInformation(movie, config.TMDB_SYNC_STRICT, traktIO)
+def runPagesStage(args):
+    """Builds the Trakt payload pages from one or more resolved history artifacts"""
+    with timedStage("pages", args.profiler):
+        netflixHistory = NetflixTvHistory()
+        newRows = None
+        for inputFile in args.input:
+            data, rows = readArtifact(inputFile, "resolved", withRows=True)
+            resolved = NetflixTvHistory.fromDict(data)
+            netflixHistory.shows += resolved.shows
+            netflixHistory.movies += resolved.movies
+            if rows is None:
+                continue
+            if newRows is None:
+                newRows = rows
+            else:
+                newRows.merge(rows)
+        pages = getTraktPages(netflixHistory, config.TRAKT_API_SYNC_PAGE_SIZE)
+        writeArtifact(args.output, "pages", pages, newRows)
 
-    # Sync to Trakt
-    syncToTrakt(traktIO)
+
+def runSyncStage(args):
+    """Submits the pages of a pages artifact (or one shard of them) to Trakt"""
+    traktIO = setupConfiguredTrakt()
+    try:
+        with timedStage("sync", args.profiler):
+            pages, newRows = readArtifact(args.input, "pages", withRows=True)
+            for page in selectShard(pages, args.shard):
+                for movieData in page["movies"]:
+                    traktIO.addMovie(movieData)
+                for episodeData in page["episodes"]:
+                    traktIO.addEpisodeToHistory(episodeData)
+            syncHistory(traktIO)
+    finally:
+        closeJournal(traktIO)
+
+    # Remember the rows whose plays were posted, loaded only now as other shards may have added rows
+    fingerprints = loadFingerprints()
+    if newRows is not None and fingerprints is not None:
+        newRows.imported = fingerprints
+        commitImportedRows(newRows, traktIO, args.shard is None)
+
+
+def importWatchedFile(inputFile, tmdb, traktIO, titleIndex, overrides, fingerprints):
+    """
+    Imports the new rows of a viewing history file in watch mode, where one Trakt session is used for
+    all imports.
+
+    :param inputFile: The viewing history file
+    :param tmdb: TMDB client
+    :param traktIO: Trakt class object, the results of the previous import are dropped
+    :param titleIndex: Offline title index or None
+    :param overrides: Title overrides, the resolved ids are added to them for later imports
+    :param fingerprints: `FingerprintStore` of the imported rows, the rows posted by this import are added
+    """
+    # The summary, failed items and posted plays only cover this import
+    traktIO.resetSync()
+    newRows = PendingRows(fingerprints)
+    netflixHistory = parseHistory(inputFile, newRows)
+    resolveHistory(netflixHistory, tmdb, traktIO, titleIndex, overrides)
+    newRows.resolveItems(netflixHistory)
+    syncHistory(traktIO)
+    # Not reached if the import failed, its rows stay new for the next file containing them
+    commitImportedRows(newRows, traktIO)
+
+
+def runWatch(args):
+    """
+    Watches a directory for new or changed viewing history files and imports their new rows.
+    The TMDB client, title index, resolved ids, imported row fingerprints and the Trakt session
+    are kept in memory between the imports.
+    """
+    tmdb = setupTMDB(
+        config.TMDB_API_KEY,
+        config.TMDB_LANGUAGE,
+        config.TMDB_DEBUG,
+        config.TMDB_MAX_WORKERS,
+    )
+    traktIO = setupConfiguredTrakt()
+    titleIndex = setupTitleIndex(config.TMDB_TITLE_INDEX)
+    overrides = TitleOverrides.load(config.TMDB_OVERRIDES_FILE)
+    fingerprints = loadFingerprints()
+    if fingerprints is None:
+        # without fingerprint file the imported rows are only remembered while watching
+        fingerprints = FingerprintStore()
+
+    def importFile(inputFile):
+        with timedStage(f"import of {inputFile}"):
+            # Refreshes the Trakt token if it expired in the meantime
+            traktIO.init()
+            if config.TRAKT_SKIP_WATCHED:
+                # Only fetched again if the previous import changed the watched episodes
+                traktIO.loadWatchedCache(config.TRAKT_WATCHED_CACHE_FILE)
+            importWatchedFile(
+                inputFile, tmdb, traktIO, titleIndex, overrides, fingerprints
+            )
+
+    watcher = DirectoryWatcher(args.directory, debounce=args.debounce)
+    print(f"Watching {args.directory} for new viewing history files (Ctrl+C to stop)")
+    try:
+        watcher.run(importFile, interval=args.interval)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    finally:
+        closeJournal(traktIO)
+
+
+def runExport(args):
+    """Exports a parsed or resolved history artifact as json or ndjson (one watch per line)"""
+    # not a timedStage, it prints to stdout which can be the output
+    with args.profiler.stage("export"):
+        netflixHistory = NetflixTvHistory.fromDict(readArtifact(args.input, args.stage))
+        write = writeNdjson if args.format == "ndjson" else writeJson
+        if args.output == "-":
+            count = write(netflixHistory, sys.stdout)
+        else:
+            with open(args.output, "w", encoding="utf-8") as f:
+                count = write(netflixHistory, f)
+    logging.info(f"Exported {count} {args.format} records to {args.output}")
+
+
+def runRollback(args):
+    """Removes the plays posted in a run (recorded in its journal) from the Trakt history"""
+    journal = args.journal
+    if journal is None and config.TRAKT_JOURNAL_DIR is not None:
+        journal = latestJournal(config.TRAKT_JOURNAL_DIR)
+    if journal is None:
+        print("No journal found to roll back")
+        return
+
+    # The rollback needs no journal (it is not recorded) and no watched cache
+    traktIO = connectTrakt()
+    with timedStage("rollback"):
+        items = readJournal(journal)
+        historyIds = traktIO.findHistoryIds(items)
+        print(f"Removing {len(historyIds)} of {len(items)} recorded plays from Trakt")
+        res = traktIO.removeHistory(historyIds)
+    logging.info(res)
+    print(traktIO.getSyncSummary())
+    deleted = sum((res or {}).get("deleted", {}).values())
+    if deleted < len(historyIds):
+        print(
+            f"Only {deleted} plays were removed, run the rollback again to remove the remaining plays"
+        )
+    elif not traktIO.dry_run:
+        print(f"Rolled back {markRolledBack(journal)}")
+
+
+def parseArguments(argv=None):
+    """
+    Parses the command line. Without a command all stages are run (as `run`).
+
+    :param argv: Command line arguments (default: sys.argv)
+    :return: The parsed arguments, `func` is the function of the command
+    """
+    parser = argparse.ArgumentParser(
+        description="Import the Netflix viewing history to Trakt. "
+        "The stages parse -> resolve -> pages -> sync can also be run separately."
+    )
+    parser.set_defaults(func=runImport)
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="Profile every stage (cProfile and tracemalloc) and write the reports to DIR",
+    )
+    parser.add_argument(
+        "--profile-slowest",
+        type=int,
+        default=20,
+        metavar="N",
+        help="With --profile: report the N slowest shows to resolve (default: 20)",
+    )
+    commands = parser.add_subparsers(title="commands")
+
+    run = commands.add_parser("run", help="Run all stages (default)")
+    run.set_defaults(func=runImport)
+
+    parse = commands.add_parser("parse", help="Parse the viewing history csv file")
+    parse.add_argument("-o", "--output", default=PARSED_ARTIFACT)
+    parse.set_defaults(func=runParseStage)
+
+    resolve = commands.add_parser("resolve", help="Find the TMDB ids")
+    resolve.add_argument("-i", "--input", default=PARSED_ARTIFACT)
+    resolve.add_argument("-o", "--output", default=RESOLVED_ARTIFACT)
+    resolve.add_argument(
+        "--shard", type=parseShard, help="Only resolve one shard, e.g. 0/4"
+    )
+    resolve.set_defaults(func=runResolveStage)
+
+    pages = commands.add_parser("pages", help="Build the Trakt payload pages")
+    pages.add_argument(
+        "-i",
+        "--input",
+        nargs="+",
+        default=[RESOLVED_ARTIFACT],
+        help="One or more resolved artifacts (e.g. of all shards)",
+    )
+    pages.add_argument("-o", "--output", default=PAGES_ARTIFACT)
+    pages.set_defaults(func=runPagesStage)
+
+    sync = commands.add_parser("sync", help="Submit the payload pages to Trakt")
+    sync.add_argument("-i", "--input", default=PAGES_ARTIFACT)
+    sync.add_argument("--shard", type=parseShard, help="Only sync one shard, e.g. 0/4")
+    sync.set_defaults(func=runSyncStage)
+
+    watch = commands.add_parser(
+        "watch", help="Import new viewing history files dropped into a directory"
+    )
+    watch.add_argument("directory", help="Directory to watch for csv files")
+    watch.add_argument(
+        "--interval", type=float, default=10.0, help="Seconds between two checks"
+    )
+    watch.add_argument(
+        "--debounce",
+        type=float,
+        default=5.0,
+        help="Seconds a file must be unchanged before it is imported",
+    )
+    watch.set_defaults(func=runWatch)
+
+    export = commands.add_parser(
+        "export", help="Export the history with the resolved ids as json or ndjson"
+    )
+    export.add_argument("-i", "--input", default=RESOLVED_ARTIFACT)
+    export.add_argument(
+        "--stage",
+        choices=("parsed", "resolved"),
+        default="resolved",
+        help="Stage of the input artifact",
+    )
+    export.add_argument("-o", "--output", default="-", help="Output file (- = stdout)")
+    export.add_argument("--format", choices=("json", "ndjson"), default="ndjson")
+    export.set_defaults(func=runExport)
+
+    rollback = commands.add_parser(
+        "rollback", help="Remove the plays added by an import from the Trakt history"
+    )
+    rollback.add_argument(
+        "journal",
+        nargs="?",
+        help="Journal of the import to undo (default: the last one in journal_dir)",
+    )
+    rollback.set_defaults(func=runRollback)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Main function that pulls information from config.ini to parse Netflix viewing history and adds identified matches on TMDB to Trakt.
+    """
+    args = parseArguments(argv)
+
+    # Setup logging
+    logging.basicConfig(filename=config.LOG_FILENAME, level=config.LOG_LEVEL)
+
+    args.profiler = StageProfiler(args.profile, args.profile_slowest)
+    args.func(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,27 @@
+from DirectoryWatcher import DirectoryWatcher
+
+
+def test_filesAreReportedWhenStable(tmp_path):
+    """Test that new and changed files are reported once they did not change for the debounce time"""
+    now = [0.0]
+    watcher = DirectoryWatcher(str(tmp_path), debounce=5, clock=lambda: now[0])
+    export = tmp_path / "NetflixViewingHistory.csv"
+    export.write_text("Title,Date\n", encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("ignored", encoding="utf-8")
+
+    assert watcher.poll() == []
+    now[0] = 3
+    assert watcher.poll() == []
+    now[0] = 6
+    assert watcher.poll() == [str(export)]
+    now[0] = 20
+    assert watcher.poll() == []
+
+    # a changed file is reported again after the debounce time
+    export.write_text(
+        'Title,Date\n"Dark: Staffel 1: Lügen","04.10.21"\n', encoding="utf-8"
+    )
+    now[0] = 21
+    assert watcher.poll() == []
+    now[0] = 27
+    assert watcher.poll() == [str(export)]
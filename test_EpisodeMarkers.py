@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+from EpisodeMarkers import (
+    compileEpisodeMarkers,
+    extractEpisodeNumber,
+    matchEpisodeNumbers,
+)
+from NetflixTvShow import NetflixTvShowEpisode
+
+
+def test_extractEpisodeNumber():
+    assert extractEpisodeNumber("Folge 12") == 12
+    assert extractEpisodeNumber("Episode 3: The Return") == 3
+    assert extractEpisodeNumber("Capítulo 103") == 103
+    assert extractEpisodeNumber("Aflevering 1000") == 1000
+    assert extractEpisodeNumber("Épisode 7") == 7
+    assert extractEpisodeNumber("Серия 24") == 24
+    assert extractEpisodeNumber("第5話") == 5
+    assert extractEpisodeNumber("第 12 集") == 12
+    assert extractEpisodeNumber("제12화") == 12
+
+
+def test_extractEpisodeNumberNoMarker():
+    assert extractEpisodeNumber("The Episode") is None
+    assert extractEpisodeNumber("Chapter 3") is None
+    assert extractEpisodeNumber("Sideepisode 3") is None
+
+
+def test_extractEpisodeNumberAdditionalMarkers():
+    pattern = compileEpisodeMarkers(("Chapter", "第{}回"))
+    assert extractEpisodeNumber("Chapter 3", pattern) == 3
+    assert extractEpisodeNumber("第42回", pattern) == 42
+    assert extractEpisodeNumber("Folge 8", pattern) == 8
+
+
+def test_matchEpisodeNumbers():
+    tmdbEpisodes = [
+        SimpleNamespace(id=100 + number, episode_number=number)
+        for number in range(1, 121)
+    ]
+    named = NetflixTvShowEpisode("Pilot")
+    named.setTmdbId(1)
+    episodes = [
+        named,
+        NetflixTvShowEpisode("Capítulo 103"),
+        NetflixTvShowEpisode("Capítulo 500"),
+        NetflixTvShowEpisode("El regreso"),
+    ]
+
+    assert matchEpisodeNumbers(episodes, tmdbEpisodes) == 1
+    # matched episodes are skipped, a second pass (e.g. a retry) counts nothing
+    assert matchEpisodeNumbers(episodes, tmdbEpisodes) == 0
+    assert named.tmdbId == 1
+    assert episodes[1].tmdbId == 203
+    assert episodes[1].number == 103
+    assert episodes[2].tmdbId is None
+    assert episodes[3].tmdbId is None
@@ -0,0 +1,58 @@
+import itertools
+
+import numpy as np
+
+from EpisodeMatcher import (
+    fuzzyMatchEpisodes,
+    normalizeEpisodeTitle,
+    optimalAssignment,
+)
+
+
+def test_normalizeEpisodeTitle():
+    assert (
+        normalizeEpisodeTitle("The Beginning and the End!") == "beginning and the end"
+    )
+    assert normalizeEpisodeTitle("Épisode spécial") == "episode special"
+
+
+def test_optimalAssignment():
+    """Test that the assignment has the maximal total score, compared to all permutations"""
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        rows, cols = (int(x) for x in rng.integers(1, 6, 2))
+        scores = rng.random((rows, cols))
+        assignment = optimalAssignment(scores)
+        assert len(assignment) == min(rows, cols)
+        assert len({row for row, _ in assignment}) == len(
+            {col for _, col in assignment}
+        )
+        if rows <= cols:
+            best = max(
+                sum(scores[i, p[i]] for i in range(rows))
+                for p in itertools.permutations(range(cols), rows)
+            )
+        else:
+            best = max(
+                sum(scores[p[j], j] for j in range(cols))
+                for p in itertools.permutations(range(rows), cols)
+            )
+        assert abs(sum(scores[row, col] for row, col in assignment) - best) < 1e-9
+
+
+def test_fuzzyMatchEpisodes():
+    """Test that slightly different titles are matched one-to-one and dissimilar ones are left out"""
+    matches = fuzzyMatchEpisodes(
+        ["The Beginning and the End!", "Lies", "Something else entirely"],
+        ["Beginning and the End", "Lies.", "Secrets", "Past and Present"],
+        0.6,
+    )
+    assert matches == {0: 0, 1: 1}
+
+
+def test_fuzzyMatchLargeSeason():
+    """Test a daily show sized season where every title has a small difference"""
+    tmdbTitles = [f"Episode title number {i}" for i in range(150)]
+    netflixTitles = [f"episode title number: {i}" for i in reversed(range(150))]
+    matches = fuzzyMatchEpisodes(netflixTitles, tmdbTitles, 0.6)
+    assert matches == {row: 149 - row for row in range(150)}
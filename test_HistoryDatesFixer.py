@@ -0,0 +1,32 @@
+from HistoryDatesFixer import convertFile, convertRows, detectDateFormat
+
+
+def test_detectDateFormat():
+    """Test that the date format is detected from a sample, unambiguous dates decide"""
+    assert detectDateFormat(["2021-10-04", "2022-01-31"]) == "%Y-%m-%d"
+    assert detectDateFormat(["04/10/2021", "25/12/2021"]) == "%d/%m/%Y"
+    assert detectDateFormat(["04/10/2021", "12/25/2021"]) == "%m/%d/%Y"
+    assert detectDateFormat(["04.10.21"], ["%Y-%m-%d"]) is None
+
+
+def test_convertRowsStreaming():
+    """Test that rows are converted lazily and invalid dates are kept"""
+    rows = iter([["Dark", "2021-10-04"], ["Lupin", "unknown"], ["Dark", "2021-10-05"]])
+    converted = convertRows(rows, "%d.%m.%y", sampleSize=1)
+    assert next(converted) == ["Dark", "04.10.21"]
+    assert list(converted) == [["Lupin", "unknown"], ["Dark", "05.10.21"]]
+
+
+def test_convertFileInPlace(tmp_path):
+    history = tmp_path / "NetflixViewingHistory.csv"
+    history.write_text(
+        '"Title","Date"\n"Dark: Staffel 1: Lügen","25/10/2021"\n"Chernobyl","01/02/2022"\n',
+        encoding="utf-8",
+    )
+    assert convertFile(str(history), str(history), "%d.%m.%y") == 2
+    assert history.read_text(encoding="utf-8").splitlines() == [
+        '"Title","Date"',
+        '"Dark: Staffel 1: Lügen","25.10.21"',
+        '"Chernobyl","01.02.22"',
+    ]
+    assert [path.name for path in tmp_path.iterdir()] == [history.name]
@@ -0,0 +1,56 @@
+import datetime
+import json
+import time
+from threading import Thread
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from ImportService import ImportService, createServer
+
+
+def _request(url, data=None):
+    body = json.dumps(data).encode("utf-8") if data is not None else None
+    try:
+        with urlopen(Request(url, data=body), timeout=10) as response:
+            return response.status, json.load(response)
+    except HTTPError as err:
+        return err.code, json.load(err)
+
+
+def test_jobIsQueuedAndReportsProgress():
+    """Test that a submitted job runs on the worker pool and its state and the stats can be fetched"""
+    service = ImportService(workers=1)
+    server = createServer(service, "127.0.0.1", 0, maxUploadSize=1024)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        token = {
+            "access_token": "token",
+            "refresh_token": "refresh",
+            "created_at": int(datetime.datetime.now().timestamp()),
+            "expires_in": 86400,
+        }
+        status, job = _request(
+            url + "/jobs", {"csv": "Title,Date\n", "trakt": token, "dry_run": True}
+        )
+        assert status == 202
+        jobUrl = url + job["url"]
+        for _ in range(100):
+            status, job = _request(jobUrl)
+            if job["state"] in ("done", "failed"):
+                break
+            time.sleep(0.05)
+        assert job["state"] == "done", job["error"]
+        assert job["stats"]["shows"] == 0
+
+        status, stats = _request(url + "/stats")
+        assert status == 200
+        assert stats["jobs"]["done"] == 1
+
+        assert _request(url + "/jobs", {"csv": "Title,Date\n"})[0] == 400
+        assert _request(url + "/jobs", {"csv": "x" * 2000, "trakt": token})[0] == 413
+        assert _request(url + "/jobs/unknown")[0] == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
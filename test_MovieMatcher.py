@@ -0,0 +1,85 @@
+from MovieMatcher import firstWatchYear, rankMovies, releaseYear
+from NetflixTvShow import NetflixMovie
+from TmdbClient import TmdbClient
+
+LION_KING = [
+    {
+        "id": 8587,
+        "title": "The Lion King",
+        "original_title": "The Lion King",
+        "release_date": "1994-06-24",
+        "popularity": 80.1,
+    },
+    {
+        "id": 420818,
+        "title": "The Lion King",
+        "original_title": "The Lion King",
+        "release_date": "2019-07-12",
+        "popularity": 95.3,
+    },
+    {
+        "id": 9732,
+        "title": "The Lion King 2: Simba's Pride",
+        "original_title": "The Lion King II: Simba's Pride",
+        "release_date": "1998-10-27",
+        "popularity": 50.0,
+    },
+]
+
+
+def test_rankMoviesYearConstraint():
+    """Test that movies released after the first watch are dropped"""
+    assert rankMovies("Der König der Löwen", LION_KING, 2018)[0]["id"] == 8587
+    assert rankMovies("The Lion King", LION_KING, 2021)[0]["id"] == 420818
+    # without a candidate left the year is ignored
+    assert rankMovies("The Lion King", LION_KING, 1990)[0]["id"] == 420818
+    assert rankMovies("The Lion King", [], 2021) == []
+    assert releaseYear({"release_date": ""}) is None
+
+
+def test_rankMoviesTitleSimilarity():
+    """Test that a similar title beats a more popular one"""
+    candidates = [
+        {"id": 1, "title": "Spider-Man: No Way Home", "popularity": 300.0},
+        {"id": 2, "title": "Spider-Man: Far From Home", "popularity": 60.0},
+    ]
+    ranked = rankMovies("Spider-Man: Far from Home", candidates)
+    assert [movie["id"] for movie in ranked] == [2, 1]
+
+    # the original title counts as well
+    candidates = [
+        {"id": 3, "title": "Money", "original_title": "Money", "popularity": 9.0},
+        {"id": 4, "title": "Geld", "original_title": "Das Boot", "popularity": 5.0},
+    ]
+    assert rankMovies("Das Boot", candidates)[0]["id"] == 4
+
+
+def test_firstWatchYear():
+    movie = NetflixMovie("Chernobyl")
+    assert firstWatchYear(movie) is None
+    movie.addWatchedDate("01.01.22")
+    movie.addWatchedDate("24.12.21")
+    assert firstWatchYear(movie) == 2021
+
+
+def test_searchesAreCached():
+    """Test that the TMDB client requests every search only once"""
+
+    class FakeTMDb(object):
+        language = "de"
+
+    terms = []
+
+    def search(term):
+        terms.append(term)
+        return [{"id": len(terms)}]
+
+    tmdb = TmdbClient(FakeTMDb(), maxCachedSearches=2)
+    assert tmdb._search("search/movie", search, "a") == [{"id": 1}]
+    assert tmdb._search("search/movie", search, "a") == [{"id": 1}]
+    tmdb._search("search/movie", search, "b")
+    tmdb._search("search/movie", search, "c")
+    tmdb._search("search/movie", search, "a")
+    assert terms == ["a", "b", "c", "a"]
+    assert tmdb.cachedSearches == 1
+    assert tmdb.executedRequests == 4
@@ -0,0 +1,94 @@
+from NetflixHistoryDiff import (
+    FingerprintStore,
+    PendingRows,
+    readHistoryRows,
+    rowFingerprint,
+)
+from NetflixTvShow import NetflixTvHistory
+
+
+def test_rowFingerprint():
+    assert rowFingerprint("Dark: Staffel 1: Geheimnisse", "03.10.21") == rowFingerprint(
+        "Dark: Staffel 1: Geheimnisse", "03.10.21 "
+    )
+    assert rowFingerprint("Dark: Staffel 1: Geheimnisse", "03.10.21") != rowFingerprint(
+        "Dark: Staffel 1: Geheimnisse", "04.10.21"
+    )
+
+
+def test_onlyNewRowsAfterReload(tmp_path):
+    """Test that rows recorded in a previous run are not reported as new after saving and loading"""
+    storeFile = str(tmp_path / "fingerprints.bin")
+    store = FingerprintStore.load(storeFile)
+    assert len(store) == 0
+    assert store.isNewRow("Dark: Staffel 1: Geheimnisse", "03.10.21")
+    assert store.isNewRow("Spider-Man: Far from Home", "16.09.21")
+    assert not store.isNewRow("Dark: Staffel 1: Geheimnisse", "03.10.21")
+    store.save(storeFile)
+
+    store = FingerprintStore.load(storeFile)
+    assert len(store) == 2
+    assert not store.isNewRow("Spider-Man: Far from Home", "16.09.21")
+    assert store.isNewRow("Dark: Staffel 1: Lügen", "04.10.21")
+
+
+def test_diffAgainstPreviousExport(tmp_path):
+    previousFile = tmp_path / "previous.csv"
+    previousFile.write_text(
+        'Title,Date\n"Dark: Staffel 1: Geheimnisse","03.10.21"\n', encoding="utf-8"
+    )
+    newFile = tmp_path / "new.csv"
+    newFile.write_text(
+        'Title,Date\n"Dark: Staffel 1: Lügen","04.10.21"\n"Dark: Staffel 1: Geheimnisse","03.10.21"\n',
+        encoding="utf-8",
+    )
+    store = FingerprintStore(
+        rowFingerprint(title, date)
+        for title, date in readHistoryRows(str(previousFile), ",")
+    )
+    newRows = [
+        row for row in readHistoryRows(str(newFile), ",") if store.isNewRow(*row)
+    ]
+    assert newRows == [("Dark: Staffel 1: Lügen", "04.10.21")]
+
+
+def test_onlyPostedRowsAreCommitted():
+    """Test that rows are only remembered as imported once one of their plays was posted"""
+    imported = FingerprintStore()
+    newRows = PendingRows(imported)
+    netflixHistory = NetflixTvHistory()
+    rows = [
+        ("Dark: Staffel 1: Geheimnisse", "03.10.21"),
+        ("Dark: Staffel 1: Lügen", "04.10.21"),
+        ("Peaky Blinders – Gangs of Birmingham: Staffel 1: Folge 1", "05.10.21"),
+        ("King Arthur: Legend of the Sword", "17.01.21"),
+        ("Unknown Movie", "18.01.21"),
+    ]
+    for title, date in rows + rows[:1]:
+        if newRows.isNewRow(title, date):
+            netflixHistory.addEntry(title, date)
+    assert len(newRows) == 5
+
+    netflixHistory.addEntry("Peaky Blinders: Staffel 1: Folge 2", "06.10.21")
+    netflixHistory.mergeShowAliases()
+    for showName in ("Dark", "Peaky Blinders"):
+        for episode in netflixHistory.getTvShow(showName).seasons[0].episodes:
+            episode.setTmdbId(len(episode.name))
+    netflixHistory.getMovie("King Arthur: Legend of the Sword").tmdbId = 274857
+    newRows.resolveItems(netflixHistory)
+    assert len(newRows.items) == 4
+
+    # the play of "Lügen" was not posted (e.g. a failed page)
+    posted = {
+        ("episodes", 11, "2021-10-03T20:15:00.00Z"),
+        ("episodes", 7, "2021-10-05T20:15:00.00Z"),
+        ("movies", 274857, "2021-01-17T20:15:00.00Z"),
+    }
+    assert newRows.commit(posted) == 3
+    assert rowFingerprint(*rows[0]) in imported
+    assert rowFingerprint(*rows[1]) not in imported
+    assert rowFingerprint(*rows[4]) not in imported
+
+    restored = PendingRows.fromDict(newRows.toDict())
+    assert restored.rows == newRows.rows
+    assert restored.items == newRows.items
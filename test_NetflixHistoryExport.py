@@ -0,0 +1,58 @@
+import io
+import json
+from datetime import datetime
+
+from NetflixHistoryExport import iterWatches, writeJson, writeNdjson
+from NetflixTvShow import NetflixTvHistory
+
+ENTRIES = [
+    ("Dark: Staffel 1: Geheimnisse", "04.10.21"),
+    ("Dark: Staffel 1: Lügen", "05.10.21"),
+    ("Dark: Staffel 1: Geheimnisse", "07.10.21"),
+    ("Haus des Geldes: Teil 5: Wunschdenken", "03.12.21"),
+    ("Chernobyl", "01.01.22"),
+    ("Chernobyl", datetime(2022, 1, 2, 21, 30)),
+]
+
+
+def buildHistory():
+    netflixHistory = NetflixTvHistory()
+    for entry, date in ENTRIES:
+        netflixHistory.addEntry(entry, date)
+    netflixHistory.getTvShow("Dark").tmdbId = 70523
+    netflixHistory.getMovie("Chernobyl").tmdbId = 87108
+    return netflixHistory
+
+
+def test_writeJsonMatchesToDict():
+    """Test that the streaming json export is the same as dumping toDict"""
+    netflixHistory = buildHistory()
+    out = io.StringIO()
+    assert writeJson(netflixHistory, out) == 3
+    assert out.getvalue() == json.dumps(netflixHistory.toDict())
+    restored = NetflixTvHistory.fromDict(json.loads(out.getvalue()))
+    assert restored.getTvShow("Dark").tmdbId == 70523
+    assert restored.toDict() == netflixHistory.toDict()
+
+    out = io.StringIO()
+    writeJson(NetflixTvHistory(), out)
+    assert json.loads(out.getvalue()) == {"tvshows": [], "movies": []}
+
+
+def test_writeNdjsonOneLinePerWatch():
+    """Test that the ndjson export writes one record per watch, same as iterWatches"""
+    netflixHistory = buildHistory()
+    out = io.StringIO()
+    assert writeNdjson(netflixHistory, out) == 6
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert records == list(iterWatches(netflixHistory))
+
+    dark = [record for record in records if record.get("show") == "Dark"]
+    assert len(dark) == 3
+    assert {record["showTmdbId"] for record in dark} == {70523}
+    assert dark[0]["episode"] == "Geheimnisse"
+    assert dark[0]["seasonNumber"] == 1
+    assert dark[0]["watchedAt"] < dark[1]["watchedAt"]
+
+    movies = [record for record in records if record["type"] == "movie"]
+    assert [record["tmdbId"] for record in movies] == [87108, 87108]
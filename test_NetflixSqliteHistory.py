@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from NetflixSqliteHistory import NetflixSqliteHistory
+from NetflixTvShow import NetflixTvHistory
+
+ENTRIES = [
+    ("Dark: Staffel 1: Geheimnisse", "04.10.21"),
+    ("Haus des Geldes: Teil 5: Wunschdenken", "03.12.21"),
+    ("Dark: Staffel 1: Lügen", "05.10.21"),
+    ("Dark: Staffel 1: Geheimnisse", "04.10.21"),
+    ("American Horror Story: Murder House: Nachgeburt", "06.10.21"),
+    ("Wednesday: Leid pro quo", "29.11.22"),
+    ("Chernobyl", "01.01.22"),
+    ("Chernobyl", datetime(2022, 1, 2, 21, 30)),
+]
+
+
+def test_sqliteHistoryMatchesMemoryHistory():
+    """Test that the SQLite backend returns the same shows, seasons and movies as the in-memory history"""
+    memory = NetflixTvHistory()
+    sqlite = NetflixSqliteHistory(batchSize=3)
+    for entry, date in ENTRIES:
+        memory.addEntry(entry, date)
+        sqlite.addEntry(entry, date)
+
+    assert len(sqlite.shows) == 4
+    assert len(sqlite.movies) == 2
+    assert sqlite.toDict() == memory.toDict()
+    assert sqlite.hasTvShow("Dark")
+    assert not sqlite.hasTvShow("Chernobyl")
+    assert len(sqlite.getTvShow("Dark").getSeasonByNumber(1).episodes) == 2
+    assert sqlite.getMovie("Chernobyl").watchedAt is not None
+
+    # resolved ids are stored and returned by later iterations
+    for show in sqlite.shows:
+        show.tmdbId = len(show.name)
+        sqlite.storeTvShow(show)
+    assert [show.tmdbId for show in sqlite.shows] == [4, 15, 21, 9]
+    sqlite.close()
+
+
+def test_sqliteMergeShowAliases():
+    """Test that the SQLite backend merges aliases like the in-memory history"""
+    entries = [
+        ("Peaky Blinders: Staffel 1: Folge 1", "01.10.21"),
+        ("Peaky Blinders – Gangs of Birmingham: Staffel 1: Folge 2", "02.10.21"),
+        ("Money Heist: Part 1: Episode 1", "08.10.21"),
+        ("Haus des Geldes: Teil 1: Folge 1", "07.10.21"),
+    ]
+    memory = NetflixTvHistory()
+    sqlite = NetflixSqliteHistory()
+    for entry, date in entries:
+        memory.addEntry(entry, date)
+        sqlite.addEntry(entry, date)
+
+    showIds = {"Haus des Geldes": 71446, "Money Heist": 71446}
+    assert sqlite.mergeShowAliases(showIds) == memory.mergeShowAliases(showIds)
+    assert sqlite.getTvShowNames() == ["Peaky Blinders", "Money Heist"]
+    assert sqlite.toDict() == memory.toDict()
+    sqlite.close()
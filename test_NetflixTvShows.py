@@ -1,7 +1,7 @@
 import unittest
 from datetime import datetime
 
-from NetflixTvShow import NetflixTvHistory, NetflixTvShow
+from NetflixTvShow import NetflixTvHistory, NetflixTvShow, parseEntryTitle
 
 
 def test_addSingleTvShow():
@@ -219,3 +219,101 @@ class TestNetflixTvShow(unittest.TestCase):
         )
         self.assertEqual(self.show.getSeasonByName("The Mind Flayer"), season2)
         self.assertIsNone(self.show.getSeasonByName("The Upside Down"))
+
+
+def test_historyDictRoundTrip():
+    """Test that a history with resolved ids survives toDict / fromDict unchanged"""
+    netflixHistory = NetflixTvHistory()
+    netflixHistory.addEntry("Haus des Geldes: Teil 5: Wunschdenken", "03.12.21")
+    netflixHistory.addEntry("Haus des Geldes: Teil 5: Wunschdenken", "04.12.21")
+    netflixHistory.addEntry(
+        "American Horror Story: Murder House: Nachgeburt", "05.12.21"
+    )
+    netflixHistory.addEntry("Spider-Man: Far from Home", "16.09.21")
+    show = netflixHistory.getTvShow("Haus des Geldes")
+    show.tmdbId = 71446
+    show.seasons[0].episodes[0].setTmdbId(3148281)
+    show.seasons[0].episodes[0].setEpisodeNumber(1)
+
+    data = netflixHistory.toDict()
+    restored = NetflixTvHistory.fromDict(data)
+    assert restored.toDict() == data
+    assert restored.getJson() == netflixHistory.getJson()
+    episode = restored.getTvShow("Haus des Geldes").getSeasonByNumber(5).episodes[0]
+    assert episode.tmdbId == 3148281
+    assert episode.number == 1
+    assert sorted(episode.watchedAt) == [
+        "2021-12-03T20:15:00.00Z",
+        "2021-12-04T20:15:00.00Z",
+    ]
+    assert (
+        restored.getTvShow("American Horror Story").getSeasonByName("Murder House")
+        is not None
+    )
+
+
+def test_mergeShowAliases():
+    """Test that shows listed under several names are merged before resolution"""
+    netflixHistory = NetflixTvHistory()
+    netflixHistory.addEntry("Peaky Blinders: Staffel 1: Folge 1", "01.10.21")
+    netflixHistory.addEntry(
+        "Peaky Blinders – Gangs of Birmingham: Staffel 1: Folge 2", "02.10.21"
+    )
+    netflixHistory.addEntry(
+        "Peaky Blinders - Gangs of Birmingham: Staffel 2: Folge 1", "03.10.21"
+    )
+    netflixHistory.addEntry("Grey’s Anatomy: Staffel 1: Pilot", "04.10.21")
+    netflixHistory.addEntry("Grey's Anatomy: Staffel 1: Pilot", "05.10.21")
+    netflixHistory.addEntry("Star Wars: Staffel 1: Folge 1", "06.10.21")
+    netflixHistory.addEntry("Star Wars - Rebels: Staffel 1: Folge 1", "06.10.21")
+    netflixHistory.addEntry(
+        "Star Wars - The Clone Wars: Staffel 1: Folge 1", "06.10.21"
+    )
+    netflixHistory.addEntry("Haus des Geldes: Teil 1: Folge 1", "07.10.21")
+    netflixHistory.addEntry("Money Heist: Part 1: Episode 1", "08.10.21")
+
+    aliases = netflixHistory.mergeShowAliases(
+        {"Money Heist": 71446, "Haus des Geldes": 71446}
+    )
+    assert aliases == {
+        "Peaky Blinders – Gangs of Birmingham": "Peaky Blinders",
+        "Peaky Blinders - Gangs of Birmingham": "Peaky Blinders",
+        "Grey's Anatomy": "Grey’s Anatomy",
+        "Money Heist": "Haus des Geldes",
+    }
+    assert [show.name for show in netflixHistory.shows] == [
+        "Peaky Blinders",
+        "Grey’s Anatomy",
+        "Star Wars",
+        "Star Wars - Rebels",
+        "Star Wars - The Clone Wars",
+        "Haus des Geldes",
+    ]
+    peakyBlinders = netflixHistory.getTvShow("Peaky Blinders")
+    assert [len(season.episodes) for season in peakyBlinders.seasons] == [2, 1]
+    pilot = netflixHistory.getTvShow("Grey’s Anatomy").seasons[0].episodes[0]
+    assert len(pilot.watchedAt) == 2
+
+    # names with different known ids are different shows
+    netflixHistory.addEntry("Dark: Staffel 1: Geheimnisse", "04.10.21")
+    netflixHistory.addEntry("DARK: Staffel 1: Geheimnisse", "05.10.21")
+    assert netflixHistory.mergeShowAliases({"Dark": 70523, "DARK": 1}) == {}
+    assert netflixHistory.mergeShowAliases() == {"DARK": "Dark"}
+
+
+def test_parseEntryTitle():
+    assert parseEntryTitle("Dark: Staffel 1: Geheimnisse") == [
+        ("show", "Dark", 1, None, "Geheimnisse")
+    ]
+    assert parseEntryTitle("American Horror Story: Murder House: Nachgeburt") == [
+        ("show", "American Horror Story", None, "Murder House", "Nachgeburt")
+    ]
+    assert parseEntryTitle("Wednesday: Leid pro quo") == [
+        ("show", "Wednesday", 1, None, "Leid pro quo"),
+        ("movie", "Wednesday: Leid pro quo"),
+    ]
+    assert parseEntryTitle("Spider-Man: Far from Home") == [
+        ("show", "Spider-Man", 1, None, "Far from Home"),
+        ("movie", "Spider-Man: Far from Home"),
+    ]
+    assert parseEntryTitle("Inception") == [("movie", "Inception")]
@@ -0,0 +1,43 @@
+import io
+
+from NetflixTvShow import NetflixTvHistory
+from NetflixViewingActivity import (
+    isViewingActivityHeader,
+    parseDuration,
+    readViewingActivity,
+)
+
+VIEWING_ACTIVITY = (
+    "Profile Name,Start Time,Duration,Attributes,Title,Supplemental Video Type,Device Type,Bookmark,Latest Bookmark,Country\n"
+    'Jens,2021-10-03 19:32:11,00:52:10,,"Peaky Blinders: Season 1: Episode 1",,Chrome PC,00:52:10,00:52:10,DE (Germany)\n'
+    'Jens,2021-10-03 18:30:00,00:01:30,,"Peaky Blinders: Season 1 (Trailer)",TRAILER,Chrome PC,00:01:30,00:01:30,DE (Germany)\n'
+    'Jens,2021-10-02 21:00:00,00:00:42,,"Dark: Season 1: Secrets",,Chrome PC,00:00:42,00:00:42,DE (Germany)\n'
+    'Kids,2021-10-01 16:00:00,01:30:00,,"Spider-Man: Far from Home",,Smart TV,01:30:00,01:30:00,DE (Germany)\n'
+)
+
+
+def test_isViewingActivityHeader():
+    assert isViewingActivityHeader(VIEWING_ACTIVITY.splitlines()[0])
+    assert not isViewingActivityHeader("Title,Date")
+
+
+def test_parseDuration():
+    assert parseDuration("00:52:10") == 3130
+    assert parseDuration("") == 0
+
+
+def test_readViewingActivity():
+    """Test that trailers, short sessions and other profiles are dropped and the exact start time is kept"""
+    sessions = list(
+        readViewingActivity(io.StringIO(VIEWING_ACTIVITY), "Jens", minDuration=60)
+    )
+    assert len(sessions) == 1
+    assert sessions[0][0] == "Peaky Blinders: Season 1: Episode 1"
+
+    netflixHistory = NetflixTvHistory()
+    netflixHistory.addEntry(*sessions[0])
+    episode = netflixHistory.getTvShow("Peaky Blinders").seasons[0].episodes[0]
+    assert episode.watchedAt == ["2021-10-03T19:32:11.00Z"]
+
+    allProfiles = list(readViewingActivity(io.StringIO(VIEWING_ACTIVITY)))
+    assert len(allProfiles) == 3
@@ -0,0 +1,85 @@
+import os
+
+import ParallelHistoryParser
+from netflix2trakt import getNetflixHistory
+from NetflixSqliteHistory import NetflixSqliteHistory
+from ParallelHistoryParser import splitChunks
+
+ENTRIES = [
+    "Dark: Staffel 1: Geheimnisse",
+    "Dark: Staffel 1: Lügen",
+    "American Horror Story: Murder House: Nachgeburt",
+    "American Horror Story: Coven: Hexen",
+    "Die außergewoehnlichsten Haeuser der Welt: Staffel 2 – Teil B: Spanien",
+    "Wednesday: Leid pro quo",
+    "King Arthur: Legend of the Sword",
+    "Chernobyl",
+    '"Peaky Blinders: Staffel 1: Folge 1, ""Birmingham"""',
+]
+
+
+def writeHistory(filename, rows, newline="\n", isoDates=False):
+    with open(filename, "w", encoding="utf-8-sig", newline="") as f:
+        f.write("Title,Date" + newline)
+        for i in range(rows):
+            entry = ENTRIES[(i * 7) % len(ENTRIES)]
+            if not entry.startswith('"'):
+                entry = f'"{entry} {i % 13}"' if i % 5 == 0 else f'"{entry}"'
+            day, month, year = 1 + i % 28, 1 + i % 12, 20 + i % 4
+            date = (
+                f"20{year}-{month:02d}-{day:02d}"
+                if isoDates
+                else f"{day:02d}.{month:02d}.{year}"
+            )
+            f.write(f'{entry},"{date}"{newline}')
+            if i % 100 == 0:
+                f.write(newline)
+
+
+def test_splitChunks(tmp_path):
+    """Test that the byte ranges cover the rows of the file and start at line boundaries"""
+    filename = str(tmp_path / "history.csv")
+    writeHistory(filename, 1000)
+    ranges = splitChunks(filename, 7)
+    assert len(ranges) == 7
+    with open(filename, "rb") as f:
+        data = f.read()
+    assert ranges[0][0] == data.index(b"\n") + 1
+    assert ranges[-1][1] == os.path.getsize(filename)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+        assert data[start - 1 : start] == b"\n"
+    assert splitChunks(filename, 1) == [(ranges[0][0], len(data))]
+
+
+def test_parallelParserMatchesSerial(tmp_path, monkeypatch):
+    """Test that the parallel parser gives exactly the history of the serial parser"""
+    monkeypatch.setattr(ParallelHistoryParser, "MIN_CHUNK_SIZE", 1024)
+    for newline in ("\n", "\r\n"):
+        filename = str(tmp_path / "history.csv")
+        writeHistory(filename, 3000, newline)
+        serial = getNetflixHistory(filename, ",")
+        parallel = getNetflixHistory(filename, ",", workers=3)
+        assert len(serial.shows) >= 5
+        assert parallel.toDict() == serial.toDict()
+
+        sqlite = getNetflixHistory(
+            filename, ",", netflixHistory=NetflixSqliteHistory(), workers=3
+        )
+        assert sqlite.toDict() == serial.toDict()
+        sqlite.close()
+
+    # dates are converted like in the serial parser
+    writeHistory(filename, 3000, isoDates=True)
+    serial = getNetflixHistory(filename, ",", detectDateFormat=True)
+    parallel = getNetflixHistory(filename, ",", detectDateFormat=True, workers=2)
+    assert parallel.toDict() == serial.toDict()
+
+
+def test_smallFilesAreParsedSerially(tmp_path):
+    filename = str(tmp_path / "history.csv")
+    writeHistory(filename, 10)
+    assert ParallelHistoryParser.parseParallel(filename, ",", 4) is None
+    assert getNetflixHistory(filename, ",", workers=4).toDict() == (
+        getNetflixHistory(filename, ",").toDict()
+    )
@@ -0,0 +1,71 @@
+import threading
+import time
+
+from NetflixTvShow import NetflixTvHistory
+from ShowScheduler import ASSUMED_SEASONS, estimateShowCost, runLongestFirst
+from TitleOverrides import TitleOverrides
+
+
+def test_estimateShowCost():
+    """Test that the cost counts the search, details, season and translation requests"""
+    netflixHistory = NetflixTvHistory()
+    netflixHistory.addEntry("Dark: Staffel 1: Geheimnisse", "04.10.21")
+    netflixHistory.addEntry("Dark: Staffel 1: Lügen", "05.10.21")
+    netflixHistory.addEntry("Dark: Staffel 2: Anfänge und Enden", "06.10.21")
+    netflixHistory.addEntry(
+        "American Horror Story: Murder House: Nachgeburt", "06.10.21"
+    )
+    dark = netflixHistory.getTvShow("Dark")
+    ahs = netflixHistory.getTvShow("American Horror Story")
+
+    # search + details + 2 seasons
+    assert estimateShowCost(dark) == 4
+    # + 3 episode translations
+    assert estimateShowCost(dark, languageSearch=True) == 7
+    # all seasons are requested to find a season by its name
+    assert estimateShowCost(ahs) == 2 + ASSUMED_SEASONS
+
+    overrides = TitleOverrides()
+    overrides.shows["Dark"] = 70523
+    overrides.seasons[("American Horror Story", "Murder House")] = 1
+    assert estimateShowCost(dark, overrides=overrides) == 3
+    assert estimateShowCost(ahs, overrides=overrides) == 3
+
+
+def test_runLongestFirst():
+    """Test that the most expensive items run first and every item runs once"""
+    costs = {"a": 1, "b": 5, "c": 3, "d": 5}
+    ran = []
+    results = list(runLongestFirst(costs, costs.get, ran.append))
+    assert ran == ["b", "d", "c", "a"]
+    assert [(item, cost) for item, cost, _ in results] == [
+        ("b", 5),
+        ("d", 5),
+        ("c", 3),
+        ("a", 1),
+    ]
+
+    # only the items of the window are ordered
+    ran.clear()
+    list(runLongestFirst([1, 2, 3, 4], lambda x: x, ran.append, window=2))
+    assert ran == [2, 3, 4, 1]
+
+
+def test_runLongestFirstWorkers():
+    """Test that the items are spread over the workers, the longest ones are started first"""
+    costs = {"long": 5, "short1": 1, "short2": 1, "short3": 1, "short4": 1}
+    started = []
+    threads = set()
+
+    def work(item):
+        started.append(item)
+        threads.add(threading.current_thread().name)
+        time.sleep(costs[item] * 0.02)
+
+    results = list(runLongestFirst(costs, costs.get, work, workers=2))
+
+    assert started[0] == "long"
+    assert sorted(item for item, _, _ in results) == sorted(costs)
+    assert len(threads) == 2
+    # the short items run on the other worker while the long one runs
+    assert [item for item, _, _ in results[:3]] == ["short1", "short2", "short3"]
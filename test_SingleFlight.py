@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+from SingleFlight import SingleFlight
+
+
+def test_concurrentCallsAreCoalesced():
+    """Test that concurrent calls with the same key execute the function only once"""
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def request(term):
+        calls.append(term)
+        time.sleep(0.1)
+        return term.upper()
+
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(flight.do("dark", request, "dark"))
+        )
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["dark"]
+    assert results == ["DARK"] * 5
+    assert flight.executed == 1
+    assert flight.coalesced == 4
+
+
+def test_sequentialCallsAreExecuted():
+    flight = SingleFlight()
+    assert flight.do(1, lambda: "a") == "a"
+    assert flight.do(1, lambda: "b") == "b"
+    assert flight.do(2, lambda: "c") == "c"
+    assert flight.executed == 3
+    assert flight.coalesced == 0
+
+
+def test_errorsAreRaisedAndNotKept():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("request failed")
+
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: "retry") == "retry"
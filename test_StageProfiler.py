@@ -0,0 +1,47 @@
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+
+from StageProfiler import StageProfiler
+
+
+def test_stageReportsAndSlowestCalls(tmp_path):
+    """Test that a profiled stage writes its reports and only the slowest calls are kept"""
+    profiler = StageProfiler(str(tmp_path / "profile"), slowestCalls=2)
+    with profiler.stage("parse"):
+        data = [str(i) for i in range(10000)]
+    assert len(data) == 10000
+    for label, duration in (("Dark", 0.5), ("Lupin", 2.0), ("Wednesday", 1.0)):
+        profiler.recordCall(label, duration)
+    profiler.writeSlowestCalls("slowest-shows.txt")
+
+    assert (tmp_path / "profile" / "parse.pstats").stat().st_size > 0
+    allocations = (tmp_path / "profile" / "parse.allocations.txt").read_text()
+    assert allocations.startswith("Stage parse:")
+    slowest = (tmp_path / "profile" / "slowest-shows.txt").read_text().splitlines()
+    assert [line.split()[-1] for line in slowest] == ["Lupin", "Wednesday"]
+
+
+def test_disabledProfilerDoesNothing(tmp_path):
+    profiler = StageProfiler(None, slowestCalls=2)
+    with profiler.stage("parse"):
+        pass
+    profiler.recordCall("Dark", 1.0)
+    profiler.writeSlowestCalls("slowest-shows.txt")
+    assert not profiler.enabled
+
+
+def _requestInWorker(i):
+    return str(i)
+
+
+def test_stageProfilesWorkerThreads(tmp_path):
+    """Test that calls in threads started during the stage are part of its profile"""
+    profiler = StageProfiler(str(tmp_path / "profile"))
+    with profiler.stage("resolve-shows"):
+        with ThreadPoolExecutor(2) as executor:
+            assert list(executor.map(_requestInWorker, range(10))) == [
+                str(i) for i in range(10)
+            ]
+    stats = pstats.Stats(str(tmp_path / "profile" / "resolve-shows.pstats"))
+    calls = {function: stat[1] for (_, _, function), stat in stats.stats.items()}
+    assert calls["_requestInWorker"] == 10
@@ -0,0 +1,92 @@
+from SyncJournal import (
+    SyncJournal,
+    latestJournal,
+    markRolledBack,
+    newJournalFilename,
+    readJournal,
+)
+from TraktIO import TraktIO
+
+ITEMS = [
+    ("episodes", {"watched_at": "2021-10-04T20:15:00.00Z", "ids": {"tmdb": 1}}),
+    ("episodes", {"watched_at": "2021-10-05T20:15:00.00Z", "ids": {"tmdb": 2}}),
+    (
+        "movies",
+        {
+            "title": "Chernobyl",
+            "watched_at": "2022-01-01T20:15:00.00Z",
+            "ids": {"tmdb": 3},
+        },
+    ),
+]
+
+HISTORY = {
+    "episodes": [
+        {
+            "id": 11,
+            "watched_at": "2021-10-04T20:15:00.000Z",
+            "episode": {"ids": {"tmdb": 1}},
+        },
+        # another play of the same episode, not posted by the import
+        {
+            "id": 12,
+            "watched_at": "2021-10-04T22:00:00.000Z",
+            "episode": {"ids": {"tmdb": 1}},
+        },
+        {
+            "id": 13,
+            "watched_at": "2021-10-05T20:15:00.000Z",
+            "episode": {"ids": {"tmdb": 2}},
+        },
+    ],
+    "movies": [
+        {
+            "id": 14,
+            "watched_at": "2022-01-01T20:15:00.000Z",
+            "movie": {"ids": {"tmdb": 3}},
+        }
+    ],
+}
+
+
+def test_journalRoundTrip(tmp_path):
+    """Test that recorded pages are read back and the latest journal is found"""
+    directory = str(tmp_path / "journals")
+    assert latestJournal(directory) is None
+    journal = SyncJournal(newJournalFilename(directory))
+    journal.record(ITEMS[:2])
+    journal.record(ITEMS[2:])
+    journal.close()
+
+    assert journal.recorded == 3
+    assert latestJournal(directory) == journal.filename
+    items = readJournal(journal.filename)
+    assert [key for key, _ in items] == ["episodes", "episodes", "movies"]
+    assert items[2][1] == {"watched_at": "2022-01-01T20:15:00.00Z", "ids": {"tmdb": 3}}
+
+    markRolledBack(journal.filename)
+    assert latestJournal(directory) is None
+
+
+def test_findHistoryIdsOfPostedPlays():
+    """Test that only the plays posted by the import are selected for removal"""
+    traktIO = TraktIO(dry_run=True)
+    traktIO._getHistory = lambda media, startAt, endAt: HISTORY[media]
+    assert traktIO.findHistoryIds(ITEMS) == [11, 13, 14]
+    assert traktIO.removeHistory([11, 13, 14]) == {"deleted": {"history": 3}}
+
+
+def test_findHistoryIdsKeepsDuplicatePlays():
+    """Test that an identical play added by an earlier import is kept, the newest one is removed"""
+    traktIO = TraktIO(dry_run=True)
+    history = dict(HISTORY)
+    history["episodes"] = HISTORY["episodes"] + [
+        {
+            "id": 9,
+            "watched_at": "2021-10-05T20:15:00.000Z",
+            "episode": {"ids": {"tmdb": 2}},
+        }
+    ]
+    traktIO._getHistory = lambda media, startAt, endAt: history[media]
+    assert traktIO.findHistoryIds(ITEMS) == [11, 13, 14]
+    assert traktIO.findHistoryIds(ITEMS + ITEMS[1:2]) == [9, 11, 13, 14]
@@ -0,0 +1,53 @@
+from NetflixTvShow import NetflixTvHistory
+from TitleOverrides import TitleOverrides
+
+
+def test_loadOverrides(tmp_path):
+    """Test that shows, seasons and movies are loaded and invalid lines are ignored"""
+    overridesFile = tmp_path / "overrides.csv"
+    overridesFile.write_text(
+        "type,name,tmdb_id,season_name,season_number\n"
+        "show,Haus des Geldes,71446,,\n"
+        "season,American Horror Story,,Murder House,1\n"
+        'movie,"King Arthur: Legend of the Sword",274857,,\n'
+        "show,Broken entry,abc,,\n",
+        encoding="utf-8",
+    )
+    overrides = TitleOverrides.load(str(overridesFile))
+    assert len(overrides) == 3
+    assert overrides.getShowId("Haus des Geldes") == 71446
+    assert overrides.getSeasonNumber("American Horror Story", "Murder House") == 1
+    assert overrides.getMovieId("King Arthur: Legend of the Sword") == 274857
+    assert overrides.getShowId("Broken entry") is None
+
+
+def test_missingOverridesFile(tmp_path):
+    assert len(TitleOverrides.load(str(tmp_path / "missing.csv"))) == 0
+    assert len(TitleOverrides.load(None)) == 0
+
+
+def test_resolvedIdsRoundTrip(tmp_path):
+    """Test that resolved ids are written and merged without replacing manual overrides"""
+    netflixHistory = NetflixTvHistory()
+    netflixHistory.addEntry(
+        "American Horror Story: Murder House: Nachgeburt", "03.10.21"
+    )
+    netflixHistory.addEntry("Dark: Staffel 1: Geheimnisse", "03.10.21")
+    netflixHistory.addEntry("Spider-Man: Far from Home", "16.09.21")
+    show = netflixHistory.getTvShow("American Horror Story")
+    show.tmdbId = 1413
+    show.seasons[0].number = 1
+    netflixHistory.getMovie("Spider-Man: Far from Home").tmdbId = 429617
+
+    resolved = TitleOverrides()
+    resolved.addResolved(netflixHistory)
+    resolvedFile = str(tmp_path / "resolved.csv")
+    resolved.save(resolvedFile)
+
+    overrides = TitleOverrides()
+    overrides.shows["American Horror Story"] = 1
+    overrides.update(TitleOverrides.load(resolvedFile))
+    assert overrides.getShowId("American Horror Story") == 1
+    assert overrides.getShowId("Dark") is None
+    assert overrides.getSeasonNumber("American Horror Story", "Murder House") == 1
+    assert overrides.getMovieId("Spider-Man: Far from Home") == 429617
@@ -0,0 +1,35 @@
+import gzip
+import json
+
+from TmdbTitleIndex import TmdbTitleIndex, normalizeTitle
+
+
+def test_normalizeTitle():
+    """Test that case, accents and punctuation do not matter for index lookups"""
+    assert normalizeTitle("Haus des Geldes") == normalizeTitle("haus des geldes")
+    assert normalizeTitle("Amélie") == "amelie"
+    assert normalizeTitle("Spider-Man: Far from Home") == "spider man far from home"
+
+
+def test_buildAndLookup(tmp_path):
+    """Test that an export is indexed and lookups return the most popular id first"""
+    exportFile = tmp_path / "tv_series_ids.json.gz"
+    with gzip.open(exportFile, "wt", encoding="utf-8") as f:
+        for entry in (
+            {"id": 1, "original_name": "Dark", "popularity": 1.5},
+            {"id": 70523, "original_name": "Dark", "popularity": 80.2},
+            {"id": 60574, "original_name": "Peaky Blinders", "popularity": 95.0},
+        ):
+            f.write(json.dumps(entry) + "\n")
+
+    index = TmdbTitleIndex(str(tmp_path / "index.sqlite"))
+    assert index.build("tv", str(exportFile), batchSize=2) == 3
+    assert index.lookup("tv", "DARK") == [70523, 1]
+    assert index.lookup("tv", "Peaky Blinders") == [60574]
+    assert index.lookup("movie", "Dark") == []
+    assert index.lookup("tv", "Stranger Things") == []
+
+    # rebuilding replaces the previous entries
+    assert index.build("tv", str(exportFile)) == 3
+    assert index.lookup("tv", "Dark") == [70523, 1]
+    index.close()
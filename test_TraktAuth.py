@@ -0,0 +1,59 @@
+import datetime
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import TraktAuth
+from TraktAuth import TraktAuthManager, isTokenValid
+
+
+def _token(name, expiresIn):
+    return {
+        "access_token": name,
+        "refresh_token": name + "-refresh",
+        "created_at": int(datetime.datetime.now().timestamp()),
+        "expires_in": expiresIn,
+    }
+
+
+class FakeOAuth(object):
+    def __init__(self):
+        self.refreshed = []
+
+    def token_refresh(self, refreshToken, redirectUri):
+        time.sleep(0.05)
+        self.refreshed.append(refreshToken)
+        return _token(f"new{len(self.refreshed)}", 86400)
+
+
+def test_tokenIsRefreshedOnceBeforeExpiry(tmp_path, monkeypatch):
+    """Test that an expiring token is refreshed once by parallel workers and persisted"""
+    oauth = FakeOAuth()
+    monkeypatch.setattr(TraktAuth, "Trakt", {"oauth": oauth})
+    authFile = tmp_path / "traktAuth.json"
+    authFile.write_text(json.dumps(_token("old", 600)))
+
+    manager = TraktAuthManager(str(authFile), refreshMargin=3600)
+    with ThreadPoolExecutor(8) as executor:
+        tokens = list(executor.map(lambda _: manager.getAuthorization(), range(16)))
+
+    assert oauth.refreshed == ["old-refresh"]
+    assert {token["access_token"] for token in tokens} == {"new1"}
+    assert json.loads(authFile.read_text())["access_token"] == "new1"
+
+    # another process picks up the persisted token without refreshing again
+    assert TraktAuthManager(str(authFile)).getAuthorization()["access_token"] == "new1"
+    assert len(oauth.refreshed) == 1
+
+
+def test_validTokenIsNotRefreshed(tmp_path, monkeypatch):
+    """Test that a token which is valid long enough is used as it is"""
+    oauth = FakeOAuth()
+    monkeypatch.setattr(TraktAuth, "Trakt", {"oauth": oauth})
+    authFile = tmp_path / "traktAuth.json"
+    authFile.write_text(json.dumps(_token("old", 86400)))
+
+    assert TraktAuthManager(str(authFile)).getAuthorization()["access_token"] == "old"
+    assert TraktAuthManager(str(tmp_path / "missing.json")).getAuthorization() is None
+    assert oauth.refreshed == []
+    assert not isTokenValid(_token("expired", -1))
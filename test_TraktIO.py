@@ -0,0 +1,128 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+from requests.exceptions import ReadTimeout
+from trakt.core.exceptions import ServerError
+
+import TraktIO as traktModule
+from TraktIO import TraktIO
+
+
+# sync/history endpoint that rejects every page containing one of the `failing` TMDB ids. Pages
+# containing one of the `timeouts` ids get no response, the first time after they were added.
+class FakeHistory(object):
+    def __init__(self, failing, timeouts=()):
+        self.failing = failing
+        self.timeouts = set(timeouts)
+        self.added = []
+
+    def add(self, page, exceptions=False):
+        items = page.get("movies", []) + page.get("episodes", [])
+        if any(item["ids"]["tmdb"] in self.failing for item in items):
+            raise ServerError(SimpleNamespace(status_code=500))
+        self.added += [("episodes", item) for item in page.get("episodes", [])]
+        self.added += [("movies", item) for item in page.get("movies", [])]
+        timedOut = {item["ids"]["tmdb"] for item in items} & self.timeouts
+        if timedOut:
+            self.timeouts -= timedOut
+            raise ReadTimeout("Read timed out")
+        return {
+            "added": {key: len(page.get(key, [])) for key in ("movies", "episodes")}
+        }
+
+    def getHistory(self, media, startAt, endAt):
+        singular = media[:-1]
+        return [
+            {
+                "id": number,
+                "watched_at": item["watched_at"],
+                singular: {"ids": item["ids"]},
+            }
+            for number, (key, item) in enumerate(self.added)
+            if key == media
+        ]
+
+
+class FakeTrakt(object):
+    configuration = SimpleNamespace(
+        oauth=SimpleNamespace(from_response=lambda authorization: nullcontext())
+    )
+
+    def __init__(self, history):
+        self.history = history
+
+    def __getitem__(self, path):
+        return self.history
+
+
+def _setupTrakt(monkeypatch, failing, timeouts=(), retryWait=0):
+    history = FakeHistory(failing, timeouts)
+    monkeypatch.setattr(traktModule, "Trakt", FakeTrakt(history))
+    traktIO = TraktIO(
+        page_size=100, min_page_size=1, max_page_size=100, retry_wait=retryWait
+    )
+    traktIO.getAuthorization = lambda: None
+    traktIO._getHistory = history.getHistory
+    for tmdbId in range(1, 9):
+        traktIO._episodes.append(
+            {"watched_at": "2022-01-01T20:15:00.00Z", "ids": {"tmdb": tmdbId}}
+        )
+    return traktIO, history
+
+
+def test_syncReportsFailedItems(monkeypatch):
+    """Test that items failing in pages of the minimum size are reported, not dropped"""
+    traktIO, _ = _setupTrakt(monkeypatch, {3})
+    res = traktIO.sync()
+    assert res["added"] == {"movies": 0, "episodes": 7}
+    assert res["failed"] == {"movies": 0, "episodes": 1}
+    assert traktIO.failedItems == [
+        ("episodes", {"watched_at": "2022-01-01T20:15:00.00Z", "ids": {"tmdb": 3}})
+    ]
+    assert "1 items could not be submitted" in traktIO.getSyncSummary()
+
+
+def test_syncFailsIfNothingWasAdded(monkeypatch):
+    traktIO, _ = _setupTrakt(monkeypatch, set(range(1, 9)))
+    assert traktIO.sync() is None
+    assert len(traktIO.failedItems) == 8
+
+
+def test_syncWaitsBeforeResubmitting(monkeypatch):
+    """Test that rejected pages are resubmitted with a growing pause, not at all at the minimum size"""
+    waits = []
+    monkeypatch.setattr(traktModule.time, "sleep", waits.append)
+    traktIO, _ = _setupTrakt(monkeypatch, {3}, retryWait=1.0)
+    traktIO.sync()
+    # pages of 8, 4 and 2 items were split, the page of item 3 alone was given up
+    assert waits == [1.0, 2.0, 4.0]
+
+
+def test_syncDoesNotResubmitAddedPageAfterTimeout(monkeypatch):
+    """Test that a page added by a request without response is not added a second time"""
+    traktIO, history = _setupTrakt(monkeypatch, set(), timeouts={3})
+    res = traktIO.sync()
+    assert res["added"] == {"movies": 0, "episodes": 8}
+    assert sorted(item["ids"]["tmdb"] for _, item in history.added) == list(range(1, 9))
+    assert len(traktIO.postedItems) == 8
+    assert traktIO.failedItems == []
+
+
+def test_syncResubmitsMissingItemsAfterTimeout(monkeypatch):
+    """Test that only the items of a page without response that are not in the history are resubmitted"""
+    traktIO, history = _setupTrakt(monkeypatch, set())
+    # the connection is lost before the first page reaches Trakt
+    add = history.add
+    calls = []
+
+    def addOnce(page, exceptions=False):
+        calls.append(len(page["episodes"]))
+        if len(calls) == 1:
+            raise ReadTimeout("Read timed out")
+        return add(page, exceptions)
+
+    history.add = addOnce
+    res = traktIO.sync()
+    assert res["added"] == {"movies": 0, "episodes": 8}
+    assert calls == [8, 4, 4]
+    assert len(history.added) == 8
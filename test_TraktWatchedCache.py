@@ -0,0 +1,37 @@
+from TraktWatchedCache import TraktWatchedCache
+
+WATCHED = [
+    {
+        "plays": 3,
+        "show": {"title": "Dark", "ids": {"trakt": 1, "tmdb": 70523}},
+        "seasons": [
+            {"number": 1, "episodes": [{"number": 1}, {"number": 2}]},
+            {"number": 2, "episodes": [{"number": 1}]},
+        ],
+    },
+    {"plays": 1, "show": {"title": "Unknown", "ids": {"trakt": 2}}, "seasons": []},
+]
+
+
+def test_watchedShowsAreOnlyFetchedOnNewActivity(tmp_path):
+    """Test that the watched shows are cached and only fetched again when the activity changed"""
+    cacheFile = str(tmp_path / "traktWatched.json")
+    fetched = []
+
+    def getWatchedShows():
+        fetched.append(True)
+        return WATCHED
+
+    cache = TraktWatchedCache.load(cacheFile)
+    assert cache.refresh(lambda: "2023-01-01T10:00:00.000Z", getWatchedShows)
+    cache.save(cacheFile)
+    assert len(cache) == 3
+    assert cache.isWatched(70523, 1, 2)
+    assert not cache.isWatched(70523, 2, 2)
+    assert not cache.isWatched(None, 1, 1)
+
+    cache = TraktWatchedCache.load(cacheFile)
+    assert not cache.refresh(lambda: "2023-01-01T10:00:00.000Z", getWatchedShows)
+    assert cache.isWatched(70523, 2, 1)
+    assert cache.refresh(lambda: "2023-02-01T10:00:00.000Z", getWatchedShows)
+    assert len(fetched) == 2
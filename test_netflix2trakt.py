@@ -0,0 +1,462 @@
+import argparse
+import gzip
+import json
+from collections import Counter
+from contextlib import nullcontext
+from threading import Lock
+from types import SimpleNamespace
+
+import pytest
+from tenacity import wait_none
+from tmdbv3api.exceptions import TMDbException
+
+import config
+import netflix2trakt
+import TraktIO as traktModule
+from NetflixHistoryDiff import FingerprintStore, PendingRows, rowFingerprint
+from netflix2trakt import (
+    addMovieToTrakt,
+    addShowToTrakt,
+    commitImportedRows,
+    getMovieInformation,
+    getNetflixHistory,
+    getShowInformation,
+    getTraktPages,
+    importWatchedFile,
+    parseShard,
+    readArtifact,
+    runPagesStage,
+    runSyncStage,
+    selectShard,
+    writeArtifact,
+)
+from NetflixTvShow import NetflixTvHistory
+from TitleOverrides import TitleOverrides
+from TmdbTitleIndex import TmdbTitleIndex
+from TraktIO import TraktIO
+from TraktWatchedCache import TraktWatchedCache
+
+HISTORY_CSV = (
+    "Title,Date\n"
+    '"Dark: Staffel 1: Geheimnisse","03.10.21"\n'
+    '"Dark: Staffel 1: Lügen","04.10.21"\n'
+)
+
+
+# sync/history endpoint that adds every page
+class FakeHistory(object):
+    def __init__(self):
+        self.pages = []
+
+    def add(self, page, exceptions=False):
+        self.pages.append(page)
+        return {
+            "added": {key: len(page.get(key, [])) for key in ("movies", "episodes")}
+        }
+
+
+class FakeTrakt(object):
+    configuration = SimpleNamespace(
+        oauth=SimpleNamespace(from_response=lambda authorization: nullcontext())
+    )
+
+    def __init__(self):
+        self.history = FakeHistory()
+
+    def __getitem__(self, path):
+        return self.history
+
+
+def _setupTrakt(monkeypatch):
+    fakeTrakt = FakeTrakt()
+    monkeypatch.setattr(traktModule, "Trakt", fakeTrakt)
+    traktIO = TraktIO(page_size=100)
+    traktIO.getAuthorization = lambda: None
+    return traktIO, fakeTrakt
+
+
+def _resolveDark(netflixHistory):
+    show = netflixHistory.getTvShow("Dark")
+    show.tmdbId = 70523
+    for number, episode in enumerate(show.seasons[0].episodes, 1):
+        episode.setTmdbId(1000 + number)
+        episode.setEpisodeNumber(number)
+    return show
+
+
+def test_skippedWatchedRowsAreCommitted(tmp_path, monkeypatch):
+    """Test that with skip_watched the rows of episodes already watched on Trakt are remembered as imported"""
+    historyFile = tmp_path / "NetflixViewingHistory.csv"
+    historyFile.write_text(HISTORY_CSV, encoding="utf-8")
+    fingerprintFile = str(tmp_path / "fingerprints.bin")
+    monkeypatch.setattr(config, "VIEWING_HISTORY_FINGERPRINT_FILE", fingerprintFile)
+
+    traktIO, fakeTrakt = _setupTrakt(monkeypatch)
+    traktIO.watched = TraktWatchedCache()
+    traktIO.watched.setWatchedShows(
+        [
+            {
+                "show": {"ids": {"tmdb": 70523}},
+                "seasons": [{"number": 1, "episodes": [{"number": 1}]}],
+            }
+        ]
+    )
+
+    newRows = PendingRows(FingerprintStore.load(fingerprintFile))
+    netflixHistory = getNetflixHistory(str(historyFile), ",", newRows=newRows)
+    addShowToTrakt(_resolveDark(netflixHistory), traktIO)
+    newRows.resolveItems(netflixHistory)
+    traktIO.sync()
+    commitImportedRows(newRows, traktIO)
+
+    # only the episode that is not watched yet was posted, both rows are done
+    assert [item["ids"]["tmdb"] for item in fakeTrakt.history.pages[0]["episodes"]] == [
+        1002
+    ]
+    assert traktIO.skippedItems == {("episodes", 1001, "2021-10-03T20:15:00.00Z")}
+    imported = FingerprintStore.load(fingerprintFile)
+    assert rowFingerprint("Dark: Staffel 1: Geheimnisse", "03.10.21") in imported
+    assert rowFingerprint("Dark: Staffel 1: Lügen", "04.10.21") in imported
+
+    # the next run parses no row again
+    newRows = PendingRows(imported)
+    netflixHistory = getNetflixHistory(str(historyFile), ",", newRows=newRows)
+    assert len(newRows) == 0
+    assert netflixHistory.shows == []
+
+
+# TMDB client with the seasons of one show: number -> (season name, [(TMDB id, episode name)])
+class FakeTmdb(object):
+    language = "de"
+    executedRequests = coalescedRequests = cachedSearches = 0
+
+    def __init__(self, seasons, translations=None, unreachable=(), missing=()):
+        self.seasons = seasons
+        # (season number, episode number) -> translated name
+        self.translations = translations or {}
+        # seasons failing once with a connection error, seasons not on TMDB
+        self.unreachable = set(unreachable)
+        self.missing = set(missing)
+        self.requests = []
+        self._lock = Lock()
+
+    def searchTv(self, name):
+        return [{"id": 70523}]
+
+    def tvDetails(self, showId):
+        return SimpleNamespace(number_of_seasons=len(self.seasons))
+
+    def seasonDetails(self, showId, seasonNumber):
+        with self._lock:
+            self.requests.append(("season", seasonNumber))
+            if seasonNumber in self.unreachable:
+                self.unreachable.remove(seasonNumber)
+                raise ConnectionError("Connection reset by peer")
+        if seasonNumber in self.missing:
+            raise TMDbException("The resource you requested could not be found.")
+        name, episodes = self.seasons[seasonNumber]
+        return SimpleNamespace(
+            name=name,
+            season_number=seasonNumber,
+            episodes=[
+                SimpleNamespace(id=tmdbId, name=episodeName, episode_number=number)
+                for number, (tmdbId, episodeName) in enumerate(episodes, 1)
+            ],
+        )
+
+    def episodeDetails(self, showId, seasonNumber, episodeNumber):
+        with self._lock:
+            self.requests.append(("episode", seasonNumber, episodeNumber))
+        name = self.translations.get((seasonNumber, episodeNumber))
+        translations = []
+        if name is not None:
+            translations.append(
+                SimpleNamespace(
+                    iso_639_1=self.language, data=SimpleNamespace(name=name)
+                )
+            )
+        return SimpleNamespace(translations=SimpleNamespace(translations=translations))
+
+
+SEASONS = {
+    1: ("Staffel 1", [(101, "Secrets"), (102, "Lies"), (103, "Past and Present")]),
+    2: ("Zyklus", [(201, "Beginnings and Endings"), (202, "Dark Matter")]),
+    3: ("Staffel 3", [(301, "Deja-vu")]),
+}
+
+
+def _episodeIds(show):
+    return {
+        (season.number, episode.name): episode.tmdbId
+        for season in show.seasons
+        for episode in season.episodes
+    }
+
+
+def test_getShowInformationMatchesNumberedAndNamedSeasons():
+    """Test that all seasons are requested for a named season and the episodes of every season are matched"""
+    netflixHistory = NetflixTvHistory()
+    netflixHistory.addEntry("Dark: Staffel 1: Secrets", "03.10.21")
+    netflixHistory.addEntry("Dark: Staffel 1: Folge 2", "04.10.21")
+    netflixHistory.addTvShowEntry(
+        "Dark", None, "Dark Matter", "05.10.21", seasonName="Zyklus"
+    )
+    show = netflixHistory.getTvShow("Dark")
+    tmdb = FakeTmdb(SEASONS)
+    markerMatches = Counter()
+
+    getShowInformation(show, tmdb, False, None, markerMatches=markerMatches)
+
+    assert show.tmdbId == 70523
+    assert _episodeIds(show) == {
+        (1, "Secrets"): 101,
+        (1, "Folge 2"): 102,
+        (2, "Dark Matter"): 202,
+    }
+    assert sorted(tmdb.requests) == [("season", 1), ("season", 2), ("season", 3)]
+    assert markerMatches == {"Dark": 1}
+
+
+def test_getShowInformationTranslatesUnmatchedEpisodesOnly():
+    """Test that with the language search only the episodes not matched by title are requested"""
+    netflixHistory = NetflixTvHistory()
+    netflixHistory.addEntry("Dark: Staffel 1: Secrets", "03.10.21")
+    netflixHistory.addEntry("Dark: Staffel 1: Lügen", "04.10.21")
+    show = netflixHistory.getTvShow("Dark")
+    tmdb = FakeTmdb(
+        SEASONS, translations={(1, 2): "Lügen", (1, 3): "Gestern und Heute"}
+    )
+
+    getShowInformation(show, tmdb, True, None)
+
+    assert _episodeIds(show) == {(1, "Secrets"): 101, (1, "Lügen"): 102}
+    assert sorted(tmdb.requests) == [
+        ("episode", 1, 2),
+        ("episode", 1, 3),
+        ("season", 1),
+    ]
+
+
+def test_getShowInformationRetriesFailedRequests(monkeypatch):
+    """Test that a failed season request retries the show, a season missing on TMDB is skipped"""
+    monkeypatch.setattr(getShowInformation.retry, "wait", wait_none())
+    netflixHistory = NetflixTvHistory()
+    netflixHistory.addEntry("Dark: Staffel 1: Folge 1", "03.10.21")
+    netflixHistory.addEntry("Dark: Staffel 2: Folge 2", "04.10.21")
+    netflixHistory.addEntry("Dark: Staffel 3: Deja-vu", "05.10.21")
+    show = netflixHistory.getTvShow("Dark")
+    tmdb = FakeTmdb(SEASONS, unreachable={2}, missing={3})
+    markerMatches = Counter()
+
+    getShowInformation(show, tmdb, False, None, markerMatches=markerMatches)
+
+    assert _episodeIds(show) == {
+        (1, "Folge 1"): 101,
+        (2, "Folge 2"): 202,
+        (3, "Deja-vu"): None,
+    }
+    assert tmdb.requests.count(("season", 2)) == 2
+    # episodes matched before the retry are not counted again
+    assert markerMatches == {"Dark": 2}
+
+
+def test_getMovieInformationSearchesTitlesOfSeveralMovies(tmp_path):
+    """Test that a title of several movies in the index is searched, so a later remake is not chosen"""
+    exportFile = tmp_path / "movie_ids.json.gz"
+    with gzip.open(exportFile, "wt", encoding="utf-8") as f:
+        for entry in (
+            {"id": 9377, "original_title": "Total Recall", "popularity": 30.0},
+            {"id": 64635, "original_title": "Total Recall", "popularity": 40.0},
+            {"id": 603, "original_title": "The Matrix", "popularity": 80.0},
+        ):
+            f.write(json.dumps(entry) + "\n")
+    titleIndex = TmdbTitleIndex(str(tmp_path / "index.sqlite"))
+    titleIndex.build("movie", str(exportFile))
+    searches = []
+
+    def searchMovie(title):
+        searches.append(title)
+        return [
+            {"id": 64635, "title": "Total Recall", "release_date": "2012-08-02"},
+            {"id": 9377, "title": "Total Recall", "release_date": "1990-06-01"},
+        ]
+
+    tmdb = SimpleNamespace(searchMovie=searchMovie)
+    netflixHistory = NetflixTvHistory()
+    netflixHistory.addEntry("Total Recall", "17.01.11")
+    netflixHistory.addEntry("The Matrix", "18.01.11")
+
+    for movie in netflixHistory.movies:
+        getMovieInformation(movie, True, None, titleIndex, None, tmdb)
+    titleIndex.close()
+
+    assert [movie.tmdbId for movie in netflixHistory.movies] == [9377, 603]
+    assert searches == ["Total Recall"]
+
+
+def test_importWatchedFilesReportsEachImport(tmp_path, monkeypatch):
+    """Test that the second import of watch mode only posts and reports its own new rows"""
+    firstFile = tmp_path / "first.csv"
+    firstFile.write_text('Title,Date\n"Dark: Staffel 1: Secrets","03.10.21"\n')
+    secondFile = tmp_path / "second.csv"
+    secondFile.write_text(
+        'Title,Date\n"Dark: Staffel 1: Lies","04.10.21"\n"Dark: Staffel 1: Secrets","03.10.21"\n'
+    )
+    traktIO, fakeTrakt = _setupTrakt(monkeypatch)
+    tmdb = FakeTmdb(SEASONS)
+    overrides = TitleOverrides()
+    fingerprints = FingerprintStore()
+
+    importWatchedFile(str(firstFile), tmdb, traktIO, None, overrides, fingerprints)
+    assert traktIO.syncResult["added"]["episodes"] == 1
+    # the failed items of an import are not reported again by the next one
+    traktIO.failedItems.append(("episodes", {}))
+
+    importWatchedFile(str(secondFile), tmdb, traktIO, None, overrides, fingerprints)
+    assert traktIO.syncResult["added"]["episodes"] == 1
+    assert traktIO.postedItems == {("episodes", 102, "2021-10-04T20:15:00.00Z")}
+    assert traktIO.failedItems == []
+    assert len(traktIO.pageStats) == 1
+    assert [
+        [item["ids"]["tmdb"] for item in page["episodes"]]
+        for page in fakeTrakt.history.pages
+    ] == [[101], [102]]
+    assert len(fingerprints) == 2
+
+
+STAGED_CSV = (
+    "Title,Date\n"
+    '"Dark: Staffel 1: Secrets","03.10.21"\n'
+    '"Dark: Staffel 1: Lies","04.10.21"\n'
+    '"Dark: Staffel 2: Dark Matter","05.10.21"\n'
+    '"Chernobyl","01.01.22"\n'
+    '"Chernobyl","02.01.22"\n'
+    '"Total Recall","17.01.11"\n'
+)
+
+
+def _parseStaged(tmp_path):
+    historyFile = tmp_path / "NetflixViewingHistory.csv"
+    historyFile.write_text(STAGED_CSV, encoding="utf-8")
+    newRows = PendingRows()
+    return getNetflixHistory(str(historyFile), ",", newRows=newRows), newRows
+
+
+def _resolveStaged(netflixHistory):
+    for show in netflixHistory.shows:
+        show.tmdbId = 70523
+        for season in show.seasons:
+            for number, episode in enumerate(season.episodes, 1):
+                episode.setTmdbId(season.number * 100 + number)
+                episode.setEpisodeNumber(number)
+    for movie in netflixHistory.movies:
+        movie.tmdbId = len(movie.name)
+
+
+def _playKeys(items):
+    return sorted((item["ids"]["tmdb"], item["watched_at"]) for item in items)
+
+
+def test_artifactRoundTrip(tmp_path):
+    """Test that the data and new rows of an artifact are read back, only by the stage that wrote it"""
+    netflixHistory, newRows = _parseStaged(tmp_path)
+    artifact = str(tmp_path / "netflixHistory.parsed.json")
+    writeArtifact(artifact, "parsed", netflixHistory.toDict(), newRows)
+
+    data, rows = readArtifact(artifact, "parsed", withRows=True)
+    assert data == netflixHistory.toDict()
+    assert rows.rows == newRows.rows
+    with pytest.raises(ValueError):
+        readArtifact(artifact, "resolved")
+
+    writeArtifact(artifact, "pages", [])
+    assert readArtifact(artifact, "pages", withRows=True) == ([], None)
+    with open(artifact, encoding="utf-8") as f:
+        content = json.load(f)
+    content["version"] = 0
+    with open(artifact, "w", encoding="utf-8") as f:
+        json.dump(content, f)
+    with pytest.raises(ValueError):
+        readArtifact(artifact, "pages")
+
+
+def test_shardsCoverEveryPageOnce(tmp_path):
+    netflixHistory, _ = _parseStaged(tmp_path)
+    _resolveStaged(netflixHistory)
+    pages = getTraktPages(netflixHistory, 2)
+    assert len(pages) == 3
+    for count in (1, 2, 3, 5):
+        shards = [selectShard(pages, (index, count)) for index in range(count)]
+        assert sorted(page for shard in shards for page in map(json.dumps, shard)) == (
+            sorted(map(json.dumps, pages))
+        )
+    assert selectShard(pages, None) == pages
+
+    assert parseShard("1/4") == (1, 4)
+    for value in ("4/4", "-1/2", "a/b"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parseShard(value)
+
+
+def test_stagedShardsPostEveryPlayOnce(tmp_path, monkeypatch):
+    """Test that sharded resolve and sync stages post every play once and remember all rows"""
+    fingerprintFile = str(tmp_path / "fingerprints.bin")
+    monkeypatch.setattr(config, "VIEWING_HISTORY_FINGERPRINT_FILE", fingerprintFile)
+    monkeypatch.setattr(config, "TRAKT_API_SYNC_PAGE_SIZE", 2)
+    netflixHistory, newRows = _parseStaged(tmp_path)
+    parsedFile = str(tmp_path / "parsed.json")
+    writeArtifact(parsedFile, "parsed", netflixHistory.toDict(), newRows)
+
+    # two resolve shards, as `runResolveStage` without TMDB
+    resolvedFiles = []
+    for index in range(2):
+        data, rows = readArtifact(parsedFile, "parsed", withRows=True)
+        shard = NetflixTvHistory.fromDict(data)
+        shard.shows = selectShard(shard.shows, (index, 2))
+        shard.movies = selectShard(shard.movies, (index, 2))
+        _resolveStaged(shard)
+        rows.resolveItems(shard)
+        resolvedFiles.append(str(tmp_path / f"resolved{index}.json"))
+        writeArtifact(resolvedFiles[-1], "resolved", shard.toDict(), rows)
+
+    pagesFile = str(tmp_path / "pages.json")
+    runPagesStage(SimpleNamespace(input=resolvedFiles, output=pagesFile, profiler=None))
+    pages = readArtifact(pagesFile, "pages")
+    assert len(pages) == 3
+
+    posted = []
+    for index in range(3):
+        traktIO, fakeTrakt = _setupTrakt(monkeypatch)
+        monkeypatch.setattr(netflix2trakt, "setupConfiguredTrakt", lambda: traktIO)
+        runSyncStage(SimpleNamespace(input=pagesFile, shard=(index, 3), profiler=None))
+        posted += [
+            item
+            for page in fakeTrakt.history.pages
+            for key in ("movies", "episodes")
+            for item in page.get(key, [])
+        ]
+
+    expected = [
+        item for page in pages for key in ("movies", "episodes") for item in page[key]
+    ]
+    assert len(expected) == 6
+    assert _playKeys(posted) == _playKeys(expected)
+    assert len(FingerprintStore.load(fingerprintFile)) == 6
+
+
+def test_addMovieToTraktAddsEveryWatch():
+    """Test that every watch of a movie is added, not only the first one"""
+    netflixHistory = NetflixTvHistory()
+    netflixHistory.addEntry("Chernobyl", "01.01.22")
+    netflixHistory.addEntry("Chernobyl", "02.01.22")
+    movie = netflixHistory.getMovie("Chernobyl")
+    movie.tmdbId = 87108
+    traktIO = TraktIO(dry_run=True)
+
+    addMovieToTrakt(movie, traktIO)
+
+    assert _playKeys(traktIO.getData()["movies"]) == [
+        (87108, "2022-01-01T20:15:00.00Z"),
+        (87108, "2022-01-02T20:15:00.00Z"),
+    ]
+    assert addMovieToTrakt(movie, None) is None